@@ -0,0 +1,685 @@
+''' benchmarks for the rocket programs, runs without a display
+
+    suite: times on the config files reading the config and constructing the
+        control array, a headless launch, building and solving the gravity
+        turn NLP, logging rows in OutputLog and rendering MapPlot frames on the
+        Agg backend. Results are written to a JSON file
+    startup: times importing each rocket_* entry point in a fresh interpreter
+        and checks it against the import time budget and the heavy modules it
+        is allowed to load, exits with status 1 if a budget is exceeded
+    compare: compares two JSON result files and flags regressions beyond a
+        threshold, exits with status 1 if there are any
+    guess: iterations and solve time of the gravity turn NLP from the linear
+        initial guess and from forward simulations (full throttle then coast,
+        and the control file of the config)
+    derivatives: solves the gravity turn NLP of each config with every
+        combination of SX expansion, exact or limited memory Hessian, CVODES
+        sensitivity method and IPOPT linear solver for the iterations, time
+        per iteration and total time
+    integrators: solves the gravity turn NLP with CVODES and with the fixed
+        step RK4 shooting integrator for a range of N, reports the build and
+        solve times, iterations, the final mass and horizon and the largest
+        CVODES shooting defect of the RK4 solution
+    rhs: micro-benchmark of the gravity turn right hand side
+        compares RocketPhysics.derivatives_gravity_turn against the
+        former implementation, kept unchanged as ReferencePhysics (numpy
+        array per call, properties and drag constant evaluated on every
+        call), for evaluations per second and checks the integrated
+        trajectories are identical within tolerance
+
+    usage:
+        python rocket_benchmark.py suite --output benchmark_results.json
+        python rocket_benchmark.py startup
+        python rocket_benchmark.py compare baseline.json benchmark_results.json
+        python rocket_benchmark.py guess configs/mintoc_20T.cfg --N 300
+        python rocket_benchmark.py derivatives --N 30 --output derivatives.json
+        python rocket_benchmark.py integrators configs/mintoc_20T.cfg --N 100 300 1000 2000
+        python rocket_benchmark.py rhs configs/mintoc_20T.cfg
+'''
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+from scipy.integrate import ode
+from rocket_input import read_rocket_config, construct_control_array
+from rocket_launch import RocketPhysics, launch
+from rocket_output import OutputLog, MapPlot
+from rocket_casadi_solution import (
+    build_gravity_turn, solve_gravity_turn, gravity_turn_arguments, simulation_guess
+)
+
+CONFIG_FILES = sorted(Path('configs').glob('*.cfg'))
+GROUPS = ('startup', 'config', 'launch', 'optimizer', 'log', 'plot')
+# derivative strategies of the gravity turn NLP
+EXPAND = (False, True)
+HESSIANS = ('exact', 'limited-memory')
+SENSITIVITY_METHODS = ('simultaneous', 'staggered')
+SOLVED = {'Solve_Succeeded', 'Solved_To_Acceptable_Level'}
+OPTIMUM_TOLERANCE = 1e-3
+
+# import time budget (s) of the entry points in a fresh interpreter, on top of
+# the interpreter start up, and the heavy modules each may load on import
+HEAVY_MODULES = ('pandas', 'matplotlib', 'unicurses', 'PIL', 'casadi', 'scipy')
+IMPORT_BUDGET = {
+    'rocket_input': (0.5, ()),
+    'rocket_output': (0.5, ()),
+    'rocket_launch': (1.5, ('scipy',)),
+    'rocket_casadi_solution': (0.5, ()),
+    'rocket_casadi_result': (0.5, ()),
+}
+IMPORT_SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+print(' '.join(m for m in {heavy} if m in sys.modules))
+'''
+
+
+class ReferencePhysics:
+    ''' gravity turn right hand side of rocket_launch.RocketPhysics as
+        formerly implemented, kept unchanged as baseline for the benchmark
+    '''
+
+    def __init__(self, rocket_params, environment_params):
+        self.rocket = rocket_params
+        self.v_dot = 0
+        self.beta_0 = self.rocket.beta
+        self._throttle = 0
+        self._fuel_mass = self.rocket.fuel_mass
+        self.env = environment_params
+
+    def gravity(self, altitude):
+        return self.env.gravity * (self.env.radius / (self.env.radius + altitude)) ** 2
+
+    @property
+    def thrust(self):
+        return self.rocket.max_thrust * self.throttle
+
+    @property
+    def mass(self):
+        return self.rocket.dry_mass + self.fuel_mass
+
+    @property
+    def fuel_mass(self):
+        return self._fuel_mass
+
+    @fuel_mass.setter
+    def fuel_mass(self, value):
+        self._fuel_mass = value
+
+    @property
+    def throttle(self):
+        return self._throttle
+
+    @throttle.setter
+    def throttle(self, value):
+        self._throttle = value
+
+    def drag(self, altitude, velocity):
+        k = 0.5 * self.env.density * self.rocket.rocket_area * self.env.drag_coefficient
+        return k * np.exp(-altitude / self.env.scale_height) * velocity * velocity
+
+    def derivatives_gravity_turn(self, t, state):  # pylint: disable=unused-argument
+        vel, beta, alt, theta, fuel_mass = state  # pylint: disable=unused-variable
+
+        cos_beta = np.cos(beta)
+        sin_beta = np.sin(beta)
+
+        self.v_dot = (
+            self.thrust / self.mass
+            - self.drag(alt, vel) / self.mass
+            - self.gravity(alt) * cos_beta
+        )
+        alt_dot = vel * cos_beta
+        theta_dot = vel * sin_beta / (self.env.radius + alt)
+
+        beta_dot = self.gravity(alt) * sin_beta / vel - theta_dot
+        mass_fuel_dot = -self.thrust / self.rocket.motor_isp0 / self.env.gravity
+        self.fuel_mass = fuel_mass
+
+        return np.array([self.v_dot, beta_dot, alt_dot, theta_dot, mass_fuel_dot])
+
+
+def time_it(func, repeat=5):
+    ''' best wall time of repeat calls of func in seconds '''
+    return min(time_calls(func, repeat))
+
+
+def time_calls(func, repeat):
+    ''' wall times of repeat calls of func in seconds '''
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def record(results, name, timings, **extra):
+    results[name] = {
+        'best': min(timings),
+        'mean': sum(timings) / len(timings),
+        'repeat': len(timings),
+        **extra,
+    }
+    print(f'{name:<50} best {min(timings):10.4f} s  mean '
+          f'{results[name]["mean"]:10.4f} s  ({len(timings)}x)')
+
+
+def import_module(module):
+    ''' imports module in a fresh interpreter
+        returns import time (s) and the heavy modules loaded by the import
+    '''
+    output = subprocess.run(
+        [sys.executable, '-c', IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, check=True, cwd=Path(__file__).parent,
+    ).stdout.splitlines()
+    return float(output[0]), output[1].split() if len(output) > 1 else []
+
+
+def check_import_budget(results=None, repeat=3):
+    ''' times the import of each entry point against IMPORT_BUDGET
+        returns list of budget violations
+    '''
+    results = {} if results is None else results
+    violations = []
+    for module, (budget, allowed) in IMPORT_BUDGET.items():
+        timings, loaded = [], []
+        for _ in range(repeat):
+            import_time, loaded = import_module(module)
+            timings.append(import_time)
+
+        record(results, f'import[{module}]', timings, budget=budget, loaded=loaded)
+        if min(timings) > budget:
+            violations.append(f'{module}: import {min(timings):.3f} s > budget {budget} s')
+
+        if unexpected := sorted(set(loaded) - set(allowed)):
+            violations.append(f'{module}: imports {", ".join(unexpected)} on load')
+
+    return violations
+
+
+def benchmark_config(results, config_file_name, repeat):
+    record(results, f'read_rocket_config[{config_file_name.name}]',
+           time_calls(lambda: read_rocket_config(config_file_name), repeat))
+
+    _, _, model_params, display_params = read_rocket_config(config_file_name)
+    model_file = Path(model_params.model_file)
+    if model_file.is_file():
+        record(results, f'construct_control_array[{config_file_name.name}]',
+               time_calls(lambda: construct_control_array(
+                   model_file, display_params.time_interval,
+                   display_params.flight_duration), repeat))
+
+
+def benchmark_launch(results, config_file_name, repeat):
+    params = read_rocket_config(config_file_name)
+    if len(params[0].thrust_control) == 0:
+        print(f'launch[{config_file_name.name}]: skipped, no control file')
+        return
+
+    logger = launch(*params, headless=True)
+    record(results, f'launch[{config_file_name.name}]',
+           time_calls(lambda: launch(*params, headless=True), repeat),
+           rows=logger.index)
+
+
+def benchmark_gravity_turn(results, config_file_name, solved):
+    ''' build and solve the NLP once, configs with the same gravity turn
+        arguments as an earlier config are skipped
+    '''
+    arguments = gravity_turn_arguments(*read_rocket_config(config_file_name)[:3])
+    if arguments in solved:
+        print(f'gravity_turn[{config_file_name.name}]: skipped, same problem as before')
+        return
+
+    solved.append(arguments)
+    problem = {}
+
+    def build():
+        problem.update(build_gravity_turn(**arguments, print_level=0))
+
+    record(results, f'build_gravity_turn[{config_file_name.name}]', time_calls(build, 1))
+    record(results, f'solve_gravity_turn[{config_file_name.name}]',
+           time_calls(lambda: solve_gravity_turn(problem), 1),
+           iterations=problem['solver'].stats()['iter_count'])
+
+
+def benchmark_initial_guess(config_file_name, N=None):
+    ''' solves the gravity turn NLP from each initial guess
+        returns dictionary of guess name to the time of the guess, the solve
+        time, the iterations, the solver status and the largest shooting
+        defect of the initial guess
+    '''
+    rocket_params, environment_params, model_params, display_params = read_rocket_config(
+        config_file_name)
+    arguments = gravity_turn_arguments(rocket_params, environment_params, model_params)
+    arguments['N'] = N or model_params.N
+    problem = build_gravity_turn(**arguments, print_level=0)
+    guesses = {'linear': lambda: None, 'simulation': lambda: simulation_guess(
+        rocket_params, environment_params, model_params, N=arguments['N'])}
+    if len(rocket_params.thrust_control) > 0:
+        guesses['control'] = lambda: simulation_guess(
+            rocket_params, environment_params, model_params,
+            control=rocket_params.thrust_control,
+            time_interval=display_params.time_interval, N=arguments['N'])
+
+    results = {}
+    for name, make_guess in guesses.items():
+        start = time.perf_counter()
+        guess = make_guess()
+        guess_time = time.perf_counter() - start
+        x0 = problem['x0'] if guess is None else build_gravity_turn(
+            **arguments, print_level=0, initial_guess=guess)['x0']
+        solver = problem['solver']
+        start = time.perf_counter()
+        solver(x0=x0, lbx=problem['lbx'], ubx=problem['ubx'],
+               lbg=problem['lbg'], ubg=problem['ubg'])
+        stats = solver.stats()
+        results[name] = {
+            'guess_time': guess_time,
+            'solve_time': time.perf_counter() - start,
+            'iterations': stats['iter_count'],
+            'status': stats['return_status'],
+            'initial_defect': float(np.max(np.abs(np.array(problem['constraints'](x0))))),
+        }
+        print(f'{name:<12} guess {guess_time:7.3f} s  solve {results[name]["solve_time"]:8.2f} s'
+              f'  {stats["iter_count"]:4d} iterations  initial defect '
+              f'{results[name]["initial_defect"]:10.3g}  {stats["return_status"]}')
+
+    return results
+
+
+def benchmark_derivatives(config_files=CONFIG_FILES, N=None, linear_solvers=('mumps',)):
+    ''' solves the gravity turn NLP of each config with each derivative
+        strategy, configs with the same gravity turn arguments as an earlier
+        config are skipped
+        returns list of dictionaries with the strategy, iterations, times
+        and the final mass
+    '''
+    results = []
+    solved = []
+    unavailable = set()
+    for config_file_name in config_files:
+        arguments = gravity_turn_arguments(*read_rocket_config(config_file_name)[:3])
+        arguments['N'] = N or arguments['N']
+        if arguments in solved:
+            continue
+
+        solved.append(arguments)
+        config_results = []
+        for expand, hessian, sensitivity, linear_solver in itertools.product(
+                EXPAND, HESSIANS, SENSITIVITY_METHODS, linear_solvers):
+            if linear_solver in unavailable:
+                continue
+
+            problem = build_gravity_turn(
+                **arguments, print_level=0, expand=expand, hessian_approximation=hessian,
+                linear_solver=linear_solver,
+                integrator_options={'sensitivity_method': sensitivity})
+            solver = problem['solver']
+            start = time.perf_counter()
+            x = solver(x0=problem['x0'], lbx=problem['lbx'], ubx=problem['ubx'],
+                       lbg=problem['lbg'], ubg=problem['ubg'])['x']
+            total = time.perf_counter() - start
+            stats = solver.stats()
+            if stats['return_status'] == 'Invalid_Option':
+                # the linear solver is not in this IPOPT build
+                print(f'linear solver {linear_solver} not available')
+                unavailable.add(linear_solver)
+                continue
+
+            iterations = stats['iter_count']
+            config_results.append({
+                'config': config_file_name.name,
+                'N': arguments['N'],
+                'expand': expand,
+                'hessian_approximation': hessian,
+                'sensitivity_method': sensitivity,
+                'linear_solver': linear_solver,
+                'iterations': iterations,
+                'time': total,
+                'time_per_iteration': total / max(iterations, 1),
+                'status': stats['return_status'],
+                'final_mass': float(x[-problem['nx']]),
+            })
+            print(f'{config_file_name.name:<20} expand {expand!s:<5} {hessian:<14} '
+                  f'{sensitivity:<12} {linear_solver:<6} {iterations:4d} iterations '
+                  f'{total:8.2f} s {1000 * total / max(iterations, 1):8.1f} ms/iteration '
+                  f'{stats["return_status"]}')
+
+        # limited memory Hessians may stop in a different local optimum, the
+        # fastest strategy is taken from those that reach the best final mass
+        results.extend(config_results)
+        converged = [result for result in config_results if result['status'] in SOLVED]
+        if converged:
+            best = max(result['final_mass'] for result in converged)
+            fastest = min((result for result in converged
+                           if result['final_mass'] > best - OPTIMUM_TOLERANCE * abs(best)),
+                          key=lambda result: result['time'])
+            print(f'fastest to the best final mass {best:.2f}: expand {fastest["expand"]}, '
+                  f'{fastest["hessian_approximation"]} Hessian, '
+                  f'{fastest["sensitivity_method"]} sensitivities, {fastest["linear_solver"]}')
+
+    return results
+
+
+def benchmark_integrators(config_file_name, Ns=(100, 300, 1000, 2000), substeps=(1, 4),
+                          cvodes_max_N=300):
+    ''' solves the gravity turn NLP with each shooting integrator and N, the
+        CVODES solve is skipped above cvodes_max_N intervals, the RK4
+        solutions are always checked against the CVODES shooting defects
+        returns list of dictionaries with N, integrator, substeps, times,
+        iterations, final mass, horizon and defect
+    '''
+    arguments = gravity_turn_arguments(*read_rocket_config(config_file_name)[:3])
+    results = []
+    for N in Ns:
+        arguments['N'] = N
+        reference = build_gravity_turn(**arguments, print_level=0)
+        variants = [('rk4', steps) for steps in substeps]
+        if N <= cvodes_max_N:
+            variants.append(('cvodes', None))
+
+        for integrator, steps in variants:
+            start = time.perf_counter()
+            problem = reference if integrator == 'cvodes' else build_gravity_turn(
+                **arguments, print_level=0, integrator=integrator, substeps=steps)
+            build_time = time.perf_counter() - start
+            solver = problem['solver']
+            start = time.perf_counter()
+            x = solver(x0=problem['x0'], lbx=problem['lbx'], ubx=problem['ubx'],
+                       lbg=problem['lbg'], ubg=problem['ubg'])['x']
+            solve_time = time.perf_counter() - start
+            stats = solver.stats()
+            result = {
+                'N': N,
+                'integrator': integrator,
+                'substeps': steps,
+                'build_time': build_time,
+                'solve_time': solve_time,
+                'iterations': stats['iter_count'],
+                'status': stats['return_status'],
+                'final_mass': float(x[-problem['nx']]),
+                'horizon': float(x[0]),
+                'cvodes_defect': float(np.max(np.abs(np.array(reference['constraints'](x))))),
+            }
+            results.append(result)
+            label = integrator if steps is None else f'{integrator} x{steps}'
+            print(f'N {N:5d} {label:<8} build {build_time:7.2f} s  solve {solve_time:8.2f} s'
+                  f'  {result["iterations"]:4d} iterations  final mass '
+                  f'{result["final_mass"]:9.3f}  horizon {result["horizon"]:8.3f} s'
+                  f'  CVODES defect {result["cvodes_defect"]:9.2e}  {result["status"]}')
+
+    return results
+
+
+def benchmark_output_log(results, rows):
+    status = {'time': 1.0, 'mass': 2.0, 'vel': 3.0, 'beta': 4.0,
+              'alt': 5.0, 'theta': 6.0, 'control': 7.0}
+
+    def log_rows():
+        logger = OutputLog()
+        for _ in range(rows):
+            logger.log_status(status)
+
+    record(results, f'OutputLog.log_status[{rows}]', time_calls(log_rows, 1))
+
+
+def benchmark_map_plot(results, config_file_name, frames):
+    rocket_params, environment_params, model_params, display_params = (
+        read_rocket_config(config_file_name))
+    mapper = MapPlot(rocket_params, environment_params, model_params, display_params,
+                     interactive=False)
+
+    plot = mapper.plot_state_generator()
+    next(plot)
+    states = [{
+        'time': i, 'vel': 10.0 * i, 'beta': 0.1 * i, 'alt': 1_000.0 * i,
+        'theta': 0.01 * i, 'control': 1.0, 'mass': rocket_params.fuel_mass,
+    } for i in range(frames)]
+
+    def render():
+        for state in states:
+            plot.send(state)
+
+    record(results, f'MapPlot.frame[{config_file_name.name}]',
+           [timing / frames for timing in time_calls(render, 1)], frames=frames)
+
+
+def run_suite(groups=GROUPS, repeat=3, log_rows=100_000, frames=50,
+              config_files=CONFIG_FILES):
+    results = {}
+    solved = []
+    if 'startup' in groups:
+        for violation in check_import_budget(results, repeat):
+            print(violation)
+
+    for config_file_name in config_files:
+        if 'config' in groups:
+            benchmark_config(results, config_file_name, repeat)
+        if 'launch' in groups:
+            benchmark_launch(results, config_file_name, repeat)
+        if 'optimizer' in groups:
+            benchmark_gravity_turn(results, config_file_name, solved)
+
+    if 'log' in groups:
+        benchmark_output_log(results, log_rows)
+    if 'plot' in groups and config_files:
+        benchmark_map_plot(results, config_files[0], frames)
+
+    return {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=0.10):
+    ''' compares best timings of current against baseline results
+        returns list of names of the benchmarks that regressed more than threshold
+    '''
+    regressions = []
+    print(f'{"benchmark":<50} {"baseline":>10} {"current":>10} {"change":>8}')
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            print(f'{name:<50} {"-":>10} {result["best"]:10.4f}      new')
+            continue
+
+        base = baseline['results'][name]['best']
+        change = result['best'] / base - 1 if base > 0 else 0.0
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+
+        print(f'{name:<50} {base:10.4f} {result["best"]:10.4f} {change:+8.1%}{flag}')
+
+    return regressions
+
+
+def integrate_trajectory(physics, rocket_params, display_params):
+    ''' integrate the gravity turn on the output grid with the thrust control
+        of the config, returns array of shape (steps, 5)
+    '''
+    integrator = ode(physics.derivatives_gravity_turn).set_integrator('vode')
+    integrator.set_initial_value(
+        np.array([rocket_params.vel, rocket_params.beta, rocket_params.alt,
+                  0.0, rocket_params.fuel_mass]), 0.0)
+    control = rocket_params.thrust_control
+    steps = int(display_params.flight_duration / display_params.time_interval)
+    states = np.empty((steps, 5))
+    _time = 0.0
+    for index in range(steps):
+        physics.throttle = control[index]
+        _time += display_params.time_interval
+        states[index] = integrator.integrate(_time)
+        if not integrator.successful() or states[index, 2] < -100:
+            return states[:index + 1]
+
+    return states
+
+
+def benchmark_rhs(config_file_name, evaluations=100_000, rtol=1e-6):
+    rocket_params, environment_params, _, display_params = read_rocket_config(
+        config_file_name)
+    state = np.array([1_500.0, 0.6, 40_000.0, 0.02, rocket_params.fuel_mass / 2])
+
+    results = {}
+    trajectories = {}
+    # the fast right hand side is the one of launch
+    for name, physics_class in (('reference', ReferencePhysics), ('fast', RocketPhysics)):
+        physics = physics_class(rocket_params, environment_params)
+        physics.throttle = 1.0
+        rhs = physics.derivatives_gravity_turn
+
+        def evaluate():
+            for _ in range(evaluations):
+                rhs(0.0, state)
+
+        results[name] = evaluations / time_it(evaluate)
+        if len(rocket_params.thrust_control) > 0:
+            trajectories[name] = integrate_trajectory(
+                physics_class(rocket_params, environment_params),
+                rocket_params, display_params)
+
+    print(f'reference RHS: {results["reference"]:,.0f} evaluations/s')
+    print(f'fast RHS     : {results["fast"]:,.0f} evaluations/s')
+    print(f'speed up     : {results["fast"] / results["reference"]:.2f}x')
+
+    if trajectories:
+        reference, fast = trajectories['reference'], trajectories['fast']
+        if reference.shape != fast.shape:
+            raise AssertionError(
+                f'trajectory length differs: {reference.shape} != {fast.shape}')
+
+        scale = np.maximum(np.abs(reference), 1.0)
+        deviation = np.max(np.abs(fast - reference) / scale)
+        identical = np.array_equal(fast, reference)
+        print(f'trajectory   : {len(fast)} steps, '
+              f'{"bit-for-bit identical" if identical else f"max deviation {deviation:.2e}"}')
+        if deviation > rtol:
+            raise AssertionError(f'trajectory deviation {deviation:.2e} exceeds {rtol:.0e}')
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmarks for the rocket programs')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    suite_parser = subparsers.add_parser('suite', help='run the benchmark suite')
+    suite_parser.add_argument('--output', type=Path, default=Path('benchmark_results.json'))
+    suite_parser.add_argument('--groups', nargs='+', choices=GROUPS, default=GROUPS)
+    suite_parser.add_argument('--repeat', type=int, default=3)
+    suite_parser.add_argument('--log-rows', type=int, default=100_000)
+    suite_parser.add_argument('--frames', type=int, default=50)
+
+    startup_parser = subparsers.add_parser('startup', help='import time budget check')
+    startup_parser.add_argument('--repeat', type=int, default=3)
+
+    compare_parser = subparsers.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('baseline', type=Path)
+    compare_parser.add_argument('current', type=Path)
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help='relative slow down flagged as regression')
+
+    guess_parser = subparsers.add_parser('guess', help='initial guesses of the gravity turn')
+    guess_parser.add_argument('config_file_name', type=Path)
+    guess_parser.add_argument('--N', type=int, help='shooting intervals, default the config')
+    guess_parser.add_argument('--output', type=Path, help='write the results to this JSON file')
+
+    derivatives_parser = subparsers.add_parser(
+        'derivatives', help='derivative strategies of the gravity turn NLP')
+    derivatives_parser.add_argument('config_file_names', type=Path, nargs='*',
+                                    default=CONFIG_FILES)
+    derivatives_parser.add_argument('--N', type=int, help='shooting intervals, default the config')
+    derivatives_parser.add_argument('--linear-solvers', nargs='+', default=['mumps'],
+                                    help='IPOPT linear solvers, e.g. mumps ma27 ma57')
+    derivatives_parser.add_argument('--output', type=Path,
+                                    help='write the results to this JSON file')
+
+    integrators_parser = subparsers.add_parser(
+        'integrators', help='CVODES and RK4 shooting integrators of the gravity turn NLP')
+    integrators_parser.add_argument('config_file_name', type=Path)
+    integrators_parser.add_argument('--N', type=int, nargs='+', default=[100, 300, 1000, 2000])
+    integrators_parser.add_argument('--substeps', type=int, nargs='+', default=[1, 4])
+    integrators_parser.add_argument('--cvodes-max-N', type=int, default=300,
+                                    help='largest N solved with CVODES')
+    integrators_parser.add_argument('--output', type=Path,
+                                    help='write the results to this JSON file')
+
+    rhs_parser = subparsers.add_parser('rhs', help='gravity turn right hand side')
+    rhs_parser.add_argument('config_file_name', type=Path)
+    rhs_parser.add_argument('--evaluations', type=int, default=100_000)
+    rhs_parser.add_argument('--rtol', type=float, default=1e-6)
+
+    args = parser.parse_args()
+
+    if args.command == 'suite':
+        suite = run_suite(args.groups, args.repeat, args.log_rows, args.frames)
+        args.output.write_text(json.dumps(suite, indent=2))
+        print(f'results written to {args.output}')
+
+    elif args.command == 'startup':
+        violations = check_import_budget(repeat=args.repeat)
+        for violation in violations:
+            print(violation)
+
+        if violations:
+            sys.exit(1)
+
+    elif args.command == 'compare':
+        regressions = compare(json.loads(args.baseline.read_text()),
+                              json.loads(args.current.read_text()), args.threshold)
+        if regressions:
+            print(f'{len(regressions)} regression(s) beyond {args.threshold:.0%}')
+            sys.exit(1)
+
+    elif args.command == 'guess':
+        if not args.config_file_name.is_file():
+            print(f'incorrect config file: {args.config_file_name}')
+            exit()
+
+        results = benchmark_initial_guess(args.config_file_name, args.N)
+        if args.output:
+            args.output.write_text(json.dumps(results, indent=2))
+
+    elif args.command == 'derivatives':
+        results = benchmark_derivatives(args.config_file_names, args.N, args.linear_solvers)
+        if args.output:
+            args.output.write_text(json.dumps(results, indent=2))
+
+    elif args.command == 'integrators':
+        if not args.config_file_name.is_file():
+            print(f'incorrect config file: {args.config_file_name}')
+            exit()
+
+        results = benchmark_integrators(args.config_file_name, args.N, args.substeps,
+                                        args.cvodes_max_N)
+        if args.output:
+            args.output.write_text(json.dumps(results, indent=2))
+
+    elif args.command == 'rhs':
+        if not args.config_file_name.is_file():
+            print(f'incorrect config file: {args.config_file_name}')
+            exit()
+
+        benchmark_rhs(args.config_file_name, args.evaluations, args.rtol)
+
+
+if __name__ == '__main__':
+    main()
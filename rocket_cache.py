@@ -0,0 +1,224 @@
+''' content addressed cache for whole launch and gravity turn runs
+
+    Results are stored on disk as npz files named by the sha256 digest of
+    the canonical JSON of the inputs of the run and the code version, a hash
+    of the source of the modules that compute the result:
+        launch: RocketParams, EnvironmentParams and ModelParams (without the
+            control file name), the time interval, status update step and
+            flight duration of DisplayParams, and the thrust control data
+        gravity turn: the arguments of compute_gravity_turn
+
+    The cache is bounded in size, the least recently used results are
+    evicted first. bypass=True computes without reading or writing the cache,
+    invalidate=True drops the stored result and computes it again.
+
+    usage:
+        cache = ResultCache('.rocket_cache')
+        trajectory = cached_launch(*read_rocket_config(config_file_name), cache=cache)
+
+        python rocket_cache.py stats
+        python rocket_cache.py clear
+'''
+import os
+import sys
+import json
+import numbers
+import hashlib
+import tempfile
+from dataclasses import asdict
+from pathlib import Path
+import numpy as np
+
+LAUNCH_MODULES = ('rocket_launch.py', 'rocket_input.py', 'rocket_output.py',
+                  'rocket_checkpoint.py', 'rocket_profile.py', 'rocket_control.py')
+GRAVITY_TURN_MODULES = ('rocket_casadi_solution.py',)
+DISPLAY_KEYS = ('time_interval', 'status_update_step', 'flight_duration')
+
+
+def code_version(modules):
+    ''' sha256 digest of the source of the modules '''
+    digest = hashlib.sha256()
+    for module in modules:
+        digest.update((Path(__file__).parent / module).read_bytes())
+
+    return digest.hexdigest()
+
+
+def launch_key(rocket_params, environment_params, model_params, display_params):
+    rocket = asdict(rocket_params)
+    control = np.ascontiguousarray(rocket.pop('thrust_control'), dtype=np.float64)
+    model = asdict(model_params)
+    model.pop('model_file')
+    inputs = {
+        'kind': 'launch',
+        'rocket': rocket,
+        'environment': asdict(environment_params),
+        'model': model,
+        'display': {key: getattr(display_params, key) for key in DISPLAY_KEYS},
+        'control': hashlib.sha256(control.tobytes()).hexdigest(),
+        'code': code_version(LAUNCH_MODULES),
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def canonical(value):
+    ''' JSON value of an argument, numbers as float so 1 and 1.0 share a key,
+        arrays by the digest of their data and other objects by their repr
+    '''
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+
+    if isinstance(value, numbers.Real):
+        return float(value)
+
+    if value is None or isinstance(value, str):
+        return value
+
+    if isinstance(value, dict):
+        return {str(key): canonical(item) for key, item in value.items()}
+
+    if isinstance(value, (list, tuple)):
+        return [canonical(item) for item in value]
+
+    if isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        return [str(value.dtype), value.shape, hashlib.sha256(value.tobytes()).hexdigest()]
+
+    return repr(value)
+
+
+def gravity_turn_key(arguments):
+    inputs = {
+        'kind': 'gravity_turn',
+        'arguments': canonical(arguments),
+        'code': code_version(GRAVITY_TURN_MODULES),
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+
+    def __init__(self, directory='.rocket_cache', max_bytes=512 * 2**20):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key):
+        return self.directory / f'{key}.npz'
+
+    def get(self, key):
+        ''' stored result as dictionary of arrays or None '''
+        path = self.path(key)
+        try:
+            with np.load(path) as result_file:
+                result = {name: result_file[name] for name in result_file.files}
+
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        # the modification time orders the results for eviction
+        os.utime(path)
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        # a temporary file of its own, so concurrent writers of the same key
+        # do not write into each other's file
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix='.tmp',
+                                         delete=False) as result_file:
+            np.savez(result_file, **result)
+
+        os.replace(result_file.name, self.path(key))
+        self.evict()
+
+    def invalidate(self, key):
+        self.path(key).unlink(missing_ok=True)
+
+    def clear(self):
+        for path in self.directory.glob('*.npz'):
+            path.unlink()
+
+    def evict(self):
+        ''' removes least recently used results until the cache fits max_bytes '''
+        files = sorted(
+            ((path.stat().st_mtime, path.stat().st_size, path)
+             for path in self.directory.glob('*.npz')),
+            key=lambda item: item[0])
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+
+            path.unlink()
+            total -= size
+
+    def stats(self):
+        files = list(self.directory.glob('*.npz'))
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'results': len(files),
+            'bytes': sum(path.stat().st_size for path in files),
+            'max_bytes': self.max_bytes,
+        }
+
+    def cached(self, key, compute, bypass=False, invalidate=False):
+        ''' result of compute() through the cache '''
+        if bypass:
+            return compute()
+
+        if invalidate:
+            self.invalidate(key)
+
+        result = self.get(key)
+        if result is None:
+            result = compute()
+            if result is not None:
+                self.put(key, result)
+
+        return result
+
+
+def cached_launch(rocket_params, environment_params, model_params, display_params,
+                  cache=None, bypass=False, invalidate=False):
+    ''' headless launch through the cache
+        returns the logged trajectory as a dictionary of arrays t, m, v, beta,
+        h, theta and u
+    '''
+    from rocket_launch import launch
+
+    params = (rocket_params, environment_params, model_params, display_params)
+    cache = cache or ResultCache()
+    return cache.cached(
+        launch_key(*params),
+        lambda: launch(*params, headless=True).as_arrays(),
+        bypass=bypass, invalidate=invalidate)
+
+
+def cached_gravity_turn(arguments, cache=None, bypass=False, invalidate=False):
+    ''' compute_gravity_turn(**arguments) through the cache
+        returns the result dictionary or None if the solver failed, a failed
+        solve is not stored
+    '''
+    from rocket_casadi_solution import compute_gravity_turn
+
+    cache = cache or ResultCache()
+    return cache.cached(
+        gravity_turn_key(arguments),
+        lambda: compute_gravity_turn(**arguments),
+        bypass=bypass, invalidate=invalidate)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] not in ('stats', 'clear'):
+        print('usage: python rocket_cache.py stats|clear')
+        exit()
+
+    result_cache = ResultCache()
+    if sys.argv[1] == 'clear':
+        result_cache.clear()
+
+    print(result_cache.stats())
@@ -8,61 +8,75 @@ Based on:
 '''
 import sys
 from pathlib import Path
-import pandas as pd
-import matplotlib.pyplot as plt
-from rocket_input import read_rocket_config
+import numpy as np
+from rocket_input import read_rocket_config, read_solution
+from rocket_lod import decimate
 
 rad_degrees = 180.0 / 3.141592653589793
+# result files with more points are decimated before plotting
+MAX_POINTS = 4_000
 
-def plot(result_df, rocket, display):
+def plot(result, rocket, display):
+    import matplotlib.pyplot as plt
     FIGSIZE = (6, 8)
     fig, axes = plt.subplots(nrows=3, ncols=2, figsize=FIGSIZE)
     ax_vel, ax_beta = axes[0]
     ax_alt, ax_theta = axes[1]
     ax_throttle, ax_mass = axes[2]
 
-    time_series = result_df['time'].to_numpy()
+    time_series = np.asarray(result['time'])
 
-    vel_series = result_df['vel'].to_numpy()
+    vel_series = np.asarray(result['vel'])
     ax_vel.set_xlim(0, display.flight_duration)
     ax_vel.set_ylim(display.vel_min_max[0], display.vel_min_max[1])
-    vel_plot, = ax_vel.plot(time_series, vel_series, color='black', linewidth=1)
+    vel_plot, = ax_vel.plot(
+        *decimate(time_series, vel_series, MAX_POINTS), color='black', linewidth=1)
 
-    beta_series = result_df['ver_angle'].to_numpy() * rad_degrees
+    beta_series = np.asarray(result['ver_angle']) * rad_degrees
     ax_beta.set_xlim(0, display.flight_duration)
     ax_beta.set_ylim(display.beta_min_max[0], display.beta_min_max[1])
-    beta_plot, = ax_beta.plot(time_series, beta_series, color='black', linewidth=1)
+    beta_plot, = ax_beta.plot(
+        *decimate(time_series, beta_series, MAX_POINTS), color='black', linewidth=1)
 
-    alt_series = result_df['alt'].to_numpy()
+    alt_series = np.asarray(result['alt'])
     ax_alt.set_xlim(0, display.flight_duration)
     ax_alt.set_ylim(0, display.alt_min_max[1])
-    alt_plot, = ax_alt.plot(time_series, alt_series, color='black', linewidth=1)
+    alt_plot, = ax_alt.plot(
+        *decimate(time_series, alt_series, MAX_POINTS), color='black', linewidth=1)
 
-    theta_series = result_df['hor_angle'].to_numpy() * rad_degrees
+    theta_series = np.asarray(result['hor_angle']) * rad_degrees
     ax_theta.set_xlim(0, display.flight_duration)
     ax_theta.set_ylim(display.theta_min_max[0], display.theta_min_max[1])
-    theta_plot, = ax_theta.plot(time_series, theta_series, color='black', linewidth=1)
+    theta_plot, = ax_theta.plot(
+        *decimate(time_series, theta_series, MAX_POINTS), color='black', linewidth=1)
 
     # ax_acc.set_xlim(0, display.flight_duration)
     # ax_acc.set_ylim(display.acc_min_max[0], display.acc_min_max[1])
     # acc_plot, = ax_acc.plot([0], [0], color='black', linewidth=1)
 
-    mass_series = result_df['mass'].to_numpy()
+    mass_series = np.asarray(result['mass'])
     ax_mass.set_xlim(0, display.flight_duration)
     ax_mass.set_ylim(0, rocket.dry_mass + rocket.fuel_mass)
-    mass_plot, = ax_mass.plot(time_series, mass_series, color='red', linewidth=3)
+    mass_plot, = ax_mass.plot(
+        *decimate(time_series, mass_series, MAX_POINTS), color='red', linewidth=3)
 
-    throttle_series = result_df['control'].to_numpy()
+    throttle_series = np.asarray(result['control'])
     ax_throttle.set_xlim(0, display.flight_duration)
     ax_throttle.set_ylim(0, 1.2)
-    throttle_plot, = ax_throttle.plot(time_series, throttle_series, color='red', linewidth=3)
+    throttle_plot, = ax_throttle.plot(
+        *decimate(time_series, throttle_series, MAX_POINTS), color='red', linewidth=3)
 
     plt.show()
 
 def main(config_file_name):
     rocket_params, _, model_params, display_params = read_rocket_config(config_file_name)
-    result_df = pd.read_excel(model_params.model_file)
-    plot(result_df, rocket_params, display_params)
+    result = read_solution(model_params.model_file)
+    metadata = result.pop('metadata')
+    metadata.pop('parameters', None)
+    if metadata:
+        print(', '.join(f'{name}: {value}' for name, value in metadata.items()))
+
+    plot(result, rocket_params, display_params)
 
 
 
@@ -6,19 +6,87 @@ Based on:
   https://github.com/zegkljan/kos-stuff/tree/master/non-kos-tools/gturn
 ----------------------------------------------------------------
 '''
-import sys
+import argparse
+from math import pi
 from pathlib import Path
-import casadi as cs
 import numpy as np
-import pandas as pd
-from rocket_input import read_rocket_config
+from rocket_input import read_rocket_config, write_solution
+
+# coast time (s) after the burn of the full throttle initial guess
+COAST_LIMIT = 10_000.0
 
 
 # noinspection PyPep8Naming
-def compute_gravity_turn(m0, m1, g0, r0, Isp0, Isp1, Fmax, cd, A, H, rho, h_obj,
-                         v_obj, q_obj, N=300, vel_eps=1e-3):
+def gravity_turn_ode(x, u, g0, r0, Isp0, Isp1, Fmax, cd, A, H, rho):
     '''
-    Computes gravity turn profile
+    Right hand side of the gravity turn in physical time
+    :params:
+        x: casadi state [m, v, q, h, d]
+        u: casadi throttle
+        other: see build_gravity_turn, numbers or casadi symbols
+
+    :returns:
+        list of the derivatives [mdot, vdot, qdot, hdot, ddot]
+    '''
+    import casadi as cs
+
+    # Introduce symbolic expressions for important composite terms
+    Fthrust = Fmax * u
+    Fdrag = 0.5 * A * cd * rho * cs.exp(-x[3] / H) * x[1] ** 2
+    r = x[3] + r0
+    g = g0 * (r0 / r) ** 2
+    vhor = x[1] * cs.sin(x[2])
+    vver = x[1] * cs.cos(x[2])
+    Isp = Isp1 + (Isp0 - Isp1) * cs.exp(-x[3] / H)
+
+    # Build symbolic expressions for ODE right hand side
+    mdot = -(Fthrust / (Isp * g0))
+    vdot = (Fthrust - Fdrag) / x[0] - g * cs.cos(x[2])
+    hdot = vver
+    ddot = vhor / r
+    qdot = g * cs.sin(x[2]) / x[1] - ddot
+    return [mdot, vdot, qdot, hdot, ddot]
+
+
+def rk4_integrator(dae, tf, substeps):
+    '''
+    Fixed step explicit Runge-Kutta (RK4) integrator of an ODE with
+    quadrature, built symbolically so its derivatives are plain AD
+    :params:
+        dae: dictionary of SX x, p, ode and quad as for casadi.integrator
+        tf: integration time
+        substeps: number of RK4 steps
+
+    :returns:
+        casadi Function with the inputs x0, p and the outputs xf, qf like
+        casadi.integrator
+    '''
+    import casadi as cs
+
+    x, p = dae['x'], dae['p']
+    f = cs.Function('f', [x, p], [dae['ode'], dae['quad']])
+    h = tf / substeps
+    xf = x
+    qf = cs.SX.zeros(dae['quad'].shape)
+    for _ in range(substeps):
+        k1, q1 = f(xf, p)
+        k2, q2 = f(xf + 0.5 * h * k1, p)
+        k3, q3 = f(xf + 0.5 * h * k2, p)
+        k4, q4 = f(xf + h * k3, p)
+        xf = xf + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+        qf = qf + h / 6 * (q1 + 2 * q2 + 2 * q3 + q4)
+
+    return cs.Function('I', [x, p], [xf, qf], ['x0', 'p'], ['xf', 'qf'])
+
+
+# noinspection PyPep8Naming
+def build_gravity_turn(m0, m1, g0, r0, Isp0, Isp1, Fmax, cd, A, H, rho, h_obj,
+                       v_obj, q_obj, N=300, vel_eps=1e-3, print_level=5,
+                       ipopt_options=None, initial_guess=None, expand=False,
+                       hessian_approximation='exact', linear_solver='mumps',
+                       integrator_options=None, integrator='cvodes', substeps=4):
+    '''
+    Builds the direct multiple shooting NLP for the gravity turn
     :params:
         m0: wet (launch) mass (kg or ton)
         m1: dry mass (kg or ton)
@@ -37,39 +105,47 @@ def compute_gravity_turn(m0, m1, g0, r0, Isp0, Isp1, Fmax, cd, A, H, rho, h_obj,
         N: number of shooting interval
         vel_eps: initial velocity (must be nonzero, e.g. a very small number)
         (m * s^-1 or km * s^-1)
+        print_level: IPOPT print level
+        ipopt_options: additional IPOPT options, e.g. max_wall_time
+        initial_guess: dictionary with the horizon T, the states x at the
+        N + 1 shooting nodes and the controls u of the N intervals, e.g. from
+        simulation_guess, default a linear interpolation between the initial
+        and the final state
+        expand: expand the NLP functions to SX, the CVODES integrator stays
+        a call node
+        hessian_approximation: 'exact' (second order sensitivities of
+        CVODES) or 'limited-memory' (quasi-Newton)
+        linear_solver: linear solver of IPOPT, e.g. 'mumps' or 'ma27'
+        integrator_options: additional CVODES options, e.g.
+        sensitivity_method or fsens_err_con
+        integrator: 'cvodes' (adaptive) or 'rk4' (fixed step, symbolic);
+        with 'rk4' the first interval stays on CVODES, the flight angle rate
+        g sin(q) / v is too stiff at the launch velocity for a fixed step
+        substeps: RK4 steps per shooting interval
 
     :returns:
-        a dictionary with results
+        a dictionary with the solver, the shooting defect function, initial
+        guess, bounds and block sizes
     '''
+    import casadi as cs
+
     # Create symbolic variables
     x = cs.SX.sym('[m, v, q, h, d]')  # Vehicle state
     u = cs.SX.sym('u')  # Vehicle controls
     T = cs.SX.sym('T')  # Time horizon (s)
 
-    # Introduce symbolic expressions for important composite terms
-    Fthrust = Fmax * u
-    Fdrag = 0.5 * A * cd * rho * cs.exp(-x[3] / H) * x[1] ** 2
-    r = x[3] + r0
-    g = g0 * (r0 / r) ** 2
-    vhor = x[1] * cs.sin(x[2])
-    vver = x[1] * cs.cos(x[2])
-    Isp = Isp1 + (Isp0 - Isp1) * cs.exp(-x[3] / H)
-
-    # Build symbolic expressions for ODE right hand side
-    mdot = -(Fthrust / (Isp * g0))
-    vdot = (Fthrust - Fdrag) / x[0] - g * cs.cos(x[2])
-    hdot = vver
-    ddot = vhor / r
-    qdot = g * cs.sin(x[2]) / x[1] - ddot
-
     # Build the DAE function
-    ode = [mdot, vdot, qdot, hdot, ddot]
+    ode = gravity_turn_ode(x, u, g0, r0, Isp0, Isp1, Fmax, cd, A, H, rho)
     quad = u
     dae = {'x': x, 'p': cs.vertcat(u, T), 'ode': T * cs.vertcat(*ode), 'quad': T * quad}
     I = cs.integrator(
         'I', 'cvodes', dae,
-        {'t0': 0.0, 'tf': 1.0 / N, 'nonlinear_solver_iteration': 'functional'}
+        {'t0': 0.0, 'tf': 1.0 / N, 'nonlinear_solver_iteration': 'functional',
+         **(integrator_options or {})}
     )
+    integrators = [I] * N
+    if integrator == 'rk4':
+        integrators[1:] = [rk4_integrator(dae, 1.0 / N, substeps)] * (N - 1)
 
     # Specify upper and lower bounds as well as initial values for DAE
     # parameters, states and controls
@@ -112,7 +188,7 @@ def compute_gravity_turn(m0, m1, g0, r0, Isp0, Isp1, Fmax, cd, A, H, rho, h_obj,
     # Build DMS structure
     x0 = p_init + x0_init
     for i in range(0, N):
-        Y = I(x0=X[i], p=cs.vertcat(U[i], P))
+        Y = integrators[i](x0=X[i], p=cs.vertcat(U[i], P))
         G += [Y['xf'] - X[i + 1]]
         F = F + Y['qf']
 
@@ -120,24 +196,58 @@ def compute_gravity_turn(m0, m1, g0, r0, Isp0, Isp1, Fmax, cd, A, H, rho, h_obj,
         x0 = x0 + u_init + [x0_init[i] + frac * (xf_init[i] - x0_init[i])
                             for i in range(0, nx)]
 
+    if initial_guess is not None:
+        states = np.asarray(initial_guess['x'], dtype=float).tolist()
+        controls = np.asarray(initial_guess['u'], dtype=float).tolist()
+        x0 = [float(initial_guess['T'])] + states[0]
+        for i in range(0, N):
+            x0 = x0 + [controls[i]] + states[i + 1]
+
     # Lower and upper bounds for solver
     lbg = 0.0
     ubg = 0.0
     lbx = p_min + x0_min + u_min + (N - 1) * (x_min + u_min) + xf_min
     ubx = p_max + x0_max + u_max + (N - 1) * (x_max + u_max) + xf_max
 
-    # Solve the problem using IPOPT
+    # Build the NLP solver using IPOPT
     nlp = {'x': V, 'f': (m0 - X[-1][0]) / (m0 - m1), 'g': cs.vertcat(*G)}
     S = cs.nlpsol(
-        'S', 'ipopt', nlp, {'ipopt': {'tol': 1e-4, 'print_level': 5, 'max_iter': 500}}
+        'S', 'ipopt', nlp,
+        {'ipopt': {'tol': 1e-4, 'print_level': print_level, 'max_iter': 500,
+                   'hessian_approximation': hessian_approximation,
+                   'linear_solver': linear_solver, **(ipopt_options or {})},
+         'expand': expand, 'print_time': print_level > 0}
     )
-    r = S(x0=x0, lbx=lbx, ubx=ubx, lbg=lbg, ubg=ubg)
+    return {
+        'solver': S,
+        'constraints': cs.Function('G', [V], [nlp['g']]),
+        'x0': x0,
+        'lbx': lbx,
+        'ubx': ubx,
+        'lbg': lbg,
+        'ubg': ubg,
+        'N': N,
+        'npars': npars,
+        'nx': nx,
+        'ns': ns,
+    }
+
+
+def solve_gravity_turn(problem):
+    '''
+    Solves the NLP built by build_gravity_turn
+    :returns:
+        a dictionary with results or None if the solver failed
+    '''
+    S = problem['solver']
+    N, npars, nx, ns = problem['N'], problem['npars'], problem['nx'], problem['ns']
+    r = S(x0=problem['x0'], lbx=problem['lbx'], ubx=problem['ubx'],
+          lbg=problem['lbg'], ubg=problem['ubg'])
     print('RESULT: {}'.format(S.stats()['return_status']))
     if S.stats()['return_status'] in {'Invalid_Number_Detected'}:
         return None
     # Extract state sequences and parameters from result
     x = r['x']
-    f = r['f']
     T = float(x[0])
 
     t = np.linspace(0, T, N + 1)
@@ -159,58 +269,238 @@ def compute_gravity_turn(m0, m1, g0, r0, Isp0, Isp1, Fmax, cd, A, H, rho, h_obj,
     }
 
 
-def main(config_file):
+# noinspection PyPep8Naming
+def compute_gravity_turn(m0, m1, g0, r0, Isp0, Isp1, Fmax, cd, A, H, rho, h_obj,
+                         v_obj, q_obj, N=300, vel_eps=1e-3, print_level=5,
+                         initial_guess=None, integrator='cvodes', substeps=4,
+                         expand=False, hessian_approximation='exact', linear_solver='mumps',
+                         ipopt_options=None, integrator_options=None):
+    '''
+    Computes gravity turn profile
+    :params:
+        see build_gravity_turn, with integrator='rk4' the first shooting
+        interval stays on CVODES; the exact Hessian of the default reaches a
+        better optimum than the faster limited-memory approximation, and
+        expand is slower with the CVODES call nodes
+
+    :returns:
+        a dictionary with results
+    '''
+    return solve_gravity_turn(build_gravity_turn(
+        m0, m1, g0, r0, Isp0, Isp1, Fmax, cd, A, H, rho, h_obj, v_obj, q_obj,
+        N=N, vel_eps=vel_eps, print_level=print_level, initial_guess=initial_guess,
+        integrator=integrator, substeps=substeps, expand=expand,
+        hessian_approximation=hessian_approximation, linear_solver=linear_solver,
+        ipopt_options=ipopt_options, integrator_options=integrator_options
+    ))
+
+
+def solution_metadata(problem, result, arguments):
+    '''
+    Metadata of a solution for write_solution
+    :returns:
+        a dictionary with the horizon, objective, solver status and
+        iterations and the gravity turn arguments
+    '''
+    stats = problem['solver'].stats()
+    return {
+        'T': float(result['time'][-1]),
+        'objective': float((arguments['m0'] - result['mass'][-1])
+                           / (arguments['m0'] - arguments['m1'])),
+        'status': stats['return_status'],
+        'iterations': stats['iter_count'],
+        'parameters': {name: float(value) for name, value in arguments.items()},
+    }
+
+
+def gravity_turn_arguments(rocket_params, environment_params, model_params):
+    '''
+    Arguments of compute_gravity_turn from the config parameters
+    :returns:
+        a dictionary with keyword arguments
+    '''
+    return {
+        'm0': rocket_params.fuel_mass + rocket_params.dry_mass,  # Launch mass (kg or ton)
+        'm1': rocket_params.dry_mass,             # Dry mass (kg or ton)
+        'g0': environment_params.gravity,         # Gravitational acceleration at altitude zero
+        'r0': environment_params.radius,          # Radius at altitude zero (m or km)
+        'Isp0': rocket_params.motor_isp0,         # Specific impulse at zero altude (s)
+        'Isp1': rocket_params.motor_isp1,         # Specific impulse at vacuum (s)
+        'Fmax': rocket_params.max_thrust,         # Maximum thrust (N or MN)
+        'cd': environment_params.drag_coefficient,  # Drag coefficients
+        'A': rocket_params.rocket_area,           # Reference area (m^2)
+        'H': environment_params.scale_height,     # Scale height (m or km)
+        'rho': environment_params.density,        # Density at altitude zero (x 1000)
+        'h_obj': model_params.h_obj,              # Target altitude (m or km)
+        'v_obj': model_params.v_obj,              # Target velocity (m/s or km/s)
+        'q_obj': model_params.q_obj / 180 * pi,  # Target angle to vertical (rad)
+        'N': model_params.N,                      # Number of shooting intervals
+        'vel_eps': rocket_params.vel,             # Initial velocity (m/s or km/s)
+    }
+
+
+def simulate_nodes(physics, y0, edges, controls, events=()):
+    '''
+    Integrates the launch dynamics with a piecewise constant throttle
+    :params:
+        physics: rocket_launch.RocketPhysics
+        y0: launch state [vel, beta, alt, theta, fuel_mass]
+        edges: times of the control changes, len(controls) + 1
+        events: terminal events of solve_ivp
+
+    :returns:
+        the final time, the states at the edges up to the final time and the
+        final state, the final time is that of the first event or the last edge
+    '''
+    from scipy.integrate import solve_ivp
+
+    def rhs(t, y):
+        # the mass of the state, not the fuel mass of the previous call
+        physics.fuel_mass = y[4]
+        # the derivatives buffer of RocketPhysics is reused, solve_ivp keeps it
+        return physics.derivatives_gravity_turn(t, y).copy()
+
+    states = [np.asarray(y0, dtype=float)]
+    for i, throttle in enumerate(controls):
+        physics.throttle = throttle
+        r = solve_ivp(rhs, (edges[i], edges[i + 1]), states[-1], rtol=1e-8, atol=1e-8,
+                      events=events or None)
+        if r.status == 1:
+            return r.t[-1], np.array(states), r.y[:, -1]
+
+        states.append(r.y[:, -1])
+
+    return edges[-1], np.array(states), states[-1]
+
+
+def simulation_guess(rocket_params, environment_params, model_params, control=None,
+                     time_interval=1.0, N=None):
+    '''
+    Initial guess of build_gravity_turn from a forward simulation with the
+    dynamics of rocket_launch, so the shooting defects start near zero (the
+    launch dynamics have the constant Isp0, the mass defects are not zero
+    if Isp1 differs)
+    :params:
+        control: thrust control on the time_interval grid, e.g. of the
+        control file, with the initial flight angle of the config; None for
+        full throttle until the fuel is spent and a coast, the initial flight
+        angle is then searched so the flight turns horizontal at h_obj
+        N: number of shooting intervals, default that of the model
+
+    :returns:
+        a dictionary with the horizon T, the states x (N + 1, [m, v, q, h, d])
+        and the controls u (N) of the shooting intervals, the horizon is the
+        time the flight turns horizontal (q_obj) or crashes, or the end of the
+        control
+    '''
+    from rocket_launch import RocketPhysics
+
+    N = N or model_params.N
+    q_obj = model_params.q_obj / 180 * pi
+    fuel_flow = rocket_params.max_thrust / (rocket_params.motor_isp0 * environment_params.gravity)
+
+    def horizontal(t, y):
+        return y[1] - q_obj
+
+    def crash(t, y):
+        return y[2] + 1.0
+
+    horizontal.terminal = crash.terminal = True
+    horizontal.direction = 1
+
+    def fly(beta, edges, controls, events=(horizontal, crash)):
+        y0 = [rocket_params.vel, beta, rocket_params.alt, 0.0, rocket_params.fuel_mass]
+        return simulate_nodes(RocketPhysics(rocket_params, environment_params),
+                              y0, edges, controls, list(events))
+
+    if control is None:
+        burn_time = rocket_params.fuel_mass / fuel_flow
+        edges = [0.0, burn_time, burn_time + COAST_LIMIT]
+        cumulative = [0.0, burn_time, burn_time]
+        # the altitude where the flight turns horizontal falls with the
+        # initial flight angle, bisection on its logarithm
+        low, high = np.log(1e-6), np.log(0.1)
+        for _ in range(40):
+            beta = np.exp(0.5 * (low + high))
+            T, _, y = fly(beta, edges, [1.0, 0.0])
+            if y[2] > model_params.h_obj:
+                low = np.log(beta)
+
+            else:
+                high = np.log(beta)
+
+    else:
+        control = np.asarray(control, dtype=float)
+        beta = rocket_params.beta
+        edges = time_interval * np.arange(len(control) + 1)
+        cumulative = time_interval * np.concatenate(([0.0], np.cumsum(control)))
+        T, _, _ = fly(beta, edges, control)
+
+    # throttle averaged over the shooting intervals, limited to the fuel left
+    node_times = np.linspace(0, T, N + 1)
+    dt = T / N
+    u = np.clip(np.diff(np.interp(node_times, edges, cumulative)) / dt, 0.0, 1.0)
+    fuel = rocket_params.fuel_mass
+    for i in range(N):
+        u[i] = min(u[i], fuel / (fuel_flow * dt))
+        fuel -= u[i] * fuel_flow * dt
+
+    _, states, _ = fly(beta, node_times, u, events=())
+    vel, q, alt, theta, fuel_mass = states.T
+    return {
+        'T': T,
+        'x': np.column_stack((rocket_params.dry_mass + fuel_mass, vel, q, alt, theta)),
+        'u': u,
+    }
+
+
+def main(config_file, initial_guess='linear', integrator='cvodes', substeps=4):
     (   rocket_params,
         environment_params,
         model_params,
         io_params
     ) = read_rocket_config(config_file)
 
-    # Vehicle parameters
-    m0   = (rocket_params.fuel_mass +
-            rocket_params.dry_mass)           # Launch mass (kg or ton)
-    m1   = rocket_params.dry_mass             # Dry mass (kg or ton)
-    Isp0 = rocket_params.motor_isp0           # Specific impulse at zero altude (s)
-    Isp1 = rocket_params.motor_isp1           # Specific impulse at vacuum (s)
-    A    = rocket_params.rocket_area          # Reference area (m^2)
-    Fmax = rocket_params.max_thrust           # Maximum thrust (N or MN)
-    vel_eps = rocket_params.vel               # Initial velocity (m/s or km/s)
-
-    # Environmental parameters
-    g0  = environment_params.gravity          # Gravitational acceleration at altitude zero (m/s^2 or km/s^2)
-    r0  = environment_params.radius           # Radius at altitude zero (m or km)
-    cd  = environment_params.drag_coefficient # Drag coefficients
-    H   = environment_params.scale_height     # Scale height (m or km)
-    rho = environment_params.density          # Density at altitude zero (x 1000)
-
-    # Model and target orbit parameters
-    N     = model_params.N                    # Number of shooting intervals
-    h_obj = model_params.h_obj                # Target altitude (m or km)
-    v_obj = model_params.v_obj                # Target velocity (m/s or km/s)
-    q_obj = model_params.q_obj / 180 * cs.pi  # Target angle to vertical (rad)
-
     # output file
     model_file = model_params.model_file
 
-    result = compute_gravity_turn(
-        m0, m1, g0, r0, Isp0, Isp1, Fmax,
-        cd, A, H, rho, h_obj,
-        v_obj, q_obj, N=N, vel_eps=vel_eps
-    )
+    guess = None
+    if initial_guess != 'linear':
+        control = rocket_params.thrust_control if initial_guess == 'control' else None
+        guess = simulation_guess(rocket_params, environment_params, model_params,
+                                 control=control, time_interval=io_params.time_interval)
 
-    result_df = pd.DataFrame(result)
-    result_df.to_excel(model_file, index=False)
-    print(result_df.head())
+    arguments = gravity_turn_arguments(rocket_params, environment_params, model_params)
+    # with integrator='rk4' the first shooting interval stays on CVODES
+    problem = build_gravity_turn(**arguments, initial_guess=guess, integrator=integrator,
+                                 substeps=substeps)
+    result = solve_gravity_turn(problem)
+    if result is None:
+        return
 
+    metadata = solution_metadata(problem, result, arguments)
+    write_solution(model_file, result, metadata)
+    print(f'horizon {metadata["T"]:.1f} s, objective {metadata["objective"]:.4f}, '
+          f'written to {model_file}')
 
-if __name__ == '__main__':
-    config_file_name = 'None'
-    if len(sys.argv) == 2:
-        config_file_name = sys.argv[1]
 
-    config_file_name = Path(config_file_name)
-    if not config_file_name.is_file():
-        print(f'incorrect config file: {config_file_name}')
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='gravity turn by direct multiple shooting')
+    parser.add_argument('config_file_name', type=Path)
+    parser.add_argument(
+        '--initial-guess', choices=('linear', 'simulation', 'control'), default='linear',
+        help='linear interpolation between the initial and final state, forward '
+             'simulation at full throttle then coast, or with the control file')
+    parser.add_argument(
+        '--integrator', choices=('cvodes', 'rk4'), default='cvodes',
+        help='integrator of the shooting intervals, with rk4 the first interval '
+             'stays on CVODES')
+    parser.add_argument('--substeps', type=int, default=4,
+                        help='RK4 steps per shooting interval')
+    args = parser.parse_args()
+
+    if not args.config_file_name.is_file():
+        print(f'incorrect config file: {args.config_file_name}')
         exit()
 
-    main(config_file_name)
\ No newline at end of file
+    main(args.config_file_name, args.initial_guess, args.integrator, args.substeps)
@@ -0,0 +1,215 @@
+''' checkpoints for long rocket_launch.launch runs
+
+    A checkpoint holds the flight state (State, _time and index), the work
+    arrays of the vode integrator, the fuel mass and acceleration of
+    RocketPhysics and the rows logged so far in a compact binary (npz) file.
+    It is written at the start of every checkpoint_every-th step. A resumed
+    run continues the integrator from its work arrays, so its output is
+    identical to that of a run without checkpoints.
+
+    The vode of older scipy versions keeps part of its state outside of the
+    integrator object (Fortran common blocks). There the integrator state is
+    not saved, launch reinitializes the integrator at each checkpoint and a
+    resumed run is identical to an uninterrupted run with the same
+    checkpoint interval only, the same holds for runs from snapshots.
+
+    The digest of the config parameters and control is stored with the
+    checkpoint, a checkpoint of a different config cannot be resumed.
+
+    SnapshotCache keeps checkpoints in memory along the trajectory, keyed by
+    the digest of the config without the control and the digest of the
+    control prefix flown up to the snapshot. When only the tail of the thrust
+    control changes, launch resumes from the latest snapshot before the first
+    index where the control differs instead of integrating from t=0. The
+    run continues from the integrator state of the snapshot and gives the
+    same output as a run without the cache:
+
+        cache = SnapshotCache(max_bytes=64 * 2**20)
+        for params in sweep:
+            launch(*params, headless=True, snapshot_cache=cache)
+        print(cache.stats())
+'''
+import os
+import hashlib
+import json
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+import numpy as np
+
+# work arrays of the vode integrator that hold its complete state
+VODE_ARRAYS = ('rwork', 'iwork', 'state_doubles', 'state_ints')
+
+
+@dataclass
+class Checkpoint:
+    digest: str
+    state: np.ndarray
+    time: float
+    index: int
+    fuel_mass: float
+    v_dot: float
+    rows: np.ndarray
+    integrator: dict = field(default_factory=dict)
+
+
+def params_digest(rocket_params, environment_params, model_params, display_params,
+                  control=True):
+    ''' sha256 digest of the config parameters, including the thrust control
+        if control is True
+    '''
+    params = {
+        'rocket': asdict(rocket_params),
+        'environment': asdict(environment_params),
+        'model': asdict(model_params),
+        'display': asdict(display_params),
+    }
+    thrust_control = params['rocket'].pop('thrust_control')
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode())
+    if control:
+        digest.update(np.ascontiguousarray(thrust_control, dtype=np.float64).tobytes())
+
+    return digest.hexdigest()
+
+
+def write_checkpoint(file_name, checkpoint):
+    ''' writes the checkpoint to a temporary file first, so an interrupt
+        while writing leaves the previous checkpoint intact
+    '''
+    file_name = Path(file_name)
+    temp_file_name = file_name.with_name(file_name.name + '.tmp')
+    arrays = asdict(checkpoint)
+    arrays.update({f'integrator_{name}': values
+                   for name, values in arrays.pop('integrator').items()})
+    with open(temp_file_name, mode='wb') as checkpoint_file:
+        np.savez_compressed(checkpoint_file, **arrays)
+
+    os.replace(temp_file_name, file_name)
+
+
+def read_checkpoint(file_name, digest):
+    with np.load(file_name) as checkpoint_file:
+        checkpoint = Checkpoint(
+            digest=str(checkpoint_file['digest']),
+            state=checkpoint_file['state'],
+            time=float(checkpoint_file['time']),
+            index=int(checkpoint_file['index']),
+            fuel_mass=float(checkpoint_file['fuel_mass']),
+            v_dot=float(checkpoint_file['v_dot']),
+            rows=checkpoint_file['rows'],
+            integrator={name: checkpoint_file[f'integrator_{name}'] for name in VODE_ARRAYS
+                        if f'integrator_{name}' in checkpoint_file},
+        )
+
+    if checkpoint.digest != digest:
+        raise ValueError(f'checkpoint {file_name} was written for a different config')
+
+    return checkpoint
+
+
+def integrator_state(integrator):
+    ''' copies of the work arrays of the vode integrator of a scipy ode, an
+        empty dictionary if this scipy keeps part of the state elsewhere
+    '''
+    vode = integrator._integrator  # pylint: disable=protected-access
+    if not all(hasattr(vode, name) for name in VODE_ARRAYS):
+        return {}
+
+    return {name: getattr(vode, name).copy() for name in VODE_ARRAYS}
+
+
+def restore_integrator(integrator, state_vector, time, arrays):
+    ''' continues the vode integrator from the work arrays of integrator_state
+        at the state of the given time, without arrays it is reinitialized
+        there
+    '''
+    integrator.set_initial_value(state_vector, time)
+    if not arrays:
+        return
+
+    vode = integrator._integrator  # pylint: disable=protected-access
+    for name, values in arrays.items():
+        getattr(vode, name)[...] = values
+
+    # istate 2: continue the integration instead of starting it
+    vode.call_args[3] = vode.istate = 2
+
+
+def prefix_digests(control, every):
+    ''' sha256 digests of the control prefixes control[:k] for k a multiple
+        of every, returns a dictionary {k: digest}
+    '''
+    control = np.ascontiguousarray(control, dtype=np.float64)
+    digest = hashlib.sha256()
+    digests = {0: digest.hexdigest()}
+    for k in range(every, len(control) + 1, every):
+        digest.update(control[k - every:k].tobytes())
+        digests[k] = digest.hexdigest()
+
+    return digests
+
+
+class SnapshotCache:
+    ''' size bounded LRU cache of in memory checkpoints '''
+
+    def __init__(self, max_bytes=64 * 2**20):
+        self.max_bytes = max_bytes
+        self.snapshots = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.steps_skipped = 0
+
+    @staticmethod
+    def snapshot_size(snapshot):
+        return (snapshot.state.nbytes + snapshot.rows.nbytes
+                + sum(values.nbytes for values in snapshot.integrator.values()))
+
+    def store(self, config_digest, prefix_digest, snapshot):
+        key = (config_digest, prefix_digest)
+        if key in self.snapshots:
+            self.snapshots.move_to_end(key)
+            return
+
+        self.snapshots[key] = snapshot
+        self.nbytes += self.snapshot_size(snapshot)
+        while self.nbytes > self.max_bytes and self.snapshots:
+            _, evicted = self.snapshots.popitem(last=False)
+            self.nbytes -= self.snapshot_size(evicted)
+            self.evictions += 1
+
+    def lookup(self, config_digest, digests):
+        ''' latest snapshot of the config for which the control prefix matches
+            digests, the {index: prefix digest} of the new control
+            returns the snapshot or None
+        '''
+        for index in sorted(digests, reverse=True):
+            if index == 0:
+                break
+
+            key = (config_digest, digests[index])
+            if key in self.snapshots:
+                self.snapshots.move_to_end(key)
+                self.hits += 1
+                self.steps_skipped += index
+                return self.snapshots[key]
+
+        self.misses += 1
+        return None
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'steps_skipped': self.steps_skipped,
+            'snapshots': len(self.snapshots),
+            'bytes': self.nbytes,
+            'evictions': self.evictions,
+        }
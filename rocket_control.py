@@ -0,0 +1,220 @@
+''' compressed thrust control profiles
+
+    A control is given as samples (time, control) and used as their linear
+    interpolation, as construct_control_array resamples it. fit_control
+    replaces the samples by a piecewise linear profile with the fewest knots
+    it finds within a maximum error: runs of samples that stay within the
+    error band are constant segments, snapped to exactly 0 (off) or 1 (full
+    throttle) when the band allows it, the others are linear segments
+    between samples. Both ends of a segment are stored, so a profile may
+    jump at a knot, as bang-bang controls do.
+
+    The profile evaluates vectorized at any times, and SampledControl is
+    the control array of launch on the time_interval grid evaluated on
+    access, so a long flight no longer holds one value per time_interval.
+
+    profile file (npz): knot_time (K + 1), start and end (K) values of the
+    segments and the max_error of the fit; construct_control_array reads
+    profile files like solution files
+
+    usage:
+        python rocket_control.py compress configs/mintoc_gravity_turn_20T_1.xlsx \\
+            control_20T.npz --max-error 1e-3 --config configs/mintoc_20T_1.cfg
+'''
+import argparse
+from bisect import bisect_right
+from pathlib import Path
+import numpy as np
+
+KINDS = ('off', 'full', 'constant', 'linear')
+
+
+class ControlProfile:
+
+    def __init__(self, knot_time, start, end, max_error=0.0):
+        self.knot_time = np.asarray(knot_time, dtype=np.float64)
+        self.start = np.asarray(start, dtype=np.float64)
+        self.end = np.asarray(end, dtype=np.float64)
+        self.max_error = float(max_error)
+        self._slope = (self.end - self.start) / np.diff(self.knot_time)
+        # plain lists for the scalar evaluation of launch
+        self._knots = self.knot_time.tolist()
+        self._starts = self.start.tolist()
+        self._slopes = self._slope.tolist()
+
+    def __len__(self):
+        ''' number of segments '''
+        return len(self.start)
+
+    def __call__(self, times):
+        ''' control at the times, the first and last values hold outside '''
+        times = np.asarray(times, dtype=np.float64)
+        segment = np.clip(np.searchsorted(self.knot_time, times, side='right') - 1,
+                          0, len(self) - 1)
+        offset = np.clip(times, self.knot_time[0], self.knot_time[-1]) - self.knot_time[segment]
+        return self.start[segment] + self._slope[segment] * offset
+
+    def value(self, t):
+        ''' control at a single time '''
+        segment = min(max(bisect_right(self._knots, t) - 1, 0), len(self._starts) - 1)
+        t = min(max(t, self._knots[0]), self._knots[-1])
+        return self._starts[segment] + self._slopes[segment] * (t - self._knots[segment])
+
+    @property
+    def nbytes(self):
+        return self.knot_time.nbytes + self.start.nbytes + self.end.nbytes
+
+    def kinds(self):
+        ''' kind of each segment: off, full, constant or linear '''
+        constant = self.start == self.end
+        return np.where(constant & (self.start == 0), 'off',
+                        np.where(constant & (self.start == 1), 'full',
+                                 np.where(constant, 'constant', 'linear')))
+
+    def sampled(self, delta_t, t_max):
+        ''' control array of launch, on the grid of resample_control '''
+        return SampledControl(self, delta_t, len(np.arange(0, t_max + 2 * delta_t, delta_t)))
+
+    def save(self, file_name):
+        np.savez(file_name, knot_time=self.knot_time, start=self.start, end=self.end,
+                 max_error=np.array(self.max_error))
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['knot_time'], arrays['start'], arrays['end'],
+                   arrays.get('max_error', 0.0))
+
+    @classmethod
+    def load(cls, file_name):
+        with np.load(file_name) as profile_file:
+            return cls.from_arrays(dict(profile_file))
+
+
+class SampledControl:
+    ''' read-only control array of a profile on the grid k * delta_t, the
+        values are evaluated on access
+    '''
+
+    def __init__(self, profile, delta_t, length):
+        self.profile = profile
+        self.delta_t = delta_t
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.profile(self.delta_t * np.arange(self.length)[index])
+
+        index = int(index)
+        if index < 0:
+            index += self.length
+
+        if not 0 <= index < self.length:
+            raise IndexError(f'index {index} is out of bounds for size {self.length}')
+
+        return self.profile.value(index * self.delta_t)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.profile(self.delta_t * np.arange(self.length)).astype(dtype or np.float64)
+
+    @property
+    def nbytes(self):
+        return self.profile.nbytes
+
+
+def fit_control(time, control, max_error=1e-3):
+    ''' piecewise linear profile of the linear interpolation of the samples
+        with at most max_error at every time
+    '''
+    time = np.asarray(time, dtype=np.float64)
+    control = np.asarray(control, dtype=np.float64)
+    n = len(time)
+    knots, starts, ends = [time[0]], [], []
+    i = 0
+    while i < n - 1:
+        # longest run from sample i that fits in a band of 2 max_error
+        low = high = control[i]
+        j = i
+        while j + 1 < n:
+            low, high = min(low, control[j + 1]), max(high, control[j + 1])
+            if high - low > 2 * max_error:
+                break
+
+            j += 1
+
+        if j - i >= 2 or (j > i and (j + 1 == n
+                                     or not _fits_line(time, control, i, j + 1, max_error))):
+            if high - low > 2 * max_error:
+                low, high = control[i:j + 1].min(), control[i:j + 1].max()
+
+            value = next((snap for snap in (0.0, 1.0)
+                          if max(abs(low - snap), abs(high - snap)) <= max_error),
+                         0.5 * (low + high))
+            starts.append(value)
+            ends.append(value)
+
+        else:
+            j = i + 1
+            while j + 1 < n and _fits_line(time, control, i, j + 1, max_error):
+                j += 1
+
+            starts.append(control[i])
+            ends.append(control[j])
+
+        knots.append(time[j])
+        i = j
+
+    return ControlProfile(knots, starts, ends, max_error)
+
+
+def _fits_line(time, control, i, j, max_error):
+    ''' True if the line between samples i and j is within max_error of the
+        samples in between
+    '''
+    line = control[i] + (control[j] - control[i]) * (
+        (time[i:j + 1] - time[i]) / (time[j] - time[i]))
+    return np.max(np.abs(line - control[i:j + 1])) <= max_error
+
+
+def main():
+    parser = argparse.ArgumentParser(description='compressed thrust control profiles')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    compress_parser = subparsers.add_parser(
+        'compress', help='fit a solution or control file to a profile file')
+    compress_parser.add_argument('input_file_name', type=Path, help='.xlsx or .npz')
+    compress_parser.add_argument('profile_file_name', type=Path, help='.npz')
+    compress_parser.add_argument('--max-error', type=float, default=1e-3)
+    compress_parser.add_argument(
+        '--config', type=Path,
+        help='compare with the control array of the time interval and duration of this config')
+    args = parser.parse_args()
+
+    from rocket_input import read_rocket_config, read_solution, resample_control
+
+    if not args.input_file_name.is_file():
+        print(f'incorrect file: {args.input_file_name}')
+        exit()
+
+    solution = read_solution(args.input_file_name)
+    profile = fit_control(solution['time'], solution['control'], args.max_error)
+    profile.save(args.profile_file_name)
+    error = np.max(np.abs(profile(solution['time']) - solution['control']))
+    kinds = dict(zip(*np.unique(profile.kinds(), return_counts=True)))
+    print(f'{len(solution["time"])} samples to {len(profile)} segments '
+          f'({", ".join(f"{kinds.get(kind, 0)} {kind}" for kind in KINDS)}), '
+          f'max error {error:.2e}, {profile.nbytes:,} bytes, '
+          f'file {args.profile_file_name.stat().st_size:,} bytes')
+    if args.config:
+        display_params = read_rocket_config(args.config)[3]
+        dense = resample_control(solution['time'], solution['control'],
+                                 display_params.time_interval, display_params.flight_duration)
+        sampled = np.asarray(profile.sampled(display_params.time_interval,
+                                             display_params.flight_duration))
+        print(f'control array of {len(dense):,} values: {dense.nbytes:,} bytes, '
+              f'max error {np.max(np.abs(sampled - dense)):.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+''' golden trajectory regression references
+
+    Reference results of every config are stored in the golden directory:
+        launch_<config>.npz: headless launch log (t, m, v, beta, h, theta, u)
+            of the configs with a control file
+        solution_<config>.npz: gravity turn solution with SOLUTION_N shooting
+            intervals, one per distinct gravity turn problem
+
+    A check runs each scenario again and compares it with its reference per
+    variable, |new - reference| <= atol + rtol * |reference|, and against the
+    wall time budget of the scenario. The budgets are set for a desktop
+    machine, on a slower machine the environment variable
+    ROCKET_GOLDEN_BUDGET_SCALE multiplies them. References are only replaced
+    by an explicit update, after a change of the results was reviewed.
+
+    usage:
+        python rocket_golden.py check
+        python rocket_golden.py update
+        ROCKET_GOLDEN_BUDGET_SCALE=3 python rocket_golden.py check
+'''
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+import numpy as np
+from rocket_input import read_rocket_config, read_solution, write_solution
+
+GOLDEN_DIR = Path(__file__).parent / 'golden'
+CONFIG_FILES = sorted((Path(__file__).parent / 'configs').glob('*.cfg'))
+# shooting intervals of the reference solutions, low to keep the check fast
+SOLUTION_N = 30
+# variable: (rtol, atol)
+LAUNCH_TOLERANCES = {
+    't': (0.0, 1e-9),
+    'm': (1e-6, 1e-3),
+    'v': (1e-6, 1e-3),
+    'beta': (1e-6, 1e-6),
+    'h': (1e-6, 1e-2),
+    'theta': (1e-6, 1e-6),
+    'u': (0.0, 1e-9),
+}
+SOLUTION_TOLERANCES = {
+    'time': (1e-4, 1e-3),
+    'mass': (1e-4, 1e-1),
+    'vel': (1e-4, 1e-1),
+    'alt': (1e-4, 1.0),
+    'control': (0.0, 1e-3),
+    'hor_angle': (1e-4, 1e-5),
+    'ver_angle': (1e-4, 1e-5),
+}
+# wall time budget (s) per scenario, about three to ten times the time of
+# the reference run, new scenarios get the default budget of their kind
+BUDGETS = {
+    'launch_mintoc_20T': 0.25,
+    'launch_mintoc_20T_1': 1.0,
+    'launch_mintoc_20T_launch': 0.25,
+    'solution_mintoc_20T': 25.0,
+    'solution_mintoc_30T': 30.0,
+}
+DEFAULT_BUDGETS = {'launch': 1.0, 'solution': 30.0}
+BUDGET_SCALE_VARIABLE = 'ROCKET_GOLDEN_BUDGET_SCALE'
+
+
+def budget(name):
+    ''' wall time budget (s) of the scenario, times the factor of the
+        environment variable ROCKET_GOLDEN_BUDGET_SCALE if it is set
+    '''
+    scale = float(os.environ.get(BUDGET_SCALE_VARIABLE, 1.0))
+    return scale * BUDGETS.get(name, DEFAULT_BUDGETS[name.split('_')[0]])
+
+
+def launch_scenarios():
+    ''' configs with a control file, by scenario name '''
+    scenarios = {}
+    for config_file_name in CONFIG_FILES:
+        if len(read_rocket_config(config_file_name)[0].thrust_control) > 0:
+            scenarios[f'launch_{config_file_name.stem}'] = config_file_name
+
+    return scenarios
+
+
+def solution_scenarios():
+    ''' the first config of each distinct gravity turn problem, by scenario name '''
+    from rocket_casadi_solution import gravity_turn_arguments
+
+    scenarios = {}
+    problems = []
+    for config_file_name in CONFIG_FILES:
+        arguments = gravity_turn_arguments(*read_rocket_config(config_file_name)[:3])
+        if arguments not in problems:
+            problems.append(arguments)
+            scenarios[f'solution_{config_file_name.stem}'] = config_file_name
+
+    return scenarios
+
+
+def run_launch(config_file_name):
+    ''' headless launch, returns the log arrays and the wall time '''
+    from rocket_launch import launch
+
+    params = read_rocket_config(config_file_name)
+    start = time.perf_counter()
+    trajectory = launch(*params, headless=True).as_arrays()
+    return trajectory, time.perf_counter() - start
+
+
+def run_solution(config_file_name):
+    ''' gravity turn solution with SOLUTION_N intervals, returns the result,
+        its metadata and the wall time of build and solve
+    '''
+    from rocket_casadi_solution import (
+        build_gravity_turn, solve_gravity_turn, gravity_turn_arguments, solution_metadata)
+
+    arguments = gravity_turn_arguments(*read_rocket_config(config_file_name)[:3])
+    arguments['N'] = SOLUTION_N
+    start = time.perf_counter()
+    problem = build_gravity_turn(**arguments, print_level=0)
+    result = solve_gravity_turn(problem)
+    wall_time = time.perf_counter() - start
+    if result is None:
+        raise RuntimeError(f'{config_file_name}: gravity turn solve failed')
+
+    return result, solution_metadata(problem, result, arguments), wall_time
+
+
+def deviations(reference, result, tolerances):
+    ''' largest deviation of each variable relative to its tolerance, above 1
+        the variable is out of tolerance
+    '''
+    ratios = {}
+    for name, (rtol, atol) in tolerances.items():
+        expected = np.asarray(reference[name], dtype=float)
+        actual = np.asarray(result[name], dtype=float)
+        if expected.shape != actual.shape:
+            ratios[name] = np.inf
+            continue
+
+        ratios[name] = float(np.max(
+            np.abs(actual - expected) / (atol + rtol * np.abs(expected)), initial=0.0))
+
+    return ratios
+
+
+def check_launch(name, config_file_name):
+    ''' returns the deviations and the wall time of a launch scenario '''
+    trajectory, wall_time = run_launch(config_file_name)
+    with np.load(GOLDEN_DIR / f'{name}.npz') as reference:
+        return deviations(reference, trajectory, LAUNCH_TOLERANCES), wall_time
+
+
+def check_solution(name, config_file_name):
+    ''' returns the deviations and the wall time of a solution scenario '''
+    result, _, wall_time = run_solution(config_file_name)
+    reference = read_solution(GOLDEN_DIR / f'{name}.npz')
+    return deviations(reference, result, SOLUTION_TOLERANCES), wall_time
+
+
+def scenarios():
+    ''' list of (name, config file name, check function) of all scenarios '''
+    return ([(name, config_file_name, check_launch)
+             for name, config_file_name in launch_scenarios().items()]
+            + [(name, config_file_name, check_solution)
+               for name, config_file_name in solution_scenarios().items()])
+
+
+def update():
+    GOLDEN_DIR.mkdir(exist_ok=True)
+    for name, config_file_name in launch_scenarios().items():
+        trajectory, wall_time = run_launch(config_file_name)
+        np.savez(GOLDEN_DIR / f'{name}.npz', **trajectory)
+        print(f'{name:<40} {wall_time:8.3f} s')
+
+    for name, config_file_name in solution_scenarios().items():
+        result, metadata, wall_time = run_solution(config_file_name)
+        write_solution(GOLDEN_DIR / f'{name}.npz', result, metadata)
+        print(f'{name:<40} {wall_time:8.3f} s')
+
+
+def check():
+    ''' runs all scenarios, returns the number of failures '''
+    failures = 0
+    for name, config_file_name, check_scenario in scenarios():
+        ratios, wall_time = check_scenario(name, config_file_name)
+        worst = max(ratios, key=ratios.get)
+        failed = [variable for variable, ratio in ratios.items() if ratio > 1]
+        over_budget = wall_time > budget(name)
+        failures += bool(failed) or over_budget
+        print(f'{name:<40} {wall_time:8.3f} s (budget {budget(name):.2f} s)  '
+              f'worst {worst} {ratios[worst]:.2e} of tolerance'
+              + (f'  OUT OF TOLERANCE: {", ".join(failed)}' if failed else '')
+              + ('  OVER BUDGET' if over_budget else ''))
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='golden trajectory references')
+    parser.add_argument('command', choices=('check', 'update'))
+    args = parser.parse_args()
+
+    if args.command == 'update':
+        update()
+
+    elif check():
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
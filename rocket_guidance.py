@@ -0,0 +1,142 @@
+''' receding horizon closed loop guidance for rocket_launch.launch
+
+    The gravity turn NLP of rocket_casadi_solution is built once with a
+    short horizon of N shooting intervals and a free final time. Every
+    replan_interval seconds of flight it is solved again from the current
+    state, which fixes the bounds of the first shooting node, warm started
+    with the primal and dual solution of the previous solve. The first,
+    pre-launch, solve is a cold start without a time budget.
+
+    Each in flight solve has a wall time budget (IPOPT max_wall_time). A solve
+    that fails or runs out of its budget is dropped and the flight continues
+    on the last good plan; the iterate of a solve that ran out of its budget
+    warm starts the next solve, so the solves keep converging. Replanning
+    stops when less than min_horizon seconds remain in the plan, the end of
+    the burn is flown on the last plan.
+
+    usage:
+        guidance = RecedingHorizonGuidance(rocket_params, environment_params,
+                                           model_params, horizon=30, budget=5.0)
+        launch(*params, guidance=guidance)
+        guidance.print_summary()
+'''
+import time
+import numpy as np
+from rocket_casadi_solution import build_gravity_turn, gravity_turn_arguments
+
+SUCCESS = {'Solve_Succeeded', 'Solved_To_Acceptable_Level'}
+BUDGET_EXCEEDED = 'Maximum_WallTime_Exceeded'
+WARM_START = {
+    'warm_start_init_point': 'yes',
+    'mu_init': 1e-4,
+    'warm_start_bound_push': 1e-6,
+    'warm_start_mult_bound_push': 1e-6,
+}
+PERCENTILES = (50, 90, 99)
+
+
+class RecedingHorizonGuidance:
+
+    def __init__(self, rocket_params, environment_params, model_params, horizon=30,
+                 replan_interval=10.0, budget=5.0, min_horizon=20.0):
+        arguments = gravity_turn_arguments(rocket_params, environment_params, model_params)
+        arguments['N'] = horizon
+        self.cold_problem = build_gravity_turn(**arguments, print_level=0)
+        self.problem = build_gravity_turn(
+            **arguments, print_level=0,
+            ipopt_options={**WARM_START, 'max_wall_time': budget})
+        self.dry_mass = rocket_params.dry_mass
+        self.replan_interval = replan_interval
+        self.budget = budget
+        self.min_horizon = min_horizon
+        self.next_replan = 0.0
+        self.plan = None
+        self.warm_start = None
+        self.initial_latency = None
+        self.latencies = []
+        self.iterations = []
+        self.fallbacks = 0
+
+    def due(self, t):
+        ''' True if the plan is to be solved again at time t '''
+        if self.plan is None:
+            return True
+
+        start, horizon, _ = self.plan
+        return t >= self.next_replan and start + horizon - t > self.min_horizon
+
+    def update(self, t, vel, beta, alt, theta, fuel_mass):
+        ''' solves the horizon from the state at time t
+            returns True if the plan was replaced
+        '''
+        problem = self.cold_problem if self.warm_start is None else self.problem
+        state = [self.dry_mass + fuel_mass, vel, beta, alt, theta]
+        npars, nx, ns = problem['npars'], problem['nx'], problem['ns']
+        lbx, ubx = list(problem['lbx']), list(problem['ubx'])
+        lbx[npars:npars + nx] = state
+        ubx[npars:npars + nx] = state
+        solver = problem['solver']
+        start = time.perf_counter()
+        result = solver(lbx=lbx, ubx=ubx, lbg=problem['lbg'], ubg=problem['ubg'],
+                        **(self.warm_start or {'x0': problem['x0']}))
+        latency = time.perf_counter() - start
+        stats = solver.stats()
+        self.next_replan = t + self.replan_interval
+        if self.warm_start is None:
+            self.initial_latency = latency
+
+        else:
+            self.latencies.append(latency)
+            self.iterations.append(stats['iter_count'])
+
+        status = stats['return_status']
+        if status not in SUCCESS and self.plan is None:
+            raise RuntimeError(f'initial guidance solve failed: {status}')
+
+        if status in SUCCESS or status == BUDGET_EXCEEDED:
+            self.warm_start = {
+                'x0': result['x'], 'lam_x0': result['lam_x'], 'lam_g0': result['lam_g']}
+
+        if status not in SUCCESS:
+            self.fallbacks += 1
+            return False
+
+        x = np.array(result['x']).ravel()
+        self.plan = (t, x[0], x[npars + nx::ns])
+        return True
+
+    def controls(self, times):
+        ''' throttle of the plan at the times, zero after the end of the plan '''
+        start, horizon, control = self.plan
+        interval = np.floor((np.asarray(times) - start) / horizon * len(control))
+        throttle = control[np.clip(interval, 0, len(control) - 1).astype(int)]
+        return np.where(interval < len(control), throttle, 0.0)
+
+    def summary(self):
+        latencies = np.array(self.latencies)
+        return {
+            'solves': len(self.latencies),
+            'fallbacks': self.fallbacks,
+            'budget': self.budget,
+            'initial_latency': self.initial_latency,
+            'latency_percentiles': {
+                f'p{q}': float(np.percentile(latencies, q)) if len(latencies) else None
+                for q in PERCENTILES
+            },
+            'latency_max': float(latencies.max()) if len(latencies) else None,
+            'iterations_mean': float(np.mean(self.iterations)) if self.iterations else None,
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f'guidance solves      : {summary["solves"]:,}, '
+              f'{summary["fallbacks"]:,} fallbacks to the last plan')
+        print(f'initial solve        : {summary["initial_latency"]:10.3f} s')
+        for name, latency in summary['latency_percentiles'].items():
+            if latency is not None:
+                print(f'solve latency {name:<7}: {latency:10.3f} s')
+
+        if summary['latency_max'] is not None:
+            print(f'solve latency max    : {summary["latency_max"]:10.3f} s '
+                  f'(budget {summary["budget"]:.3f} s)')
+            print(f'iterations mean      : {summary["iterations_mean"]:10.1f}')
@@ -30,13 +30,24 @@
         h_range min max (degrees)             : 0, 1440
         acceleration min max (m*s-2)          : -100, 170
         rocket sprite file                    : rocket_sprite2.png
+
+    Solution (control) files are read and written by extension:
+        .xlsx: columns time, mass, vel, alt, control, hor_angle, ver_angle
+        .npz: the same columns as uncompressed arrays and a JSON string
+            metadata with the horizon T, the objective, the solver status and
+            iterations and the gravity turn arguments; read_solution memory
+            maps the columns with mmap=True
+    A control profile file (.npz, see rocket_control.py) gives the thrust
+    control as knots, evaluated on access instead of resampled.
 '''
 import sys
 import re
+import json
+import struct
+import zipfile
 from dataclasses import dataclass
 from pathlib import Path
 import numpy as np
-import pandas as pd
 from pprint import pprint
 
 
@@ -85,17 +96,99 @@ class DisplayParams:
     rocket_sprite_file: str
 
 
+def resample_control(t, u, delta_t, t_max):
+    t_resampled = np.arange(0, t_max + 2 * delta_t, delta_t)
+    return np.interp(t_resampled, t, u)
+
+
+def write_solution(file_name, result, metadata=None):
+    ''' writes the columns of a gravity turn result, the metadata is only
+        kept in npz files
+    '''
+    file_name = Path(file_name)
+    columns = {name: np.asarray(values) for name, values in result.items()}
+    if file_name.suffix == '.npz':
+        np.savez(file_name, metadata=np.array(json.dumps(metadata or {})), **columns)
+
+    else:
+        import pandas as pd
+        pd.DataFrame(columns).to_excel(file_name, index=False)
+
+
+def read_solution(file_name, mmap=False):
+    ''' columns of a solution file as a dictionary of arrays and its metadata
+        under 'metadata' (empty for xlsx files)
+    '''
+    file_name = Path(file_name)
+    if file_name.suffix == '.npz':
+        if mmap:
+            columns = npz_memmap(file_name)
+
+        else:
+            with np.load(file_name) as npz:
+                columns = dict(npz)
+
+        metadata = json.loads(str(columns.pop('metadata', '{}')))
+        return {**columns, 'metadata': metadata}
+
+    import pandas as pd
+    solution_df = pd.read_excel(file_name)
+    return {
+        **{name: solution_df[name].to_numpy() for name in solution_df.columns},
+        'metadata': {},
+    }
+
+
+def npz_memmap(file_name):
+    ''' arrays of an uncompressed npz file (np.savez), the arrays with at
+        least one dimension are read-only views of one memory map of the file
+    '''
+    arrays = {}
+    data = None
+    with zipfile.ZipFile(file_name) as archive, open(file_name, mode='rb') as npz_file:
+        for info in archive.infolist():
+            name = info.filename.removesuffix('.npy')
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f'{file_name}: {name} is compressed, use np.load')
+
+            # the member data follows the local file header, whose name and
+            # extra field lengths may differ from the central directory
+            npz_file.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', npz_file.read(4))
+            npz_file.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(npz_file)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(npz_file)
+
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(npz_file)
+
+            if len(shape) == 0 or 0 in shape or dtype.hasobject:
+                npz_file.seek(info.header_offset + 30 + name_length + extra_length)
+                arrays[name] = np.lib.format.read_array(npz_file)
+
+            else:
+                offset = npz_file.tell()
+                if data is None:
+                    data = np.memmap(file_name, dtype=np.uint8, mode='r')
+
+                arrays[name] = np.ndarray(
+                    shape, dtype=dtype, buffer=data, offset=offset,
+                    order='F' if fortran_order else 'C')
+
+    return arrays
+
+
 def construct_control_array(file_name, delta_t, t_max):
     if not file_name.is_file():
         return np.array([])
 
-    rocket_control_df = pd.read_excel(file_name)
-    t = rocket_control_df['time']
-    u = rocket_control_df['control']
+    solution = read_solution(file_name)
+    if 'knot_time' in solution:
+        from rocket_control import ControlProfile
+        return ControlProfile.from_arrays(solution).sampled(delta_t, t_max)
 
-    t_resampled = np.arange(0, t_max + 2 * delta_t, delta_t)
-    u_resampled = np.interp(t_resampled, t, u)
-    return u_resampled
+    return resample_control(solution['time'], solution['control'], delta_t, t_max)
 
 
 def read_rocket_config(config_file_name):
@@ -15,13 +15,24 @@
         bruno.vermeulen@hotmail.com
 """
 
-import sys
+import argparse
 from pathlib import Path
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, replace
+from math import cos, sin, exp
 import numpy as np
 from scipy.integrate import ode
 from rocket_input import read_rocket_config
 from rocket_output import Console, OutputLog, MapPlot
+from rocket_profile import Instrumentation, NullInstrumentation, PROFILERS
+from rocket_checkpoint import (
+    Checkpoint,
+    integrator_state,
+    params_digest,
+    prefix_digests,
+    read_checkpoint,
+    restore_integrator,
+    write_checkpoint,
+)
 
 
 rad_deg = 180 / np.pi
@@ -37,25 +48,64 @@ class State:
 
 
 class RocketPhysics:
+    """Gravity turn physics of the rocket
+
+    The right hand side derivatives_gravity_turn is called thousands of times
+    per flight by the integrator, therefore all constants are evaluated once
+    at construction, attributes are stored in __slots__ and the derivatives
+    are written into a reusable output buffer.
+    """
+
+    __slots__ = (
+        "rocket",
+        "env",
+        "v_dot",
+        "beta_0",
+        "angle_0",
+        "_throttle",
+        "_thrust",
+        "_mass_fuel_dot",
+        "_fuel_mass",
+        "_dry_mass",
+        "_max_thrust",
+        "_g0",
+        "_radius",
+        "_drag_k",
+        "_scale_height",
+        "_isp0",
+        "_derivatives",
+    )
 
     def __init__(self, rocket_params, environment_params):
         self.rocket = rocket_params
+        self.env = environment_params
         self.v_dot = 0
         self.beta_0 = self.rocket.beta
-        self._throttle = 0
+        self.angle_0 = None
         self._fuel_mass = self.rocket.fuel_mass
-        self.env = environment_params
+
+        self._dry_mass = self.rocket.dry_mass
+        self._max_thrust = self.rocket.max_thrust
+        self._g0 = self.env.gravity
+        self._radius = self.env.radius
+        self._drag_k = (
+            0.5 * self.env.density * self.rocket.rocket_area * self.env.drag_coefficient
+        )
+        self._scale_height = self.env.scale_height
+        self._isp0 = self.rocket.motor_isp0
+        self._derivatives = np.zeros(5)
+        self.throttle = 0
 
     def gravity(self, altitude):
-        return self.env.gravity * (self.env.radius / (self.env.radius + altitude)) ** 2
+        return self._g0 * (self._radius / (self._radius + altitude)) ** 2
 
     @property
     def thrust(self):
-        return self.rocket.max_thrust * self.throttle
+        return self._thrust
 
     @property
     def mass(self):
-        return self.rocket.dry_mass + self.fuel_mass
+        return self._dry_mass + self._fuel_mass
 
     @property
     def fuel_mass(self):
@@ -83,11 +133,14 @@ class RocketPhysics:
 
     @throttle.setter
     def throttle(self, value):
+        # thrust and fuel flow only change with the throttle, so they are
+        # evaluated here and not in derivatives_gravity_turn
         self._throttle = value
+        self._thrust = self._max_thrust * value
+        self._mass_fuel_dot = -self._thrust / self._isp0 / self._g0
 
     def drag(self, altitude, velocity):
-        k = 0.5 * self.env.density * self.rocket.rocket_area * self.env.drag_coefficient
-        return k * np.exp(-altitude / self.env.scale_height) * velocity * velocity
+        return self._drag_k * exp(-altitude / self._scale_height) * velocity * velocity
 
     def derivatives_gravity_turn(self, t, state):  # pylint: disable=unused-argument
         """Rocket differential equations
@@ -102,7 +155,8 @@ class RocketPhysics:
                 theta: horizontal range in degrees (radians)
                 fuel_mass: mass of fuel (kg)
         returns:
-            numpy array of derivatative of above variables
+            numpy array of derivatative of above variables, the array is
+            reused between calls so the caller must copy it if it is kept
 
         Assumptions:
             - effects of wind and solar radiation on rocket are zero
@@ -111,63 +165,189 @@ class RocketPhysics:
             - angle of attack is zero, therefore pitch angle is same
               as flight angle and lift are neglected
         """
-        vel, beta, alt, theta, fuel_mass = state  # pylint: disable=unused-variable
-
-        cos_beta = np.cos(beta)
-        sin_beta = np.sin(beta)
-
-        self.v_dot = (
-            self.thrust / self.mass
-            - self.drag(alt, vel) / self.mass
-            - self.gravity(alt) * cos_beta
-        )
-        alt_dot = vel * cos_beta
-        theta_dot = vel * sin_beta / (self.env.radius + alt)
-
-        beta_dot = self.gravity(alt) * sin_beta / vel - theta_dot
-        mass_fuel_dot = -self.thrust / self.rocket.motor_isp0 / self.env.gravity
-        self.fuel_mass = fuel_mass
-
-        return np.array([self.v_dot, beta_dot, alt_dot, theta_dot, mass_fuel_dot])
-
-
-def launch(rocket_params, environment_params, model_params, display_params):
-    console = Console()
+        vel, beta, alt, _, fuel_mass = state.tolist()
+
+        cos_beta = cos(beta)
+        sin_beta = sin(beta)
+        mass = self._dry_mass + self._fuel_mass
+        radius = self._radius + alt
+        gravity = self._g0 * (self._radius / radius) ** 2
+        drag = self._drag_k * exp(-alt / self._scale_height) * vel * vel
+
+        self.v_dot = self._thrust / mass - drag / mass - gravity * cos_beta
+        theta_dot = vel * sin_beta / radius
+        self._fuel_mass = fuel_mass
+
+        derivatives = self._derivatives
+        derivatives[0] = self.v_dot
+        derivatives[1] = gravity * sin_beta / vel - theta_dot
+        derivatives[2] = vel * cos_beta
+        derivatives[3] = theta_dot
+        derivatives[4] = self._mass_fuel_dot
+        return derivatives
+
+
+def launch(
+    rocket_params,
+    environment_params,
+    model_params,
+    display_params,
+    headless=False,
+    instrument=None,
+    checkpoint=None,
+    checkpoint_every=1000,
+    resume=False,
+    snapshot_cache=None,
+    guidance=None,
+    events=None,
+    log=True,
+    restart=False,
+):
+    """launch the rocket with the thrust control of rocket_params
+    arguments:
+        headless: if True there is no console and plot output and the log is
+            not written to file
+        instrument: optional rocket_profile.Instrumentation collecting counters
+            and phase timings of the run
+        checkpoint: file name of the checkpoint written every checkpoint_every
+            steps with the state of the integrator, see rocket_checkpoint
+        resume: if True the run continues from the checkpoint file
+        snapshot_cache: optional rocket_checkpoint.SnapshotCache, the run
+            starts from the latest cached snapshot with the same control prefix
+            and stores a snapshot with the state of the integrator every
+            checkpoint_every steps
+        guidance: optional rocket_guidance.RecedingHorizonGuidance, the thrust
+            control after each replan is taken from its plan
+        events: optional terminal events, functions of (time, State) called
+            after every step, the flight ends at the step where the value of
+            one of them changes sign
+        log: if False the status is not logged, for headless runs that only
+            need the events, the returned log is empty
+        restart: if True the integrator is reinitialized at each time
+            interval, so no step crosses a change of the throttle and the
+            flight is a smooth function of the parameters, at the cost of
+            the restarts
+    returns:
+        OutputLog with the logged status of the flight
+    """
+    if guidance is not None and (checkpoint or snapshot_cache is not None):
+        raise ValueError("closed loop guidance does not support checkpoints")
+
+    probe = instrument if instrument else NullInstrumentation()
+    console = None if headless else Console()
     logger = OutputLog()
-    mapper = MapPlot(rocket_params, environment_params, model_params, display_params)
+    mapper = (
+        None
+        if headless
+        else MapPlot(rocket_params, environment_params, model_params, display_params)
+    )
     rocket = RocketPhysics(rocket_params, environment_params)
 
     rocket_gravity_turn_integrator = ode(
-        rocket.derivatives_gravity_turn
+        probe.count_rhs(rocket.derivatives_gravity_turn)
     ).set_integrator("vode")
-    # initial values
-    theta = 0
-    flight_state = State(
-        vel=rocket_params.vel,
-        beta=rocket_params.beta,
-        alt=rocket_params.alt,
-        theta=theta,
-        fuel_mass=rocket_params.fuel_mass,
-    )
-    rocket.throttle = rocket_params.thrust_control[0]
-    _time = 0
-    rocket_gravity_turn_integrator.set_initial_value(
-        np.array(list(asdict(flight_state).values())), _time
+    params = (rocket_params, environment_params, model_params, display_params)
+    digest = params_digest(*params) if checkpoint else None
+    saved = read_checkpoint(checkpoint, digest) if resume else None
+    if snapshot_cache is not None:
+        config_digest = params_digest(*params, control=False)
+        digests = prefix_digests(rocket_params.thrust_control, checkpoint_every)
+        if saved is None:
+            saved = snapshot_cache.lookup(config_digest, digests)
+
+    if saved:
+        flight_state = State(*saved.state)
+        _time = saved.time
+        index = saved.index
+        rocket.fuel_mass = saved.fuel_mass
+        rocket.v_dot = saved.v_dot
+        logger.rows = [tuple(row) for row in saved.rows]
+        logger.index = len(logger.rows)
+
+    else:
+        # initial values
+        theta = 0
+        flight_state = State(
+            vel=rocket_params.vel,
+            beta=rocket_params.beta,
+            alt=rocket_params.alt,
+            theta=theta,
+            fuel_mass=rocket_params.fuel_mass,
+        )
+        _time = 0
+        index = 0
+
+    thrust_control = rocket_params.thrust_control
+    if guidance is not None:
+        # the plan of the guidance overwrites the remaining control
+        thrust_control = np.array(thrust_control, dtype=np.float64)
+
+    rocket.throttle = thrust_control[index]
+    restore_integrator(
+        rocket_gravity_turn_integrator,
+        np.array(list(asdict(flight_state).values())),
+        _time,
+        saved.integrator if saved else None,
     )
+    start_index = index
+    event_signs = [np.sign(event(_time, flight_state)) for event in events or ()]
 
     # launch until rocket is back at earth, explodes or is lost to space
-    index = 0
-    plot = mapper.plot_state_generator()
-    next(plot)
+    if not headless:
+        plot = mapper.plot_state_generator()
+        next(plot)
+        for state in logger.status_rows():
+            plot.send(state)
+
+    probe.start()
     while (
         rocket_gravity_turn_integrator.successful()
         and flight_state.alt > -100
         and _time <= display_params.flight_duration
     ):
 
-        rocket.throttle = rocket_params.thrust_control[index]
-
-        if index % display_params.status_update_step == 0:
+        if (
+            (checkpoint or snapshot_cache is not None)
+            and index % checkpoint_every == 0
+            and index != start_index
+        ):
+            with probe.phase("io"):
+                state_vector = np.array(list(asdict(flight_state).values()))
+                integrator_arrays = integrator_state(rocket_gravity_turn_integrator)
+                if not integrator_arrays:
+                    # the state of this vode cannot be saved, a resumed run
+                    # restarts the integrator here and so does this run
+                    probe.collect_integrator(rocket_gravity_turn_integrator)
+                    rocket_gravity_turn_integrator.set_initial_value(state_vector, _time)
+
+                snapshot = Checkpoint(
+                    digest=digest,
+                    state=state_vector,
+                    time=_time,
+                    index=index,
+                    fuel_mass=rocket.fuel_mass,
+                    v_dot=rocket.v_dot,
+                    rows=np.array(logger.rows, dtype=np.float64).reshape(-1, 7),
+                    integrator=integrator_arrays,
+                )
+                if checkpoint:
+                    write_checkpoint(checkpoint, snapshot)
+
+                if snapshot_cache is not None and index in digests:
+                    snapshot_cache.store(config_digest, digests[index], snapshot)
+
+        if guidance is not None and guidance.due(_time):
+            with probe.phase("guidance"):
+                if guidance.update(_time, *asdict(flight_state).values()):
+                    thrust_control[index:] = guidance.controls(
+                        _time
+                        + display_params.time_interval
+                        * np.arange(len(thrust_control) - index)
+                    )
+
+        rocket.throttle = thrust_control[index]
+
+        if (log or not headless) and index % display_params.status_update_step == 0:
             state = {
                 "time": _time,
                 "vel": flight_state.vel,
@@ -179,36 +359,189 @@ def launch(rocket_params, environment_params, model_params, display_params):
                 "thrust": rocket.thrust / rocket.mass,
                 "drag": rocket.drag(flight_state.alt, flight_state.vel) / rocket.mass,
                 "gravity": rocket.gravity(flight_state.alt),
-                "control": rocket_params.thrust_control[index],
+                "control": thrust_control[index],
                 "index": index,
             }
-            plot.send(state)
-            console.display_status_message(state)
-            logger.log_status(state)
+            if not headless:
+                with probe.phase("plot"):
+                    plot.send(state)
+
+                with probe.phase("console"):
+                    console.display_status_message(state)
+
+            if log:
+                with probe.phase("log"):
+                    logger.log_status(state)
 
         _time += display_params.time_interval
         index += 1
 
-        (
-            flight_state.vel,
-            flight_state.beta,
-            flight_state.alt,
-            flight_state.theta,
-            flight_state.fuel_mass,
-        ) = rocket_gravity_turn_integrator.integrate(_time)
-
-    console.stop_window()
-    logger.write_logger()
+        with probe.phase("physics"):
+            if restart:
+                rocket_gravity_turn_integrator.set_initial_value(
+                    np.array(list(asdict(flight_state).values())),
+                    _time - display_params.time_interval,
+                )
+            (
+                flight_state.vel,
+                flight_state.beta,
+                flight_state.alt,
+                flight_state.theta,
+                flight_state.fuel_mass,
+            ) = rocket_gravity_turn_integrator.integrate(_time)
+        probe.integrate_calls += 1
+
+        if events and any(
+            np.sign(event(_time, flight_state)) != sign
+            for event, sign in zip(events, event_signs)
+        ):
+            break
+
+    probe.collect_integrator(rocket_gravity_turn_integrator)
+    if not headless and log:
+        with probe.phase("io"):
+            logger.write_logger()
+
+    probe.stop(_time)
+    if not headless:
+        console.stop_window()
+
+    return logger
+
+
+def main():
+    parser = argparse.ArgumentParser(description="rocket launch gravity turn")
+    parser.add_argument("config_file_name", type=Path)
+    parser.add_argument(
+        "--headless", action="store_true", help="no console and plot output"
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=Path("launch_profile.json"),
+        type=Path,
+        help="print counters and timings and write them to this JSON file",
+    )
+    parser.add_argument(
+        "--profiler",
+        choices=PROFILERS,
+        help="capture a cProfile or pyinstrument profile of the main loop",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        nargs="?",
+        const=Path("rocket_checkpoint.npz"),
+        type=Path,
+        help="write a checkpoint to this file every --checkpoint-every steps",
+    )
+    parser.add_argument("--checkpoint-every", type=int, default=1000)
+    parser.add_argument(
+        "--resume", action="store_true", help="resume from the last checkpoint"
+    )
+    parser.add_argument(
+        "--closed-loop",
+        action="store_true",
+        help="replan the control with receding horizon guidance",
+    )
+    parser.add_argument(
+        "--horizon", type=int, default=30, help="shooting intervals of the guidance"
+    )
+    parser.add_argument(
+        "--replan-interval", type=float, default=10.0, help="seconds between replans"
+    )
+    parser.add_argument(
+        "--solve-budget", type=float, default=5.0, help="wall time budget of a replan"
+    )
+    parser.add_argument(
+        "--thrust-scale",
+        type=float,
+        default=1.0,
+        help="disturbance: scale the thrust of the flown rocket",
+    )
+    parser.add_argument(
+        "--drag-scale",
+        type=float,
+        default=1.0,
+        help="disturbance: scale the drag coefficient of the flown rocket",
+    )
+    args = parser.parse_args()
 
+    if not args.config_file_name.is_file():
+        print(f"incorrect config file: {args.config_file_name}")
+        exit()
 
-if __name__ == "__main__":
-    config_file_name = "None"
-    if len(sys.argv) == 2:
-        config_file_name = sys.argv[1]
+    if args.resume and args.checkpoint is None:
+        args.checkpoint = Path("rocket_checkpoint.npz")
 
-    config_file_name = Path(config_file_name)
-    if not config_file_name.is_file():
-        print(f"incorrect config file: {config_file_name}")
+    if args.resume and not args.checkpoint.is_file():
+        print(f"no checkpoint to resume: {args.checkpoint}")
         exit()
 
-    launch(*read_rocket_config(config_file_name))
+    instrument = (
+        Instrumentation(args.profiler) if args.profile or args.profiler else None
+    )
+    rocket_params, environment_params, model_params, display_params = (
+        read_rocket_config(args.config_file_name)
+    )
+    guidance = None
+    if args.closed_loop:
+        from rocket_guidance import RecedingHorizonGuidance
+
+        # the guidance plans with the nominal parameters
+        guidance = RecedingHorizonGuidance(
+            rocket_params,
+            environment_params,
+            model_params,
+            horizon=args.horizon,
+            replan_interval=args.replan_interval,
+            budget=args.solve_budget,
+        )
+
+    logger = launch(
+        replace(rocket_params, max_thrust=rocket_params.max_thrust * args.thrust_scale),
+        replace(
+            environment_params,
+            drag_coefficient=environment_params.drag_coefficient * args.drag_scale,
+        ),
+        model_params,
+        display_params,
+        headless=args.headless,
+        instrument=instrument,
+        checkpoint=args.checkpoint,
+        checkpoint_every=args.checkpoint_every,
+        resume=args.resume,
+        guidance=guidance,
+    )
+    if instrument:
+        instrument.print_summary()
+        instrument.write_json(args.profile or Path("launch_profile.json"))
+
+    if guidance:
+        guidance.print_summary()
+
+    if args.closed_loop or args.thrust_scale != 1.0 or args.drag_scale != 1.0:
+        print_insertion(logger.as_arrays(), model_params)
+
+
+def print_insertion(trajectory, model_params):
+    """altitude, velocity and flight angle at the end of the burn against
+    the objectives of the model"""
+    burn = np.flatnonzero(trajectory["u"] > 0)
+    end = burn[-1] + 1 if len(burn) and burn[-1] + 1 < len(trajectory["u"]) else -1
+    print(f"insertion at {trajectory['t'][end]:.0f} s")
+    print(
+        f"  altitude      : {trajectory['h'][end]:12,.0f} m   "
+        f"(objective {model_params.h_obj:,.0f})"
+    )
+    print(
+        f"  velocity      : {trajectory['v'][end]:12,.1f} m/s "
+        f"(objective {model_params.v_obj:,.1f})"
+    )
+    print(
+        f"  flight angle  : {trajectory['beta'][end]:12.2f} deg "
+        f"(objective {model_params.q_obj:.2f})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+''' level of detail for long flight plots
+
+    SeriesBuffer keeps the full resolution series in a growing numpy array
+    and the decimation functions reduce a series to about the pixel width of
+    the axes before it is drawn, so the cost of a frame does not grow with
+    the flight length:
+        minmax: minimum and maximum of each bucket, keeps all peaks
+        lttb: largest triangle three buckets, keeps the visual shape
+        stride: evenly spaced points, for paths such as the trajectory
+'''
+import numpy as np
+
+
+class SeriesBuffer:
+    ''' append only float64 series with amortized growth '''
+
+    def __init__(self, capacity=1024):
+        self._data = np.empty(capacity)
+        self._size = 0
+
+    def append(self, value):
+        if self._size == len(self._data):
+            self._data = np.resize(self._data, 2 * len(self._data))
+
+        self._data[self._size] = value
+        self._size += 1
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def data(self):
+        ''' view on the full resolution series '''
+        return self._data[:self._size]
+
+
+def minmax(x, y, max_points):
+    ''' keeps the minimum and maximum of y of max_points // 2 buckets '''
+    n = len(y)
+    if n <= max_points:
+        return x, y
+
+    buckets = max(1, max_points // 2)
+    size = n // buckets
+    body = buckets * size
+    blocks = y[:body].reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    low = offsets + np.argmin(blocks, axis=1)
+    high = offsets + np.argmax(blocks, axis=1)
+    indices = np.column_stack((np.minimum(low, high), np.maximum(low, high))).ravel()
+    indices = np.concatenate((indices, np.arange(body, n)))
+    return x[indices], y[indices]
+
+
+def lttb(x, y, max_points):
+    ''' largest triangle three buckets downsampling to max_points points '''
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return x, y
+
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    indices = np.empty(max_points, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    for bucket in range(max_points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        # average of the next bucket, the last point for the last bucket
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[stop:next_stop].mean()
+        next_y = y[stop:next_stop].mean()
+        areas = np.abs(
+            (x[selected] - next_x) * (y[start:stop] - y[selected])
+            - (x[selected] - x[start:stop]) * (next_y - y[selected])
+        )
+        selected = start + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+
+    return x[indices], y[indices]
+
+
+def stride(x, y, max_points):
+    ''' evenly spaced points, including the last point '''
+    n = len(y)
+    if n <= max_points:
+        return x, y
+
+    indices = np.linspace(0, n - 1, max_points).astype(int)
+    return x[indices], y[indices]
+
+
+DECIMATORS = {'minmax': minmax, 'lttb': lttb, 'stride': stride}
+
+
+def decimate(x, y, max_points, method='minmax'):
+    return DECIMATORS[method](np.asarray(x), np.asarray(y), max_points)
@@ -7,15 +7,13 @@
         - Plot output
             velocity, pitch angle, altitude, azimuth, throtte, mass,
             trajectory
+
+    unicurses, pandas, matplotlib and PIL are imported by the classes that
+    need them, so a headless run does not pay for their import
 """
 
-import unicurses as curses
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.offsetbox import OffsetImage, AnnotationBbox
-from matplotlib.gridspec import GridSpec
-from PIL import Image
+from rocket_lod import SeriesBuffer, decimate
 
 deg_rad = np.pi / 180.0
 rad_deg = 180.0 / np.pi
@@ -29,6 +27,8 @@ class Console:
     """
 
     def __init__(self):
+        import unicurses as curses
+
         stdscr = curses.initscr()
         curses.start_color()
         curses.init_pair(1, curses.COLOR_GREEN, curses.COLOR_WHITE | curses.A_DIM)
@@ -37,6 +37,8 @@ class Console:
 
     @staticmethod
     def display_status_message(status):
+        import unicurses as curses
+
         curses.mvchgat(0, 0, 0, None, None)
 
         status_dict = {
@@ -57,6 +59,8 @@ class Console:
 
     @staticmethod
     def stop_window():
+        import unicurses as curses
+
         curses.mvchgat(0, 0, 0, None, None)
         curses.addstr("Press any key to exit ...")
         curses.endwin()
@@ -64,24 +68,44 @@ class Console:
 
 
 class OutputLog:
+    COLUMNS = ["t", "m", "v", "beta", "h", "theta", "u"]
+    STATUS_KEYS = ["time", "mass", "vel", "beta", "alt", "theta", "control"]
 
     def __init__(self):
         self.outputlog_name = "rocket_output_log.xlsx"
-        self.log_df = pd.DataFrame(columns=["t", "m", "v", "beta", "h", "theta", "u"])
+        self.rows = []
         self.index = 0
 
     def log_status(self, status):
-        self.log_df.loc[self.index] = [
-            status.get("time"),
-            status.get("mass"),
-            status.get("vel"),
-            status.get("beta"),
-            status.get("alt"),
-            status.get("theta"),
-            status.get("control"),
-        ]
+        self.rows.append(
+            (
+                status.get("time"),
+                status.get("mass"),
+                status.get("vel"),
+                status.get("beta"),
+                status.get("alt"),
+                status.get("theta"),
+                status.get("control"),
+            )
+        )
         self.index += 1
 
+    def status_rows(self):
+        """logged rows as status dictionaries"""
+        for row in self.rows:
+            yield dict(zip(self.STATUS_KEYS, row))
+
+    def as_arrays(self):
+        """logged rows as a dictionary of column arrays"""
+        rows = np.array(self.rows, dtype=np.float64).reshape(-1, len(self.COLUMNS))
+        return {column: rows[:, i].copy() for i, column in enumerate(self.COLUMNS)}
+
+    @property
+    def log_df(self):
+        import pandas as pd
+
+        return pd.DataFrame(self.rows, columns=self.COLUMNS)
+
     def write_logger(self):
         self.log_df.to_excel(self.outputlog_name)
 
@@ -89,8 +113,14 @@ class OutputLog:
 class MapPlot:
     FIGSIZE = (12, 8)
 
-    def __init__(self, rocket, environment, _, display):
-        """initial all plot settings"""
+    def __init__(self, rocket, environment, _, display, interactive=True):
+        """initial all plot settings, with interactive False the figure is
+        not shown, e.g. for rendering frames on the Agg backend
+        """
+        import matplotlib.pyplot as plt
+        from matplotlib.gridspec import GridSpec
+        from PIL import Image
+
         self.fig = plt.figure(constrained_layout=True, figsize=self.FIGSIZE)
         gs = GridSpec(3, 4, figure=self.fig)
         ax_vel = self.fig.add_subplot(gs[0, 0])
@@ -169,22 +199,39 @@ class MapPlot:
         self.rocket = None
         self.update_sprite(0.0, self.earth_radius, 0.0, 0.0)
 
-        step_ = display.time_interval * display.status_update_step
-        self.time_series = np.arange(0, display.flight_duration + step_, step_)
-        self.vel_series = []
-        self.beta_series = []
-        self.alt_series = []
-        self.theta_series = []
-        self.acc_series = []
-        self.throttle_series = []
-        self.mass_series = []
-        self.traj_series_x = []
-        self.traj_series_y = []
-
-        plt.ion()
-        self.fig.show()
+        # full resolution series, the lines are drawn decimated to about the
+        # pixel width of their axes; the time of each state is kept as states
+        # are not evenly spaced in the real time display
+        self.series = {
+            name: SeriesBuffer()
+            for name in (
+                "time",
+                "vel",
+                "beta",
+                "alt",
+                "theta",
+                "throttle",
+                "mass",
+                "traj_x",
+                "traj_y",
+            )
+        }
+        self.lines = {
+            "vel": self.vel_plot,
+            "beta": self.beta_plot,
+            "alt": self.alt_plot,
+            "theta": self.theta_plot,
+            "throttle": self.throttle_plot,
+            "mass": self.mass_plot,
+        }
+
+        if interactive:
+            plt.ion()
+            self.fig.show()
 
     def update_sprite(self, x, y, alignment, theta):
+        from matplotlib.offsetbox import OffsetImage, AnnotationBbox
+
         try:
             self.rocket.remove()
 
@@ -195,46 +242,68 @@ class MapPlot:
         rocket_im = AnnotationBbox(im, (x, y), frameon=False)
         self.rocket = self.ax_traj.add_artist(rocket_im)
 
+    def append_state(self, state):
+        """appends the state to the full resolution series"""
+        alt = state.get("alt")
+        theta = state.get("theta")
+        radius = self.earth_radius + alt
+        series = self.series
+        series["traj_x"].append(radius * np.sin(theta * deg_rad))
+        series["traj_y"].append(radius * np.cos(theta * deg_rad))
+        series["time"].append(state.get("time"))
+        series["vel"].append(state.get("vel"))
+        series["beta"].append(state.get("beta"))
+        series["alt"].append(alt)
+        series["theta"].append(theta)
+        series["throttle"].append(state.get("control"))
+        series["mass"].append(state.get("mass"))
+
+    def update_state(self, state):
+        """appends the state and updates the lines and sprite, without drawing"""
+        self.append_state(state)
+        series = self.series
+        self.traj_plot.set_data(
+            *decimate(
+                series["traj_x"].data,
+                series["traj_y"].data,
+                self.max_points(self.ax_traj),
+                method="stride",
+            )
+        )
+        time_series = series["time"].data
+        for name, line in self.lines.items():
+            line.set_data(
+                *decimate(time_series, series[name].data, self.max_points(line.axes))
+            )
+
+        self.update_sprite(
+            series["traj_x"].data[-1],
+            series["traj_y"].data[-1],
+            series["beta"].data[-1],
+            state.get("theta"),
+        )
+
     def plot_state_generator(self, new_state=None):
         """generator to plot the new state"""
-        index = 0
         while True:
             state = yield new_state
             if state is None:
                 yield
 
-            alt = state.get("alt")
-            theta = state.get("theta")
-            radius = self.earth_radius + alt
-            self.traj_series_x.append(radius * np.sin(theta * deg_rad))
-            self.traj_series_y.append(radius * np.cos(theta * deg_rad))
-            self.traj_plot.set_data(self.traj_series_x, self.traj_series_y)
-
-            self.vel_series.append(state.get("vel"))
-            self.beta_series.append(state.get("beta"))
-            self.alt_series.append(alt)
-            self.theta_series.append(theta)
-            self.throttle_series.append(state.get("control"))
-            self.mass_series.append(state.get("mass"))
-
-            self.vel_plot.set_data(self.time_series[: index + 1], self.vel_series)
-            self.beta_plot.set_data(self.time_series[: index + 1], self.beta_series)
-            self.alt_plot.set_data(self.time_series[: index + 1], self.alt_series)
-            self.theta_plot.set_data(self.time_series[: index + 1], self.theta_series)
-            self.throttle_plot.set_data(
-                self.time_series[: index + 1], self.throttle_series
-            )
-            self.mass_plot.set_data(self.time_series[: index + 1], self.mass_series)
-
-            self.update_sprite(
-                self.traj_series_x[-1],
-                self.traj_series_y[-1],
-                self.beta_series[-1],
-                theta,
-            )
-
+            self.update_state(state)
             self.blit()
-            index += 1
+
+    @staticmethod
+    def max_points(ax):
+        """about two points per pixel of the axes width"""
+        return max(2 * int(ax.bbox.width), 100)
+
+    def export(self, file_name):
+        """writes the full resolution series to a npz file"""
+        np.savez(
+            file_name,
+            **{name: buffer.data for name, buffer in self.series.items()},
+        )
 
     def blit(self):
         self.fig.canvas.draw()
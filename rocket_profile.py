@@ -0,0 +1,176 @@
+''' opt-in instrumentation for rocket_launch.launch
+        - counters: right hand side evaluations, integrator integrate calls
+          and internal integrator steps
+        - timers: wall time per phase (physics, guidance, plot, console, log,
+          io)
+        - peak memory and simulated to wall time ratio
+        - optional cProfile or pyinstrument capture around the main loop
+
+    The summary is printed at the end of the run and written as JSON
+'''
+import sys
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:
+    # not available on windows, peak memory is then traced with tracemalloc
+    resource = None
+    import tracemalloc
+
+PHASES = ('physics', 'guidance', 'plot', 'console', 'log', 'io')
+PROFILERS = ('cprofile', 'pyinstrument')
+
+
+class Instrumentation:
+
+    def __init__(self, profiler=None, profile_file_name=None):
+        '''
+        arguments:
+            profiler: None, 'cprofile' or 'pyinstrument'
+            profile_file_name: file to store the profile, by default
+                launch.prof (cprofile) or launch_profile.html (pyinstrument)
+        '''
+        if profiler not in (None, *PROFILERS):
+            raise ValueError(f'profiler must be one of {PROFILERS}, got {profiler}')
+
+        self.profiler_name = profiler
+        self.profile_file_name = profile_file_name
+        self.profiler = None
+        self.rhs_evaluations = 0
+        self.integrate_calls = 0
+        self.integrator_steps = 0
+        self.phase_time = dict.fromkeys(PHASES, 0.0)
+        self.simulated_time = 0.0
+        self.wall_time = 0.0
+        self.peak_memory = 0
+        self._start = None
+
+    def count_rhs(self, rhs):
+        ''' wraps the right hand side rhs to count its evaluations '''
+        def counted_rhs(t, state):
+            self.rhs_evaluations += 1
+            return rhs(t, state)
+
+        return counted_rhs
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+
+        finally:
+            self.phase_time[name] += time.perf_counter() - start
+
+    def collect_integrator(self, integrator):
+        ''' adds the internal steps of a scipy ode vode integrator, to be called
+            at the end of the run and before the integrator is reinitialized
+        '''
+        iwork = getattr(integrator._integrator, 'iwork', None)  # pylint: disable=protected-access
+        if iwork is not None:
+            # iwork[10] is the number of steps taken since the initialization
+            self.integrator_steps += int(iwork[10])
+
+    def start(self):
+        if resource is None:
+            tracemalloc.start()
+
+        if self.profiler_name == 'cprofile':
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+        elif self.profiler_name == 'pyinstrument':
+            try:
+                import pyinstrument
+
+            except ImportError:
+                print('pyinstrument is not installed, profiling is skipped')
+
+            else:
+                self.profiler = pyinstrument.Profiler()
+                self.profiler.start()
+
+        self._start = time.perf_counter()
+
+    def stop(self, simulated_time):
+        self.wall_time = time.perf_counter() - self._start
+        self.simulated_time = simulated_time
+
+        if self.profiler_name == 'cprofile' and self.profiler:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile_file_name or 'launch.prof')
+
+        elif self.profiler_name == 'pyinstrument' and self.profiler:
+            self.profiler.stop()
+            with open(self.profile_file_name or 'launch_profile.html', mode='wt') as html:
+                html.write(self.profiler.output_html())
+
+        if resource is None:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        else:
+            # ru_maxrss is in kilobytes on linux and in bytes on macOS
+            scale = 1 if sys.platform == 'darwin' else 1024
+            self.peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+    def summary(self):
+        return {
+            'rhs_evaluations': self.rhs_evaluations,
+            'integrate_calls': self.integrate_calls,
+            'integrator_steps': self.integrator_steps,
+            'phase_time': self.phase_time,
+            'other_time': self.wall_time - sum(self.phase_time.values()),
+            'wall_time': self.wall_time,
+            'simulated_time': self.simulated_time,
+            'simulated_wall_ratio': (
+                self.simulated_time / self.wall_time if self.wall_time > 0 else None),
+            'peak_memory_bytes': self.peak_memory,
+            'profiler': self.profiler_name,
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f'rhs evaluations      : {summary["rhs_evaluations"]:,}')
+        print(f'integrate calls      : {summary["integrate_calls"]:,}')
+        print(f'integrator steps     : {summary["integrator_steps"]:,}')
+        for name, phase_time in summary['phase_time'].items():
+            print(f'time {name:<16}: {phase_time:10.3f} s')
+
+        print(f'time other           : {summary["other_time"]:10.3f} s')
+        print(f'wall time            : {summary["wall_time"]:10.3f} s')
+        print(f'simulated time       : {summary["simulated_time"]:10.1f} s')
+        if summary['simulated_wall_ratio'] is not None:
+            print(f'simulated/wall       : {summary["simulated_wall_ratio"]:10.1f}')
+
+        print(f'peak memory          : {summary["peak_memory_bytes"] / 2**20:10.1f} MB')
+
+    def write_json(self, file_name):
+        with open(file_name, mode='wt') as json_file:
+            json.dump(self.summary(), json_file, indent=2)
+
+
+class NullInstrumentation:
+    ''' stand in for Instrumentation when launch runs without instrumentation '''
+    integrate_calls = 0
+
+    @staticmethod
+    def count_rhs(rhs):
+        return rhs
+
+    @staticmethod
+    def phase(name):  # pylint: disable=unused-argument
+        return nullcontext()
+
+    def collect_integrator(self, integrator):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self, simulated_time):
+        pass
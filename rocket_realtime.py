@@ -0,0 +1,288 @@
+''' real time display of the launch with time warp
+
+    The flight is integrated on the adaptive steps of an explicit Runge-Kutta
+    solver of scipy (RK45 or DOP853) and not on the time_interval of the
+    config. The thrust control is piecewise constant on time_interval, the
+    solver is restarted where the control changes, so no step crosses a
+    discontinuity and long coast phases take a few large steps.
+
+    A frame scheduler samples the flight at a fixed display frame rate: the
+    simulated time of a frame is warp times the elapsed wall time, and the
+    state at that time is evaluated from the dense output of the solver step.
+    The number of frames, and with it the render cost, only depends on the
+    frame rate and the wall time, not on time_interval. A frame that is late
+    drops the frame slots it missed, the flight stays on the wall clock.
+
+    time warp: 1x, 10x, 100x or max (integrate for one frame period between
+    frames), changed at runtime with the keys in the plot window
+        1: 1x    2: 10x    3: 100x    0: max    +/-: warp * 10 or / 10
+
+    usage:
+        python rocket_realtime.py configs/mintoc_20T.cfg --warp 10 --fps 20
+'''
+import argparse
+import time
+from math import inf
+from pathlib import Path
+import numpy as np
+from scipy.integrate import RK45, DOP853
+from rocket_input import read_rocket_config
+from rocket_launch import RocketPhysics, rad_deg
+
+SOLVERS = {'RK45': RK45, 'DOP853': DOP853}
+WARP_KEYS = {'1': 1.0, '2': 10.0, '3': 100.0, '0': inf}
+# absolute tolerance of vel, beta, alt, theta and fuel mass
+ATOL = (1e-6, 1e-9, 1e-4, 1e-9, 1e-4)
+
+
+class FlightStepper:
+    ''' adaptive integration of the flight with dense output
+
+        step() takes one solver step, state_at(t) steps the solver up to t
+        and interpolates the state, t must not decrease between calls
+    '''
+
+    def __init__(self, rocket_params, environment_params, display_params,
+                 method='RK45', rtol=1e-6, atol=ATOL):
+        self.rocket = RocketPhysics(rocket_params, environment_params)
+        self.control = np.asarray(rocket_params.thrust_control)
+        self.time_interval = display_params.time_interval
+        self.end_time = display_params.flight_duration
+        self.solver_class = SOLVERS[method]
+        self.rtol = rtol
+        self.atol = np.array(atol)
+        # control indices where the throttle changes
+        self._changes = np.flatnonzero(np.diff(self.control)) + 1
+        self._dense = None
+        self.steps = 0
+        self.segments = 0
+        self.finished = False
+        self._start_segment(0.0, np.array([
+            rocket_params.vel, rocket_params.beta, rocket_params.alt, 0.0,
+            rocket_params.fuel_mass,
+        ]))
+
+    @property
+    def t(self):
+        ''' time the solver has reached '''
+        return self.solver.t
+
+    def control_index(self, t):
+        return min(int(t / self.time_interval), len(self.control) - 1)
+
+    def _rhs(self, t, state):
+        # RocketPhysics takes the fuel mass of its previous call, which depends
+        # on the order of the evaluations of the solver; it is set from the
+        # state, so the solution does not depend on the method
+        self.rocket.fuel_mass = state[4]
+        # the derivatives buffer of RocketPhysics is reused, the solver keeps it
+        return self.rocket.derivatives_gravity_turn(t, state).copy()
+
+    def _start_segment(self, t, state):
+        index = self.control_index(t)
+        next_change = np.searchsorted(self._changes, index, side='right')
+        t_bound = (
+            self._changes[next_change] * self.time_interval
+            if next_change < len(self._changes) else inf
+        )
+        self.rocket.throttle = self.control[index]
+        self.solver = self.solver_class(
+            self._rhs, t, state, min(t_bound, self.end_time),
+            rtol=self.rtol, atol=self.atol,
+        )
+        self.segments += 1
+
+    def step(self):
+        ''' one adaptive step, returns False when the flight has finished '''
+        if self.finished:
+            return False
+
+        if self.solver.status == 'finished':
+            self._start_segment(self.solver.t, self.solver.y)
+
+        self.solver.step()
+        if self.solver.status == 'failed':
+            raise RuntimeError(f'integration failed at {self.solver.t:.1f} s: '
+                               f'{self.solver.message}')
+
+        self.steps += 1
+        self._dense = self.solver.dense_output()
+        self.finished = self.solver.y[2] < -100 or (
+            self.solver.status == 'finished' and self.solver.t >= self.end_time)
+        return not self.finished
+
+    def state_at(self, t):
+        ''' state at time t, or at the end of the flight if it ends before t '''
+        while self.t < t and self.step():
+            pass
+
+        if self._dense is None:
+            return self.solver.y.copy()
+
+        return self._dense(min(t, self.t))
+
+    def status(self, t, state):
+        ''' status dictionary of the state as logged by launch '''
+        rocket = self.rocket
+        throttle = rocket.throttle
+        index = self.control_index(t)
+        rocket.throttle = self.control[index]
+        acceleration = rocket.derivatives_gravity_turn(t, state)[0]
+        vel, beta, alt, theta, _ = state
+        status = {
+            'time': t,
+            'vel': vel,
+            'beta': beta * rad_deg,
+            'alt': alt,
+            'theta': theta * rad_deg,
+            'acc': acceleration,
+            'mass': rocket.mass,
+            'thrust': rocket.thrust / rocket.mass,
+            'drag': rocket.drag(alt, vel) / rocket.mass,
+            'gravity': rocket.gravity(alt),
+            'control': self.control[index],
+            'index': index,
+        }
+        rocket.throttle = throttle
+        return status
+
+
+class FrameScheduler:
+    ''' frame slots at a fixed rate and the simulated time of each frame
+        arguments:
+            warp: simulated seconds per wall second, inf for max
+            clock, sleep: wall clock and sleep function, replaced in tests
+    '''
+
+    def __init__(self, fps=20, warp=1.0, clock=time.perf_counter, sleep=time.sleep):
+        self.period = 1 / fps
+        self.warp = warp
+        self.clock = clock
+        self.sleep = sleep
+        self.time = 0.0
+        self.frames = 0
+        self.dropped = 0
+        self._slot = None
+        self._anchor = None
+        self._frame_wall = None
+
+    def set_warp(self, warp):
+        ''' the simulated time continues from the last frame at the new warp '''
+        self.warp = warp
+        self._anchor = None
+
+    def next_frame(self):
+        ''' waits for the next frame slot
+            returns the simulated time of the frame, inf for max warp
+        '''
+        now = self.clock()
+        if self._slot is None:
+            self._slot = now
+
+        if now < self._slot:
+            self.sleep(self._slot - now)
+            now = self._slot
+
+        else:
+            missed = int((now - self._slot) / self.period)
+            self.dropped += missed
+            self._slot += missed * self.period
+
+        self._slot += self.period
+        # the wall time of the last frame anchors the simulated time after a
+        # change of warp
+        frame_wall, self._frame_wall = self._frame_wall, now
+        if self.warp == inf:
+            return inf
+
+        if self._anchor is None:
+            self._anchor = (now if frame_wall is None else frame_wall, self.time)
+
+        anchor_wall, anchor_time = self._anchor
+        return anchor_time + (now - anchor_wall) * self.warp
+
+    def shown(self, t):
+        self.time = t
+        self.frames += 1
+
+
+def run_realtime(stepper, scheduler, show):
+    ''' shows the flight at the frame rate of the scheduler
+        show(status) renders a frame, the flight ends when it has shown the
+        last state of the stepper
+    '''
+    while True:
+        target = scheduler.next_frame()
+        if target == inf:
+            deadline = scheduler.clock() + scheduler.period
+            while scheduler.clock() < deadline and stepper.step():
+                pass
+
+            target = stepper.t
+
+        t = min(target, stepper.end_time)
+        state = stepper.state_at(t)
+        t = min(t, stepper.t)
+        show(stepper.status(t, state))
+        scheduler.shown(t)
+        if stepper.finished and t >= stepper.t:
+            break
+
+
+def warp_label(warp):
+    return 'max' if warp == inf else f'{warp:g}x'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='real time launch display with time warp')
+    parser.add_argument('config_file_name', type=Path)
+    parser.add_argument('--warp', default='1', help='1, 10, 100 or max')
+    parser.add_argument('--fps', type=float, default=20)
+    parser.add_argument('--method', choices=SOLVERS, default='RK45')
+    args = parser.parse_args()
+
+    if not args.config_file_name.is_file():
+        print(f'incorrect config file: {args.config_file_name}')
+        exit()
+
+    from rocket_output import Console, MapPlot
+
+    params = read_rocket_config(args.config_file_name)
+    rocket_params, environment_params, _, display_params = params
+    stepper = FlightStepper(
+        rocket_params, environment_params, display_params, method=args.method)
+    scheduler = FrameScheduler(
+        args.fps, inf if args.warp == 'max' else float(args.warp))
+
+    console = Console()
+    mapper = MapPlot(*params)
+    mapper.fig.suptitle(f'time warp {warp_label(scheduler.warp)}')
+
+    def on_key(event):
+        if event.key in WARP_KEYS:
+            scheduler.set_warp(WARP_KEYS[event.key])
+
+        elif event.key in ('+', '-') and scheduler.warp != inf:
+            scheduler.set_warp(scheduler.warp * (10 if event.key == '+' else 0.1))
+
+        else:
+            return
+
+        mapper.fig.suptitle(f'time warp {warp_label(scheduler.warp)}')
+
+    mapper.fig.canvas.mpl_connect('key_press_event', on_key)
+    plot = mapper.plot_state_generator()
+    next(plot)
+
+    def show(state):
+        plot.send(state)
+        console.display_status_message(state)
+
+    run_realtime(stepper, scheduler, show)
+    console.stop_window()
+    print(f'{scheduler.frames} frames, {scheduler.dropped} dropped, '
+          f'{stepper.steps} solver steps in {stepper.segments} control segments')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+''' re-entry of the vehicle after the burn, from an orbit or an entry state
+
+    The unpowered vehicle (dry mass, reference area and drag coefficient of
+    the config, lift lift_to_drag times the drag, 0 for a ballistic entry,
+    directed away from the Earth) falls through the exponential atmosphere of the
+    config with the gravity turn equations of rocket_launch without thrust.
+    Near the deceleration peak the drag term changes the velocity on a time
+    scale of tenths of seconds while the flight lasts minutes, so the
+    equations are integrated by an implicit solver (Radau or BDF) with the
+    analytic Jacobian of ReentryPhysics instead of the explicit vode setup
+    of launch.
+
+    states: vel (m/s), beta (angle to vertical, rad, above pi / 2 while
+        descending), alt (m), theta (range, rad), heat_load (J/m^2)
+    entry: flight path angle gamma (deg, negative below the horizon) at the
+        entry altitude, the entry velocity follows from the orbit: a
+        tangential deorbit burn from a circular orbit at orbit_alt leaves the
+        vehicle on an ellipse through the entry point at angle gamma
+    g-load: aerodynamic deceleration, drag and lift, in units of g0
+    heating: Sutton-Graves stagnation point heat flux
+        q = k sqrt(rho / nose_radius) vel^3 (W/m^2), k = 1.7415e-4
+
+    The corridor search integrates the entries of a grid of flight path
+    angles in parallel worker processes and classifies each: skip (leaves
+    the atmosphere again, only with lift), g-load or heating (a peak above
+    its limit), heat-load (the integrated heat load above its optional
+    limit, bounds shallow ballistic entries), safe; the corridor is the
+    range of safe angles.
+
+    usage:
+        python rocket_reentry.py entry configs/mintoc_20T.cfg --gamma -2
+        python rocket_reentry.py corridor configs/mintoc_20T.cfg --gamma=-0.5,-12,24 \\
+            --lift-to-drag 0.3 --workers 4
+'''
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from math import cos, sin, exp, sqrt, radians
+from pathlib import Path
+import numpy as np
+from rocket_input import read_rocket_config
+
+SUTTON_GRAVES = 1.7415e-4
+STATES = ('vel', 'beta', 'alt', 'theta', 'heat_load')
+ENTRY_ALT = 120_000
+NOSE_RADIUS = 1.0
+G_LIMIT = 10.0
+HEAT_LIMIT = 2e6
+# sample step (s) of the dense output for the peaks
+SAMPLE_STEP = 0.1
+
+
+@dataclass
+class EntryState:
+    vel: float
+    gamma: float
+    alt: float
+    theta: float = 0.0
+
+
+class ReentryPhysics:
+    ''' re-entry equations of the unpowered vehicle and their Jacobian '''
+
+    def __init__(self, rocket_params, environment_params, nose_radius=NOSE_RADIUS,
+                 lift_to_drag=0.0, mass=None):
+        self.mass = rocket_params.dry_mass if mass is None else mass
+        self.nose_radius = nose_radius
+        self.lift_to_drag = lift_to_drag
+        self._g0 = environment_params.gravity
+        self.radius = environment_params.radius
+        self._density = environment_params.density
+        self._scale_height = environment_params.scale_height
+        self._drag_k = (0.5 * environment_params.density * rocket_params.rocket_area
+                        * environment_params.drag_coefficient / self.mass)
+        self._heat_k = SUTTON_GRAVES * sqrt(environment_params.density / nose_radius)
+
+    def g_load(self, alt, vel):
+        ''' aerodynamic deceleration (g0) of drag and lift, vectorized '''
+        drag = self._drag_k * np.exp(-np.asarray(alt) / self._scale_height) * vel * vel
+        return drag * sqrt(1 + self.lift_to_drag ** 2) / self._g0
+
+    def heat_flux(self, alt, vel):
+        ''' stagnation point heat flux (W/m^2), vectorized '''
+        return self._heat_k * np.exp(-0.5 * np.asarray(alt) / self._scale_height) * vel ** 3
+
+    def derivatives(self, t, state):  # pylint: disable=unused-argument
+        vel, beta, alt, _, _ = state.tolist()
+
+        cos_beta = cos(beta)
+        sin_beta = sin(beta)
+        radius = self.radius + alt
+        gravity = self._g0 * (self.radius / radius) ** 2
+        density = exp(-alt / self._scale_height)
+        theta_dot = vel * sin_beta / radius
+        drag = self._drag_k * density * vel * vel
+        return np.array([
+            -drag - gravity * cos_beta,
+            gravity * sin_beta / vel - theta_dot - self.lift_to_drag * drag / vel,
+            vel * cos_beta,
+            theta_dot,
+            self._heat_k * sqrt(density) * vel ** 3,
+        ])
+
+    def jacobian(self, t, state):  # pylint: disable=unused-argument
+        ''' d(derivatives)/d(state), theta and heat_load do not act on the
+            other states so their columns are zero
+        '''
+        vel, beta, alt, _, _ = state.tolist()
+
+        cos_beta = cos(beta)
+        sin_beta = sin(beta)
+        radius = self.radius + alt
+        gravity = self._g0 * (self.radius / radius) ** 2
+        density = exp(-alt / self._scale_height)
+        drag = self._drag_k * density * vel * vel
+        heat_flux = self._heat_k * sqrt(density) * vel ** 3
+
+        jacobian = np.zeros((5, 5))
+        jacobian[0, :3] = (
+            -2 * drag / vel,
+            gravity * sin_beta,
+            drag / self._scale_height + 2 * gravity * cos_beta / radius,
+        )
+        jacobian[1, :3] = (
+            -gravity * sin_beta / vel ** 2 - sin_beta / radius
+            - self.lift_to_drag * drag / vel ** 2,
+            cos_beta * (gravity / vel - vel / radius),
+            -2 * gravity * sin_beta / (radius * vel) + vel * sin_beta / radius ** 2
+            + self.lift_to_drag * drag / (vel * self._scale_height),
+        )
+        jacobian[2, :2] = cos_beta, -vel * sin_beta
+        jacobian[3, :3] = sin_beta / radius, vel * cos_beta / radius, -vel * sin_beta / radius ** 2
+        jacobian[4, 0] = 3 * heat_flux / vel
+        jacobian[4, 2] = -0.5 * heat_flux / self._scale_height
+        return jacobian
+
+
+def orbit_entry_state(environment_params, orbit_alt, gamma, entry_alt=ENTRY_ALT):
+    ''' entry state at entry_alt and flight path angle gamma (deg) after a
+        tangential deorbit burn from the circular orbit at orbit_alt
+        returns the entry state and the delta v (m/s) of the burn
+    '''
+    mu = environment_params.gravity * environment_params.radius ** 2
+    r_orbit = environment_params.radius + orbit_alt
+    r_entry = environment_params.radius + entry_alt
+    # conservation of energy and angular momentum from the apoapsis of the
+    # deorbit ellipse to the entry point
+    ratio = r_orbit / (r_entry * cos(radians(gamma)))
+    vel_apoapsis = sqrt(2 * mu * (1 / r_entry - 1 / r_orbit) / (ratio ** 2 - 1))
+    vel_entry = vel_apoapsis * ratio
+    return (EntryState(vel=vel_entry, gamma=gamma, alt=entry_alt),
+            sqrt(mu / r_orbit) - vel_apoapsis)
+
+
+def simulate_entry(physics, entry, method='Radau', t_max=3_600, rtol=1e-8, atol=1e-6):
+    ''' integrates the entry until the ground, the skip out of the
+        atmosphere or t_max
+        returns a dictionary of the outcome (landed, skip or timeout), the
+        peaks and the sampled trajectory
+    '''
+    from scipy.integrate import solve_ivp
+
+    def ground(t, state):  # pylint: disable=unused-argument
+        return state[2]
+
+    def skip(t, state):  # pylint: disable=unused-argument
+        return state[2] - entry.alt - 1.0
+
+    ground.terminal = skip.terminal = True
+    ground.direction, skip.direction = -1, 1
+    options = {'jac': physics.jacobian} if method in ('Radau', 'BDF', 'LSODA') else {}
+    y0 = np.array([entry.vel, radians(90 - entry.gamma), entry.alt, entry.theta, 0.0])
+    r = solve_ivp(physics.derivatives, (0.0, t_max), y0, method=method, rtol=rtol,
+                  atol=atol, events=(ground, skip), dense_output=True, **options)
+    if r.status == -1:
+        raise RuntimeError(f'entry at gamma {entry.gamma} deg: {r.message}')
+
+    outcome = 'landed' if len(r.t_events[0]) else 'skip' if len(r.t_events[1]) else 'timeout'
+    t = np.union1d(r.t, np.arange(0.0, r.t[-1], SAMPLE_STEP))
+    states = r.sol(t)
+    g_load = physics.g_load(states[2], states[0])
+    heat_flux = physics.heat_flux(states[2], states[0])
+    return {
+        'gamma': entry.gamma,
+        'outcome': outcome,
+        'duration': float(r.t[-1]),
+        'peak_g_load': float(g_load.max()),
+        'peak_g_load_alt': float(states[2, g_load.argmax()]),
+        'peak_heat_flux': float(heat_flux.max()),
+        'total_heat_load': float(r.y[4, -1]),
+        'range': float(r.y[3, -1] * physics.radius),
+        'steps': len(r.t) - 1,
+        'nfev': r.nfev,
+        'njev': r.njev,
+        't': t,
+        **dict(zip(STATES, states)),
+        'g_load': g_load,
+        'heat_flux': heat_flux,
+    }
+
+
+def classify(result, g_limit=G_LIMIT, heat_limit=HEAT_LIMIT, heat_load_limit=None):
+    ''' skip, timeout, g-load, heating, heat-load or safe '''
+    if result['outcome'] != 'landed':
+        return result['outcome']
+
+    if result['peak_g_load'] > g_limit:
+        return 'g-load'
+
+    if result['peak_heat_flux'] > heat_limit:
+        return 'heating'
+
+    if heat_load_limit is not None and result['total_heat_load'] > heat_load_limit:
+        return 'heat-load'
+
+    return 'safe'
+
+
+def entry_summary(rocket_params, environment_params, orbit_alt, gamma,
+                  entry_alt=ENTRY_ALT, nose_radius=NOSE_RADIUS, lift_to_drag=0.0,
+                  method='Radau'):
+    ''' peaks of the entry from the orbit at flight path angle gamma, without
+        the sampled trajectory
+    '''
+    physics = ReentryPhysics(rocket_params, environment_params, nose_radius, lift_to_drag)
+    entry, delta_v = orbit_entry_state(environment_params, orbit_alt, gamma, entry_alt)
+    result = simulate_entry(physics, entry, method=method)
+    return {name: value for name, value in result.items() if np.ndim(value) == 0} | {
+        'entry_vel': entry.vel, 'delta_v': delta_v}
+
+
+def corridor(rocket_params, environment_params, orbit_alt, gammas, entry_alt=ENTRY_ALT,
+             nose_radius=NOSE_RADIUS, lift_to_drag=0.0, g_limit=G_LIMIT,
+             heat_limit=HEAT_LIMIT, heat_load_limit=None, workers=1):
+    ''' entries at the flight path angles gammas (deg), in parallel if
+        workers > 1
+        returns the summaries with their class and the shallowest and
+        steepest safe angle (None if no angle is safe)
+    '''
+    summarize = partial(entry_summary, rocket_params, environment_params, orbit_alt,
+                        entry_alt=entry_alt, nose_radius=nose_radius,
+                        lift_to_drag=lift_to_drag)
+    if workers == 1:
+        summaries = list(map(summarize, gammas))
+
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            summaries = list(executor.map(summarize, gammas))
+
+    for summary in summaries:
+        summary['class'] = classify(summary, g_limit, heat_limit, heat_load_limit)
+
+    safe = [summary['gamma'] for summary in summaries if summary['class'] == 'safe']
+    return summaries, ((max(safe), min(safe)) if safe else None)
+
+
+def parse_gammas(text):
+    ''' start,stop,count to count flight path angles '''
+    start, stop, count = text.split(',')
+    return np.linspace(float(start), float(stop), int(count)).tolist()
+
+
+def print_entry(summary):
+    print(f'gamma {summary["gamma"]:.2f} deg, entry velocity {summary["entry_vel"]:.1f} m/s '
+          f'(deorbit delta v {summary["delta_v"]:.1f} m/s): {summary["outcome"]} '
+          f'after {summary["duration"]:.1f} s, range {summary["range"] / 1000:.1f} km\n'
+          f'peak g-load {summary["peak_g_load"]:.2f} at {summary["peak_g_load_alt"] / 1000:.1f} km, '
+          f'peak heat flux {summary["peak_heat_flux"] / 1e6:.3f} MW/m^2, '
+          f'heat load {summary["total_heat_load"] / 1e6:.1f} MJ/m^2\n'
+          f'{summary["steps"]} steps, {summary["nfev"]} evaluations, '
+          f'{summary["njev"]} jacobians')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='re-entry of the vehicle of a config')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    entry_parser = subparsers.add_parser('entry', help='single entry')
+    entry_parser.add_argument('--gamma', type=float, default=-2.0,
+                              help='entry flight path angle (deg)')
+    entry_parser.add_argument('--method', choices=('Radau', 'BDF', 'LSODA', 'RK45'),
+                              default='Radau')
+    corridor_parser = subparsers.add_parser('corridor', help='search of the entry corridor')
+    corridor_parser.add_argument('--gamma', type=parse_gammas, default='-0.5,-12,24',
+                                 help='start,stop,count of the flight path angles (deg)')
+    corridor_parser.add_argument('--g-limit', type=float, default=G_LIMIT)
+    corridor_parser.add_argument('--heat-limit', type=float, default=HEAT_LIMIT,
+                                 help='W/m^2')
+    corridor_parser.add_argument('--heat-load-limit', type=float, help='J/m^2')
+    corridor_parser.add_argument('--workers', type=int, default=1)
+    for subparser in (entry_parser, corridor_parser):
+        subparser.add_argument('config_file_name', type=Path)
+        subparser.add_argument('--orbit-alt', type=float,
+                               help='circular orbit altitude (m), default h_obj of the config')
+        subparser.add_argument('--entry-alt', type=float, default=ENTRY_ALT)
+        subparser.add_argument('--nose-radius', type=float, default=NOSE_RADIUS)
+        subparser.add_argument('--lift-to-drag', type=float, default=0.0)
+    args = parser.parse_args()
+
+    if not args.config_file_name.is_file():
+        print(f'incorrect config file: {args.config_file_name}')
+        exit()
+
+    rocket_params, environment_params, model_params, _ = read_rocket_config(
+        args.config_file_name)
+    orbit_alt = model_params.h_obj if args.orbit_alt is None else args.orbit_alt
+    start = time.perf_counter()
+    if args.command == 'entry':
+        print_entry(entry_summary(rocket_params, environment_params, orbit_alt, args.gamma,
+                                  args.entry_alt, args.nose_radius, args.lift_to_drag,
+                                  args.method))
+        print(f'{time.perf_counter() - start:.3f} s')
+        return
+
+    summaries, safe = corridor(rocket_params, environment_params, orbit_alt, args.gamma,
+                               args.entry_alt, args.nose_radius, args.lift_to_drag,
+                               args.g_limit, args.heat_limit, args.heat_load_limit,
+                               args.workers)
+    print(f'{"gamma":>8}{"entry v":>10}{"class":>10}{"g max":>8}{"q max":>10}'
+          f'{"Q":>10}{"range":>9}')
+    for summary in summaries:
+        print(f'{summary["gamma"]:8.2f}{summary["entry_vel"]:10.1f}{summary["class"]:>10}'
+              f'{summary["peak_g_load"]:8.2f}{summary["peak_heat_flux"] / 1e6:10.3f}'
+              f'{summary["total_heat_load"] / 1e6:10.1f}{summary["range"] / 1000:9.0f}')
+
+    print('corridor: ' + (f'{safe[0]:.2f} to {safe[1]:.2f} deg' if safe else 'no safe angle')
+          + f', {len(summaries)} entries in {time.perf_counter() - start:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+''' offline renderer of the launch animation
+
+    Renders the MapPlot frames of a finished trajectory on the Agg backend
+    instead of screen recording the interactive window. The frames are split
+    in contiguous ranges over a process pool, each worker owns its own
+    figure: it fills the series up to the start of its range and then
+    renders one PNG per logged state. If ffmpeg is available the PNG
+    sequence is encoded to a video.
+
+    The trajectory is either flown headless from the config file or read
+    from a log file written by OutputLog (rocket_output_log.xlsx).
+
+    usage:
+        python rocket_render.py configs/mintoc_20T.cfg --output frames --workers 4
+        python rocket_render.py configs/mintoc_20T.cfg --log rocket_output_log.xlsx \\
+            --video launch.mp4
+'''
+import argparse
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import matplotlib
+matplotlib.use('Agg')
+from rocket_input import read_rocket_config
+from rocket_output import OutputLog, MapPlot
+
+FRAME_NAME = 'frame_{:06d}.png'
+
+
+def read_states(params, log_file_name=None):
+    ''' logged states of the flight as status dictionaries '''
+    logger = OutputLog()
+    if log_file_name:
+        import pandas as pd
+        log_df = pd.read_excel(log_file_name)
+        logger.rows = list(log_df[OutputLog.COLUMNS].itertuples(index=False, name=None))
+
+    else:
+        from rocket_launch import launch
+        logger = launch(*params, headless=True)
+
+    return list(logger.status_rows())
+
+
+def render_frames(params, states, start, stop, output, dpi):
+    ''' renders the frames start to stop in a figure of this worker '''
+    mapper = MapPlot(*params, interactive=False)
+    for state in states[:start]:
+        mapper.append_state(state)
+
+    for frame in range(start, stop):
+        mapper.update_state(states[frame])
+        mapper.fig.savefig(output / FRAME_NAME.format(frame), dpi=dpi)
+
+    return stop - start
+
+
+def render(params, states, output, workers=None, dpi=100):
+    ''' renders all states as PNG frames in directory output
+        returns the number of frames, the number of workers used, at most
+        one per frame, and the wall time
+    '''
+    output.mkdir(parents=True, exist_ok=True)
+    workers = max(1, min(workers or os.cpu_count(), len(states)))
+    bounds = [len(states) * i // workers for i in range(workers + 1)]
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        frames = sum(executor.map(
+            render_frames,
+            [params] * workers, [states] * workers, bounds[:-1], bounds[1:],
+            [output] * workers, [dpi] * workers,
+        ))
+
+    return frames, workers, time.perf_counter() - start_time
+
+
+def encode_video(output, video_file_name, fps):
+    ''' encodes the PNG frames with ffmpeg, returns False if it is not available '''
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        return False
+
+    subprocess.run(
+        [ffmpeg, '-y', '-loglevel', 'error', '-framerate', str(fps),
+         '-i', str(output / FRAME_NAME.replace('{:06d}', '%06d')),
+         # even frame size for yuv420p
+         '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p',
+         str(video_file_name)],
+        check=True,
+    )
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='offline render of the launch animation')
+    parser.add_argument('config_file_name', type=Path)
+    parser.add_argument('--log', type=Path, help='OutputLog excel file of the flight')
+    parser.add_argument('--output', type=Path, default=Path('frames'))
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--video', type=Path, help='encode the frames to this video file')
+    parser.add_argument('--fps', type=int, default=30)
+    args = parser.parse_args()
+
+    if not args.config_file_name.is_file():
+        print(f'incorrect config file: {args.config_file_name}')
+        exit()
+
+    params = read_rocket_config(args.config_file_name)
+    states = read_states(params, args.log)
+    frames, workers, wall_time = render(params, states, args.output, args.workers, args.dpi)
+    print(f'{frames} frames in {wall_time:.1f} s with {workers} workers: '
+          f'{frames / wall_time:.1f} frames/s')
+
+    if args.video:
+        if encode_video(args.output, args.video, args.fps):
+            print(f'video written to {args.video}')
+
+        else:
+            print(f'ffmpeg not found, frames are in {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+''' sensitivities of the final state of the flight to the vehicle and
+    environment parameters by automatic differentiation
+
+    The gravity turn ODE of rocket_casadi_solution is integrated by CasADi
+    cvodes with the thrust control of the config, piecewise constant on
+    time_interval, and the parameters as symbols. The Jacobian
+    d(final state)/d(parameters) then comes from the sensitivities of cvodes
+    in a single run instead of a sweep of perturbed launches.
+
+    The Jacobian is validated against central finite differences of the
+    same integration, and the timing is compared with the finite difference
+    sweep of launch() runs that perturb one parameter at a time. The ODE of
+    launch() has a constant Isp (Isp0), so its column of Isp1 is zero.
+
+    states: m (kg), v (m/s), q (angle to vertical, rad), h (m), d (range, rad)
+    parameters: m0 (launch mass), Fmax, Isp0, Isp1, cd, A, rho, H
+
+    usage:
+        python rocket_sensitivity.py configs/mintoc_20T.cfg
+'''
+import argparse
+import json
+import time
+from dataclasses import replace
+from pathlib import Path
+import numpy as np
+from rocket_input import read_rocket_config
+from rocket_casadi_solution import gravity_turn_arguments
+
+STATES = ('m', 'v', 'q', 'h', 'd')
+PARAMETERS = {
+    # gravity turn argument: (config parameter group, name)
+    'm0': ('rocket', 'fuel_mass'),
+    'Fmax': ('rocket', 'max_thrust'),
+    'Isp0': ('rocket', 'motor_isp0'),
+    'Isp1': ('rocket', 'motor_isp1'),
+    'cd': ('environment', 'drag_coefficient'),
+    'A': ('rocket', 'rocket_area'),
+    'rho': ('environment', 'density'),
+    'H': ('environment', 'scale_height'),
+}
+TOLERANCE = 1e-9
+
+
+def burn_steps(rocket_params, display_params):
+    ''' control intervals up to the end of the burn, rounded up to the log
+        grid of launch
+    '''
+    burn = np.flatnonzero(np.asarray(rocket_params.thrust_control) > 0)
+    steps = burn[-1] + 1 if len(burn) else display_params.status_update_step
+    return -(-steps // display_params.status_update_step) * display_params.status_update_step
+
+
+def final_state_functions(rocket_params, environment_params, display_params, steps):
+    ''' CasADi functions of the parameter vector to the final state after
+        steps control intervals, and to the final state and its Jacobian
+    '''
+    import casadi as cs
+    from rocket_casadi_solution import gravity_turn_ode
+
+    x = cs.SX.sym('x', len(STATES))
+    u = cs.SX.sym('u')
+    p = cs.SX.sym('p', len(PARAMETERS))
+    values = dict(zip(PARAMETERS, cs.vertsplit(p)))
+    ode = gravity_turn_ode(
+        x, u, environment_params.gravity, environment_params.radius,
+        **{name: values[name] for name in PARAMETERS if name != 'm0'})
+    grid = display_params.time_interval * np.arange(1, steps + 1)
+    integrator = cs.integrator(
+        'I', 'cvodes', {'x': x, 'u': u, 'p': p, 'ode': cs.vertcat(*ode)}, 0.0, grid,
+        {'abstol': TOLERANCE, 'reltol': TOLERANCE})
+
+    P = cs.MX.sym('p', len(PARAMETERS))
+    x0 = cs.vertcat(P[0], rocket_params.vel, rocket_params.beta, rocket_params.alt, 0.0)
+    control = cs.DM(np.asarray(rocket_params.thrust_control[:steps], dtype=float)).T
+    xf = integrator(x0=x0, u=control, p=P)['xf'][:, -1]
+    return (
+        cs.Function('final_state', [P], [xf]),
+        cs.Function('final_state_jacobian', [P], [xf, cs.jacobian(xf, P)]),
+    )
+
+
+def finite_differences(function, values, relative_step):
+    ''' central differences of function(values) to each value '''
+    columns = []
+    for j, value in enumerate(values):
+        step = relative_step * abs(value)
+        plus, minus = values.copy(), values.copy()
+        plus[j] += step
+        minus[j] -= step
+        columns.append((np.asarray(function(plus)) - np.asarray(function(minus))) / (2 * step))
+
+    return np.column_stack(columns)
+
+
+def launch_state(params, steps):
+    ''' final state of a headless launch after steps control intervals '''
+    from rocket_launch import launch
+
+    trajectory = launch(*params, headless=True).as_arrays()
+    row = steps // params[3].status_update_step
+    return np.array([
+        trajectory['m'][row], trajectory['v'][row], np.radians(trajectory['beta'][row]),
+        trajectory['h'][row], np.radians(trajectory['theta'][row]),
+    ])
+
+
+def launch_sweep(params, steps, relative_step):
+    ''' Jacobian of the final state of launch() by central differences, two
+        launches per parameter
+    '''
+    arguments = gravity_turn_arguments(*params[:3])
+    groups = {'rocket': 0, 'environment': 1}
+
+    def perturbed_state(name, step):
+        group, field = PARAMETERS[name]
+        perturbed = list(params)
+        index = groups[group]
+        perturbed[index] = replace(
+            params[index], **{field: getattr(params[index], field) + step})
+        return launch_state(perturbed, steps)
+
+    columns = []
+    for name in PARAMETERS:
+        step = relative_step * abs(arguments[name])
+        columns.append(
+            (perturbed_state(name, step) - perturbed_state(name, -step)) / (2 * step))
+
+    return np.column_stack(columns)
+
+
+def column_errors(jacobian, reference, final_state):
+    ''' relative error per parameter of the Jacobian, the states are scaled
+        by their final value
+    '''
+    scale = 1 / np.maximum(np.abs(final_state), 1.0)[:, None]
+    return (np.linalg.norm(scale * (jacobian - reference), axis=0)
+            / np.maximum(np.linalg.norm(scale * reference, axis=0), 1e-300))
+
+
+def sensitivities(rocket_params, environment_params, model_params, display_params,
+                  steps=None, relative_step=1e-3, sweep=True):
+    ''' Jacobian of the final state to the parameters by AD, validated by
+        finite differences
+        returns:
+            dictionary with the final time and state, the parameter values,
+            the AD and finite difference Jacobians, their relative error per
+            parameter and the timings
+    '''
+    params = (rocket_params, environment_params, model_params, display_params)
+    steps = steps or burn_steps(rocket_params, display_params)
+    arguments = gravity_turn_arguments(rocket_params, environment_params, model_params)
+    values = np.array([arguments[name] for name in PARAMETERS], dtype=float)
+
+    start = time.perf_counter()
+    final_state, final_state_jacobian = final_state_functions(
+        rocket_params, environment_params, display_params, steps)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    state, jacobian = (np.array(result) for result in final_state_jacobian(values))
+    ad_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    jacobian_fd = finite_differences(
+        lambda p: np.array(final_state(p)).ravel(), values, relative_step)
+    fd_time = time.perf_counter() - start
+
+    result = {
+        'final_time': steps * display_params.time_interval,
+        'states': list(STATES),
+        'parameters': dict(zip(PARAMETERS, values.tolist())),
+        'final_state': state.ravel().tolist(),
+        'jacobian': jacobian.tolist(),
+        'jacobian_fd': jacobian_fd.tolist(),
+        'fd_relative_error': dict(zip(
+            PARAMETERS, column_errors(jacobian, jacobian_fd, state.ravel()).tolist())),
+        'timing': {'build': build_time, 'ad': ad_time, 'fd': fd_time},
+    }
+    if sweep:
+        start = time.perf_counter()
+        jacobian_launch = launch_sweep(params, steps, relative_step=1e-3)
+        result['timing']['launch_sweep'] = time.perf_counter() - start
+        result['jacobian_launch'] = jacobian_launch.tolist()
+
+    return result
+
+
+def print_sensitivities(result):
+    parameters = result['parameters']
+    jacobian = np.array(result['jacobian'])
+    print(f'final state at {result["final_time"]:.0f} s, change for +1% of each parameter')
+    print(f'{"":>6}' + ''.join(f'{name:>13}' for name in result['states']))
+    for j, (name, value) in enumerate(parameters.items()):
+        print(f'{name:>6}' + ''.join(f'{0.01 * value * d:13.4g}' for d in jacobian[:, j])
+              + f'   fd error {result["fd_relative_error"][name]:.1e}')
+
+    timing = result['timing']
+    print(f'AD jacobian          : {timing["ad"]:8.3f} s (build {timing["build"]:.3f} s)')
+    print(f'finite differences   : {timing["fd"]:8.3f} s '
+          f'({2 * len(parameters)} integrations)')
+    if 'launch_sweep' in timing:
+        print(f'launch sweep         : {timing["launch_sweep"]:8.3f} s '
+              f'({2 * len(parameters)} launches)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AD sensitivities of the final state')
+    parser.add_argument('config_file_name', type=Path)
+    parser.add_argument('--final-time', type=float,
+                        help='seconds of flight, default the end of the burn')
+    parser.add_argument('--output', type=Path, help='write the result to this JSON file')
+    args = parser.parse_args()
+
+    if not args.config_file_name.is_file():
+        print(f'incorrect config file: {args.config_file_name}')
+        exit()
+
+    params = read_rocket_config(args.config_file_name)
+    steps = (int(round(args.final_time / params[3].time_interval))
+             if args.final_time else None)
+    result = sensitivities(*params, steps=steps)
+    print_sensitivities(result)
+    if args.output:
+        args.output.write_text(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+''' local simulation service for interactive tools
+
+    A long lived HTTP server on localhost that keeps the parsed configs and
+    thrust controls and the built CasADi gravity turn solvers in memory, so a
+    request only pays for the simulation itself:
+        POST /launch    {"config": "configs/mintoc_20T.cfg",
+                         "rocket": {"fuel_mass": 19000}, "control": [...]}
+        POST /optimize  {"config": "configs/mintoc_20T.cfg", "model": {"N": 100}}
+        GET  /stats
+
+    The parameter groups rocket, environment, model and display override the
+    fields of the config, control replaces the thrust control of the config.
+
+    Launch requests run rocket_launch.launch headless, so the trajectory of a
+    request is that of launch. The launches are run one at a time, the vode
+    of older scipy versions keeps its state in Fortran common blocks and
+    cannot integrate two flights at once. A control shorter than the flight
+    is a bad request.
+
+    Responses hold the trajectory (the columns of OutputLog), events and
+    timing: seconds queued behind other launches and seconds of the launch.
+
+    usage:
+        python rocket_server.py --port 8765
+        curl -d '{"config": "configs/mintoc_20T.cfg"}' localhost:8765/launch
+'''
+import argparse
+import json
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from dataclasses import replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import numpy as np
+from rocket_input import read_rocket_config
+from rocket_launch import launch
+
+
+class FlightEvents:
+    ''' events of a launch, called by launch with (time, State) at the start
+        and after every step, it never changes sign, so it does not end the
+        flight
+    '''
+
+    def __init__(self, control):
+        self.control = control
+        self.steps = 0
+        self.cutoff_time = 0.0
+        self.depleted_time = None
+        self.max_alt, self.max_alt_time = -np.inf, 0.0
+        self.time, self.alt = 0.0, 0.0
+
+    def __call__(self, _time, state):
+        if self.steps and self.control[self.steps - 1] > 0:
+            self.cutoff_time = _time
+
+        if state.fuel_mass <= 0 and self.depleted_time is None:
+            self.depleted_time = _time
+
+        if state.alt > self.max_alt:
+            self.max_alt, self.max_alt_time = state.alt, _time
+
+        self.time, self.alt = _time, state.alt
+        self.steps += 1
+        return 1.0
+
+    def as_dict(self, flight_duration):
+        if self.time > flight_duration:
+            end = 'duration'
+
+        elif self.alt <= -100:
+            end = 'impact'
+
+        else:
+            end = 'failed'
+
+        return {
+            'engine_cutoff': {'time': self.cutoff_time},
+            'fuel_depleted': {'time': self.depleted_time},
+            'max_altitude': {'time': self.max_alt_time, 'alt': self.max_alt},
+            'end': {'time': self.time, 'reason': end},
+        }
+
+
+class SimulationService:
+    ''' configs, controls and solvers kept warm between requests '''
+
+    def __init__(self, max_solvers=8):
+        self.max_solvers = max_solvers
+        self.configs = {}
+        self.solvers = OrderedDict()
+        self.launches = 0
+        self.launch_lock = threading.Lock()
+        self.solver_lock = threading.Lock()
+        self.config_lock = threading.Lock()
+
+    def params(self, request):
+        ''' config parameters of the request with its overrides applied '''
+        config_file_name = Path(request['config']).resolve()
+        key = (config_file_name, config_file_name.stat().st_mtime)
+        with self.config_lock:
+            if key not in self.configs:
+                self.configs[key] = read_rocket_config(config_file_name)
+
+            params = self.configs[key]
+
+        params = [
+            replace(group_params, **request.get(group, {}))
+            for group, group_params in zip(('rocket', 'environment', 'model', 'display'),
+                                           params)
+        ]
+        if 'control' in request:
+            params[0] = replace(params[0], thrust_control=np.asarray(request['control']))
+
+        return params
+
+    def launch(self, request):
+        rocket_params, environment_params, model_params, display_params = \
+            self.params(request)
+        steps = round(display_params.flight_duration / display_params.time_interval) + 1
+        if len(rocket_params.thrust_control) < steps:
+            raise ValueError(f'the control has {len(rocket_params.thrust_control)} '
+                             f'values, the flight needs {steps}')
+
+        events = FlightEvents(rocket_params.thrust_control)
+        submitted = time.perf_counter()
+        with self.launch_lock:
+            start = time.perf_counter()
+            trajectory = launch(rocket_params, environment_params, model_params,
+                                display_params, headless=True, events=[events]).as_arrays()
+            self.launches += 1
+            launched = time.perf_counter()
+
+        return {
+            'trajectory': {name: values.tolist() for name, values in trajectory.items()},
+            'events': events.as_dict(display_params.flight_duration),
+            'timing': {'queued': start - submitted, 'launch': launched - start},
+        }
+
+    def optimize(self, request):
+        from rocket_casadi_solution import (
+            build_gravity_turn, gravity_turn_arguments, solve_gravity_turn)
+
+        arguments = gravity_turn_arguments(*self.params(request)[:3])
+        key = tuple(sorted(arguments.items()))
+        with self.solver_lock:
+            start = time.perf_counter()
+            warm = key in self.solvers
+            if warm:
+                self.solvers.move_to_end(key)
+
+            else:
+                self.solvers[key] = build_gravity_turn(**arguments, print_level=0)
+                if len(self.solvers) > self.max_solvers:
+                    self.solvers.popitem(last=False)
+
+            built = time.perf_counter()
+            result = solve_gravity_turn(self.solvers[key])
+            solved = time.perf_counter()
+
+        return {
+            'solution': None if result is None else {
+                name: values.tolist() for name, values in result.items()},
+            'timing': {'warm': warm, 'build': built - start, 'solve': solved - built},
+        }
+
+    def stats(self):
+        return {
+            'configs': len(self.configs),
+            'solvers': len(self.solvers),
+            'launches': self.launches,
+        }
+
+
+class SimulationHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def send_json(self, status, body):
+        data = json.dumps(body, default=float).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self.send_json(200, self.service.stats())
+
+        else:
+            self.send_json(404, {'error': f'unknown path {self.path}'})
+
+    def do_POST(self):
+        endpoints = {'/launch': self.service.launch, '/optimize': self.service.optimize}
+        if self.path not in endpoints:
+            self.send_json(404, {'error': f'unknown path {self.path}'})
+            return
+
+        start = time.perf_counter()
+        try:
+            request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            response = endpoints[self.path](request)
+
+        except (ValueError, KeyError, TypeError, OSError) as error:
+            self.send_json(400, {'error': f'{type(error).__name__}: {error}'})
+            return
+
+        except Exception as error:  # pylint: disable=broad-except
+            self.send_json(500, {'error': f'{type(error).__name__}: {error}'})
+            return
+
+        response['timing']['request'] = time.perf_counter() - start
+        self.send_json(200, response)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+def make_server(host='127.0.0.1', port=8765, **service_options):
+    ''' HTTP server of a SimulationService, port 0 picks a free port '''
+    handler = type('Handler', (SimulationHandler,), {
+        'service': SimulationService(**service_options)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def post(url, payload, timeout=600):
+    ''' JSON request to the server, returns the decoded response '''
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode(),
+        headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='local rocket simulation service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port)
+    print(f'serving on http://{args.host}:{server.server_port}')
+    try:
+        server.serve_forever()
+
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
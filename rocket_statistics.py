@@ -0,0 +1,386 @@
+''' streaming statistics for Monte Carlo dispersion runs of the gravity turn
+
+    Runs are consumed as they finish and only aggregates are kept, in
+    memory bounded by the number of metrics and time bins, not by the
+    number of runs:
+        RunningStats: count, mean, variance (Welford), min and max
+        QuantileSketch: mergeable quantile sketch (merging t-digest)
+        Histogram: counts on fixed bin edges
+        TimeEnvelope: time binned percentile envelopes of vel, alt and beta
+
+    All aggregates merge, so process parallel runs each aggregate their own
+    share of the runs and the partial aggregates are merged at the end.
+
+    usage:
+        python rocket_statistics.py configs/mintoc_20T.cfg --runs 200 --workers 4
+'''
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from pathlib import Path
+import numpy as np
+from rocket_input import read_rocket_config
+
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+METRICS = {
+    # name: (histogram minimum, histogram maximum)
+    'final_alt': (0.0, 2_000_000.0),
+    'final_vel': (0.0, 10_000.0),
+    'final_beta': (0.0, 180.0),
+    'fuel_remaining': (-5_000.0, 20_000.0),
+    'max_q': (0.0, 100_000.0),
+    'insertion_alt_error': (-200_000.0, 200_000.0),
+    'insertion_vel_error': (-2_000.0, 2_000.0),
+    'insertion_beta_error': (-90.0, 90.0),
+}
+ENVELOPE_VARIABLES = {'vel': 'v', 'alt': 'h', 'beta': 'beta'}
+
+# relative standard deviation of the dispersed parameters
+DISPERSIONS = {
+    ('environment', 'drag_coefficient'): 0.05,
+    ('environment', 'density'): 0.05,
+    ('rocket', 'motor_isp0'): 0.01,
+    ('rocket', 'max_thrust'): 0.01,
+    ('rocket', 'dry_mass'): 0.01,
+}
+
+
+class RunningStats:
+    ''' Welford running mean and variance, merged with the Chan et al. formula '''
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def summary(self):
+        ''' None for the statistics of no values, JSON has no infinity '''
+        if self.count == 0:
+            return {'count': 0, 'mean': None, 'std': None, 'min': None, 'max': None}
+
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'std': self.variance ** 0.5,
+            'min': self.min,
+            'max': self.max,
+        }
+
+
+class QuantileSketch:
+    ''' merging t-digest, the number of centroids grows with compression * log(count) '''
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.buffer = []
+
+    def update(self, value):
+        self.buffer.append(value)
+        if len(self.buffer) >= 10 * self.compression:
+            self.compress()
+
+    def update_many(self, values):
+        self.buffer.extend(np.ravel(values).tolist())
+        if len(self.buffer) >= 10 * self.compression:
+            self.compress()
+
+    def merge(self, other):
+        other.compress()
+        self.compress()
+        self.means = np.concatenate((self.means, other.means))
+        self.weights = np.concatenate((self.weights, other.weights))
+        self.compress(force=True)
+
+    def compress(self, force=False):
+        if not self.buffer and not force:
+            return
+
+        means = np.concatenate((self.means, self.buffer))
+        weights = np.concatenate((self.weights, np.ones(len(self.buffer))))
+        self.buffer = []
+        if len(means) == 0:
+            return
+
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+
+        # greedy merge of neighbours while the centroid stays below the
+        # t-digest size limit 4 * total * q * (1 - q) / compression
+        merged_means, merged_weights = [means[0]], [weights[0]]
+        cumulative = 0.0
+        for mean, weight in zip(means[1:].tolist(), weights[1:].tolist()):
+            q = (cumulative + merged_weights[-1] + weight / 2) / total
+            limit = max(1.0, 4 * total * q * (1 - q) / self.compression)
+            if merged_weights[-1] + weight <= limit:
+                new_weight = merged_weights[-1] + weight
+                merged_means[-1] += (mean - merged_means[-1]) * weight / new_weight
+                merged_weights[-1] = new_weight
+
+            else:
+                cumulative += merged_weights[-1]
+                merged_means.append(mean)
+                merged_weights.append(weight)
+
+        self.means = np.array(merged_means)
+        self.weights = np.array(merged_weights)
+
+    @property
+    def count(self):
+        return self.weights.sum() + len(self.buffer)
+
+    def quantile(self, q):
+        self.compress()
+        if len(self.means) == 0:
+            return np.nan
+
+        if len(self.means) == 1:
+            return float(self.means[0])
+
+        # centroid means are placed at the centre of their cumulative weight
+        centres = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * self.weights.sum(), centres, self.means))
+
+
+class Histogram:
+    ''' counts on fixed edges, with under and overflow bins '''
+
+    def __init__(self, minimum, maximum, bins=50):
+        self.edges = np.linspace(minimum, maximum, bins + 1)
+        self.counts = np.zeros(bins + 2, dtype=np.int64)
+
+    def update(self, value):
+        self.counts[np.searchsorted(self.edges, value, side='right')] += 1
+
+    def merge(self, other):
+        self.counts += other.counts
+
+    def summary(self):
+        return {
+            'edges': self.edges.tolist(),
+            'counts': self.counts[1:-1].tolist(),
+            'underflow': int(self.counts[0]),
+            'overflow': int(self.counts[-1]),
+        }
+
+
+class TimeEnvelope:
+    ''' quantile sketches of the trajectory variables per time bin '''
+
+    def __init__(self, duration, bins=100, compression=50):
+        self.edges = np.linspace(0, duration, bins + 1)
+        self.sketches = {
+            variable: [QuantileSketch(compression) for _ in range(bins)]
+            for variable in ENVELOPE_VARIABLES
+        }
+
+    def update(self, trajectory):
+        bins = np.searchsorted(self.edges, trajectory['t'], side='right') - 1
+        valid = (bins >= 0) & (bins < len(self.edges) - 1)
+        for variable, column in ENVELOPE_VARIABLES.items():
+            values = trajectory[column][valid]
+            for time_bin in np.unique(bins[valid]):
+                self.sketches[variable][time_bin].update_many(
+                    values[bins[valid] == time_bin])
+
+    def merge(self, other):
+        for variable, sketches in self.sketches.items():
+            for sketch, other_sketch in zip(sketches, other.sketches[variable]):
+                sketch.merge(other_sketch)
+
+    def percentiles(self, variable, quantiles=QUANTILES):
+        ''' array (time bins, quantiles), nan for bins without data '''
+        return np.array([[sketch.quantile(q) for q in quantiles]
+                         for sketch in self.sketches[variable]])
+
+    def summary(self, quantiles=QUANTILES):
+        return {
+            'time': ((self.edges[:-1] + self.edges[1:]) / 2).tolist(),
+            'quantiles': list(quantiles),
+            **{variable: np.where(np.isnan(envelope := self.percentiles(variable)),
+                                  None, envelope).tolist()
+               for variable in ENVELOPE_VARIABLES},
+        }
+
+
+class DispersionAggregator:
+    ''' aggregates the metrics and envelopes of the runs of a campaign '''
+
+    def __init__(self, duration, time_bins=100):
+        self.runs = 0
+        self.stats = {name: RunningStats() for name in METRICS}
+        self.sketches = {name: QuantileSketch() for name in METRICS}
+        self.histograms = {name: Histogram(*limits) for name, limits in METRICS.items()}
+        self.envelope = TimeEnvelope(duration, time_bins)
+
+    def add_event(self, name, value):
+        self.stats[name].update(value)
+        self.sketches[name].update(value)
+        self.histograms[name].update(value)
+
+    def add_run(self, trajectory, rocket_params, environment_params, model_params):
+        ''' adds the metrics of a run, trajectory is a dictionary of arrays as
+            returned by OutputLog.as_arrays
+        '''
+        self.runs += 1
+        for name, value in run_metrics(
+                trajectory, rocket_params, environment_params, model_params).items():
+            self.add_event(name, value)
+
+        self.envelope.update(trajectory)
+
+    def merge(self, other):
+        self.runs += other.runs
+        for name in METRICS:
+            self.stats[name].merge(other.stats[name])
+            self.sketches[name].merge(other.sketches[name])
+            self.histograms[name].merge(other.histograms[name])
+
+        self.envelope.merge(other.envelope)
+
+    def summary(self):
+        return {
+            'runs': self.runs,
+            'metrics': {
+                name: {
+                    **self.stats[name].summary(),
+                    'quantiles': {str(q): None if np.isnan(value := self.sketches[name].quantile(q))
+                                  else value for q in QUANTILES},
+                    'histogram': self.histograms[name].summary(),
+                }
+                for name in METRICS
+            },
+            'envelope': self.envelope.summary(),
+        }
+
+
+def run_metrics(trajectory, rocket_params, environment_params, model_params):
+    ''' final state, fuel remaining, max-Q and the errors at orbit insertion,
+        the end of the last thrust phase, against the model objectives
+    '''
+    alt, vel, beta = trajectory['h'], trajectory['v'], trajectory['beta']
+    density = environment_params.density * np.exp(-alt / environment_params.scale_height)
+    thrusting = np.flatnonzero(trajectory['u'] > 0)
+    insertion = min(thrusting[-1] + 1, len(alt) - 1) if len(thrusting) else -1
+    return {
+        'final_alt': alt[-1],
+        'final_vel': vel[-1],
+        'final_beta': beta[-1],
+        'fuel_remaining': trajectory['m'][-1] - rocket_params.dry_mass,
+        'max_q': np.max(0.5 * density * vel * vel),
+        'insertion_alt_error': alt[insertion] - model_params.h_obj,
+        'insertion_vel_error': vel[insertion] - model_params.v_obj,
+        'insertion_beta_error': beta[insertion] - model_params.q_obj,
+    }
+
+
+def disperse(rocket_params, environment_params, rng, dispersions=DISPERSIONS):
+    ''' parameters with gaussian relative dispersions applied '''
+    rocket = {}
+    environment = {}
+    for (group, name), sigma in dispersions.items():
+        params, changes = ((rocket_params, rocket) if group == 'rocket'
+                           else (environment_params, environment))
+        changes[name] = getattr(params, name) * (1 + sigma * rng.standard_normal())
+
+    return replace(rocket_params, **rocket), replace(environment_params, **environment)
+
+
+def run_campaign_share(params, seeds, time_bins):
+    ''' runs the dispersed launches of seeds, returns the partial aggregate '''
+    from rocket_launch import launch
+
+    rocket_params, environment_params, model_params, display_params = params
+    aggregator = DispersionAggregator(display_params.flight_duration, time_bins)
+    for seed in seeds:
+        rocket, environment = disperse(
+            rocket_params, environment_params, np.random.default_rng(seed))
+        trajectory = launch(
+            rocket, environment, model_params, display_params, headless=True
+        ).as_arrays()
+        aggregator.add_run(trajectory, rocket, environment, model_params)
+
+    return aggregator
+
+
+def run_campaign(params, runs, workers=1, seed=0, time_bins=100):
+    ''' Monte Carlo campaign of runs dispersed launches over workers processes '''
+    seeds = np.random.SeedSequence(seed).generate_state(runs).tolist()
+    shares = [seeds[i::workers] for i in range(workers)]
+    aggregator = DispersionAggregator(params[3].flight_duration, time_bins)
+    if workers == 1:
+        aggregator.merge(run_campaign_share(params, seeds, time_bins))
+
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for partial in executor.map(run_campaign_share, [params] * workers,
+                                        shares, [time_bins] * workers):
+                aggregator.merge(partial)
+
+    return aggregator
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Monte Carlo dispersion campaign')
+    parser.add_argument('config_file_name', type=Path)
+    parser.add_argument('--runs', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--time-bins', type=int, default=100)
+    parser.add_argument('--output', type=Path, default=Path('dispersion_summary.json'))
+    args = parser.parse_args()
+
+    if not args.config_file_name.is_file():
+        print(f'incorrect config file: {args.config_file_name}')
+        exit()
+
+    start = time.perf_counter()
+    aggregator = run_campaign(read_rocket_config(args.config_file_name),
+                              args.runs, args.workers, args.seed, args.time_bins)
+    summary = aggregator.summary()
+    args.output.write_text(json.dumps(summary, indent=2))
+
+    print(f'{summary["runs"]} runs in {time.perf_counter() - start:.1f} s')
+    print(f'{"metric":<22} {"mean":>12} {"std":>12} {"p5":>12} {"p50":>12} {"p95":>12}')
+    for name, metric in summary['metrics'].items():
+        quantiles = metric['quantiles']
+        values = (metric['mean'], metric['std'],
+                  quantiles['0.05'], quantiles['0.5'], quantiles['0.95'])
+        print(f'{name:<22} ' + ' '.join(
+            f'{"n/a":>12}' if value is None else f'{value:12.2f}' for value in values))
+
+    print(f'summary written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+''' trajectory store for many launch runs
+
+    The logged columns of the runs (t, m, v, beta, h, theta, u) are appended
+    to chunked raw float64 files, one file per column and chunk, and a run
+    never spans two chunks. An index file holds a fixed size record per run
+    with its chunk, offset and length and the run parameters, so queries on
+    the parameters only read the index and the trajectories of the selected
+    runs are zero-copy slices of memory-mapped chunks.
+
+    directory layout:
+        store.json                  columns, parameter fields and chunk size
+        index.bin                   index records (INDEX_DTYPE)
+        chunk_000000/t.f64 ...      column data of chunk 0
+
+    usage:
+        store = TrajectoryStore('trajectories')
+        store.append_run(trajectory, *params)
+        run_ids = store.query(fuel_mass=(18e3, 22e3))
+        trajectory = store.load(run_ids[0])
+
+        python rocket_store.py add trajectories configs/mintoc_20T.cfg
+        python rocket_store.py query trajectories fuel_mass=18e3:22e3
+'''
+import sys
+import json
+from pathlib import Path
+import numpy as np
+
+COLUMNS = ('t', 'm', 'v', 'beta', 'h', 'theta', 'u')
+PARAMS = {
+    # index field: (config parameter group, name)
+    'dry_mass': ('rocket', 'dry_mass'),
+    'fuel_mass': ('rocket', 'fuel_mass'),
+    'motor_isp0': ('rocket', 'motor_isp0'),
+    'motor_isp1': ('rocket', 'motor_isp1'),
+    'max_thrust': ('rocket', 'max_thrust'),
+    'rocket_area': ('rocket', 'rocket_area'),
+    'beta0': ('rocket', 'beta'),
+    'gravity': ('environment', 'gravity'),
+    'radius': ('environment', 'radius'),
+    'drag_coefficient': ('environment', 'drag_coefficient'),
+    'scale_height': ('environment', 'scale_height'),
+    'density': ('environment', 'density'),
+    'h_obj': ('model', 'h_obj'),
+    'v_obj': ('model', 'v_obj'),
+    'q_obj': ('model', 'q_obj'),
+    'time_interval': ('display', 'time_interval'),
+    'flight_duration': ('display', 'flight_duration'),
+}
+INDEX_DTYPE = np.dtype(
+    [('run_id', '<i8'), ('chunk', '<i8'), ('offset', '<i8'), ('length', '<i8')]
+    + [(name, '<f8') for name in PARAMS]
+)
+CHUNK_ROWS = 1_000_000
+
+
+class TrajectoryStore:
+
+    def __init__(self, directory, chunk_rows=CHUNK_ROWS):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        meta_file = self.directory / 'store.json'
+        if meta_file.is_file():
+            meta = json.loads(meta_file.read_text())
+            if meta['columns'] != list(COLUMNS) or meta['params'] != list(PARAMS):
+                raise ValueError(f'{self.directory} has a different store layout')
+
+            self.chunk_rows = meta['chunk_rows']
+
+        else:
+            self.chunk_rows = chunk_rows
+            meta_file.write_text(json.dumps({
+                'columns': list(COLUMNS),
+                'params': list(PARAMS),
+                'chunk_rows': chunk_rows,
+            }, indent=2))
+
+        self.index_file = self.directory / 'index.bin'
+        self.index_file.touch()
+        self._chunks = {}
+
+    def __len__(self):
+        return self.index_file.stat().st_size // INDEX_DTYPE.itemsize
+
+    @property
+    def index(self):
+        ''' memory-mapped index records '''
+        if len(self) == 0:
+            return np.empty(0, dtype=INDEX_DTYPE)
+
+        return np.memmap(self.index_file, dtype=INDEX_DTYPE, mode='r')
+
+    def chunk_directory(self, chunk):
+        return self.directory / f'chunk_{chunk:06d}'
+
+    def append(self, trajectory, params):
+        ''' appends a run
+            arguments:
+                trajectory: dictionary of column arrays of equal length
+                params: dictionary with the PARAMS fields of the run
+            returns:
+                run_id
+        '''
+        length = len(trajectory[COLUMNS[0]])
+        index = self.index
+        if len(index):
+            last = index[-1]
+            chunk, offset = int(last['chunk']), int(last['offset'] + last['length'])
+            if offset > 0 and offset + length > self.chunk_rows:
+                chunk, offset = chunk + 1, 0
+
+        else:
+            chunk, offset = 0, 0
+
+        chunk_directory = self.chunk_directory(chunk)
+        chunk_directory.mkdir(exist_ok=True)
+        # the column data of a run that crashed before its index record was
+        # written is cut off, so the run is stored at its indexed offset
+        self._chunks.pop(chunk, None)
+        for column in COLUMNS:
+            with open(chunk_directory / f'{column}.f64', mode='ab') as column_file:
+                column_file.truncate(offset * 8)
+                column_file.write(
+                    np.ascontiguousarray(trajectory[column], dtype='<f8').tobytes())
+
+        record = np.zeros(1, dtype=INDEX_DTYPE)
+        record['run_id'] = len(index)
+        record['chunk'] = chunk
+        record['offset'] = offset
+        record['length'] = length
+        for name in PARAMS:
+            record[name] = params[name]
+
+        # the index record is written last, so a run is only visible when all
+        # its column data is stored
+        with open(self.index_file, mode='ab') as index_file:
+            index_file.write(record.tobytes())
+
+        return len(index)
+
+    def append_run(self, trajectory, rocket_params, environment_params, model_params,
+                   display_params):
+        groups = {
+            'rocket': rocket_params,
+            'environment': environment_params,
+            'model': model_params,
+            'display': display_params,
+        }
+        return self.append(trajectory, {
+            name: getattr(groups[group], field) for name, (group, field) in PARAMS.items()
+        })
+
+    def query(self, **ranges):
+        ''' run ids of the runs with parameters within the inclusive ranges,
+            e.g. query(fuel_mass=(18e3, 22e3), drag_coefficient=(0.7, 0.8))
+        '''
+        index = self.index
+        selected = np.ones(len(index), dtype=bool)
+        for name, (minimum, maximum) in ranges.items():
+            if name not in PARAMS:
+                raise KeyError(f'{name} is not an index parameter, use one of {list(PARAMS)}')
+
+            selected &= (index[name] >= minimum) & (index[name] <= maximum)
+
+        return np.asarray(index['run_id'][selected])
+
+    def column_map(self, chunk, column, rows):
+        ''' memory map of a column of a chunk with at least rows rows '''
+        maps = self._chunks.setdefault(chunk, {})
+        if column not in maps or len(maps[column]) < rows:
+            maps[column] = np.memmap(
+                self.chunk_directory(chunk) / f'{column}.f64', dtype='<f8', mode='r')
+
+        return maps[column]
+
+    def load(self, run_id, columns=COLUMNS):
+        ''' trajectory of a run as dictionary of read only views on the chunks '''
+        record = self.index[run_id]
+        chunk, offset, length = int(record['chunk']), int(record['offset']), int(record['length'])
+        return {
+            column: self.column_map(chunk, column, offset + length)[offset:offset + length]
+            for column in columns
+        }
+
+    def params(self, run_id):
+        record = self.index[run_id]
+        return {name: float(record[name]) for name in PARAMS}
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ('add', 'query'):
+        print('usage:\n'
+              '    python rocket_store.py add <store> <config file> ...\n'
+              '    python rocket_store.py query <store> [name=min:max ...]')
+        exit()
+
+    store = TrajectoryStore(sys.argv[2])
+    if sys.argv[1] == 'add':
+        from rocket_input import read_rocket_config
+        from rocket_launch import launch
+
+        for config_file_name in sys.argv[3:]:
+            params = read_rocket_config(config_file_name)
+            run_id = store.append_run(launch(*params, headless=True).as_arrays(), *params)
+            print(f'{config_file_name}: run {run_id}')
+
+    else:
+        ranges = {}
+        for condition in sys.argv[3:]:
+            name, limits = condition.split('=')
+            minimum, maximum = limits.split(':')
+            ranges[name] = (float(minimum), float(maximum))
+
+        for run_id in store.query(**ranges):
+            trajectory = store.load(run_id, columns=('t', 'h', 'v'))
+            print(f'run {run_id}: {len(trajectory["t"])} rows, '
+                  f'final alt {trajectory["h"][-1]:,.0f} m, '
+                  f'final vel {trajectory["v"][-1]:,.0f} m/s, {store.params(run_id)}')
+
+
+if __name__ == '__main__':
+    main()
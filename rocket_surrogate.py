@@ -0,0 +1,321 @@
+''' surrogate table of gravity turn solutions for new vehicles
+
+    The builder solves the gravity turn NLP over a grid of normalized
+    parameters of a base config and stores the controls of the shooting
+    intervals and the normalized time horizon of each solution:
+        twr: thrust to weight ratio at launch, Fmax / (m0 g0)
+        mass_ratio: launch mass over dry mass, m0 / m1
+        isp: specific impulse at zero altitude (s), Isp1 / Isp0 of the base
+        drag_loading: cd A rho H / m0
+        h_obj: target altitude over the body radius, h_obj / r0
+        v_obj: target velocity over sqrt(g0 r0)
+    The time horizon is stored over sqrt(r0 / g0). g0, r0, cd, rho, H and
+    q_obj are those of the base config.
+
+    A query computes the normalized parameters of a vehicle and interpolates
+    the control profile multilinear between the grid points, grid points
+    where the solver did not converge are left out. The profile is used as
+    control of launch or as IPOPT warm start of a full solve.
+
+    table file (npz): axis values per axis, controls (grid shape x N,
+    float32), horizon (grid shape) and converged (grid shape)
+
+    usage:
+        python rocket_surrogate.py build table.npz configs/mintoc_20T.cfg --N 30 \\
+            --twr 2,2.8,3.6 --mass-ratio 8,11,14 --workers 4
+        python rocket_surrogate.py query table.npz configs/mintoc_20T.cfg --validate
+'''
+import argparse
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from math import sqrt
+from pathlib import Path
+import numpy as np
+from rocket_input import read_rocket_config, resample_control, write_solution
+from rocket_casadi_solution import gravity_turn_arguments
+
+AXES = ('twr', 'mass_ratio', 'isp', 'drag_loading', 'h_obj', 'v_obj')
+SUCCESS = {'Solve_Succeeded', 'Solved_To_Acceptable_Level'}
+
+
+def normalize(arguments):
+    ''' normalized parameters of compute_gravity_turn arguments '''
+    m0, g0, r0 = arguments['m0'], arguments['g0'], arguments['r0']
+    return {
+        'twr': arguments['Fmax'] / (m0 * g0),
+        'mass_ratio': m0 / arguments['m1'],
+        'isp': arguments['Isp0'],
+        'drag_loading': arguments['cd'] * arguments['A'] * arguments['rho'] * arguments['H'] / m0,
+        'h_obj': arguments['h_obj'] / r0,
+        'v_obj': arguments['v_obj'] / sqrt(g0 * r0),
+    }
+
+
+def denormalize(point, base_arguments):
+    ''' compute_gravity_turn arguments of a normalized point on the base '''
+    arguments = dict(base_arguments)
+    g0, r0 = arguments['g0'], arguments['r0']
+    m0 = arguments['m1'] * point['mass_ratio']
+    arguments.update({
+        'm0': m0,
+        'Fmax': point['twr'] * m0 * g0,
+        'Isp0': point['isp'],
+        'Isp1': point['isp'] * base_arguments['Isp1'] / base_arguments['Isp0'],
+        'A': point['drag_loading'] * m0 / (arguments['cd'] * arguments['rho'] * arguments['H']),
+        'h_obj': point['h_obj'] * r0,
+        'v_obj': point['v_obj'] * sqrt(g0 * r0),
+    })
+    return arguments
+
+
+def time_scale(arguments):
+    return sqrt(arguments['r0'] / arguments['g0'])
+
+
+def solve_point(arguments):
+    ''' solves the NLP, returns the controls, horizon (s), converged flag and
+        the number of iterations
+    '''
+    from rocket_casadi_solution import build_gravity_turn
+
+    problem = build_gravity_turn(**arguments, print_level=0)
+    solver = problem['solver']
+    result = solver(x0=problem['x0'], lbx=problem['lbx'], ubx=problem['ubx'],
+                    lbg=problem['lbg'], ubg=problem['ubg'])
+    stats = solver.stats()
+    x = np.array(result['x']).ravel()
+    npars, nx, ns = problem['npars'], problem['nx'], problem['ns']
+    return (x[npars + nx::ns], x[0], stats['return_status'] in SUCCESS,
+            stats['iter_count'])
+
+
+def build_table(base_arguments, axes, workers=1):
+    ''' solves the grid of the axes, a dictionary of axis values per name
+        returns the SurrogateTable
+    '''
+    axes = {name: np.asarray(axes[name], dtype=float) for name in AXES}
+    shape = tuple(len(values) for values in axes.values())
+    points = [dict(zip(AXES, values)) for values in itertools.product(*axes.values())]
+    arguments = [denormalize(point, base_arguments) for point in points]
+    N = base_arguments['N']
+    controls = np.full((len(points), N), np.nan, dtype=np.float32)
+    horizon = np.full(len(points), np.nan)
+    converged = np.zeros(len(points), dtype=bool)
+    with ProcessPoolExecutor(max_workers=workers) if workers > 1 else nullcontext() as executor:
+        solutions = (executor.map if executor else map)(solve_point, arguments)
+        for i, (control, T, success, _) in enumerate(solutions):
+            if success:
+                controls[i] = control
+                horizon[i] = T / time_scale(arguments[i])
+                converged[i] = True
+
+    return SurrogateTable(axes, controls.reshape(shape + (N,)), horizon.reshape(shape),
+                          converged.reshape(shape))
+
+
+class SurrogateTable:
+
+    def __init__(self, axes, controls, horizon, converged):
+        self.axes = {name: np.asarray(axes[name], dtype=float) for name in AXES}
+        self.controls = controls
+        self.horizon = horizon
+        self.converged = converged
+
+    @property
+    def N(self):
+        return self.controls.shape[-1]
+
+    def save(self, file_name):
+        np.savez_compressed(
+            file_name, controls=self.controls, horizon=self.horizon,
+            converged=self.converged,
+            **{f'axis_{name}': values for name, values in self.axes.items()})
+
+    @classmethod
+    def load(cls, file_name):
+        with np.load(file_name) as table_file:
+            return cls({name: table_file[f'axis_{name}'] for name in AXES},
+                       table_file['controls'], table_file['horizon'],
+                       table_file['converged'])
+
+    def interpolate(self, point):
+        ''' multilinear interpolation of the controls and normalized horizon
+            at a normalized point, coordinates outside the grid are clipped
+        '''
+        corners = []
+        for name in AXES:
+            values = self.axes[name]
+            coordinate = np.clip(point[name], values[0], values[-1])
+            upper = min(int(np.searchsorted(values, coordinate, side='right')),
+                        len(values) - 1)
+            lower = max(upper - 1, 0)
+            if upper == lower:
+                corners.append(((lower, 1.0),))
+
+            else:
+                weight = (coordinate - values[lower]) / (values[upper] - values[lower])
+                corners.append(((lower, 1 - weight), (upper, weight)))
+
+        control = np.zeros(self.N)
+        horizon = 0.0
+        total = 0.0
+        for corner in itertools.product(*corners):
+            index = tuple(i for i, _ in corner)
+            weight = np.prod([w for _, w in corner])
+            if weight == 0 or not self.converged[index]:
+                continue
+
+            control += weight * self.controls[index]
+            horizon += weight * self.horizon[index]
+            total += weight
+
+        if total == 0:
+            raise ValueError('no converged solution around the point in the table')
+
+        return control / total, horizon / total
+
+    def query(self, rocket_params, environment_params, model_params):
+        ''' control profile of the vehicle in the format of solve_gravity_turn,
+            time (N + 1) and control (N + 1, the last control is zero)
+        '''
+        arguments = gravity_turn_arguments(rocket_params, environment_params, model_params)
+        control, horizon = self.interpolate(normalize(arguments))
+        T = horizon * time_scale(arguments)
+        return {
+            'time': np.linspace(0, T, self.N + 1),
+            'control': np.concatenate((control, [0.0])),
+        }
+
+
+def control_array(profile, display_params):
+    ''' thrust control of launch from a profile '''
+    return resample_control(profile['time'], profile['control'],
+                            display_params.time_interval, display_params.flight_duration)
+
+
+def warm_start(problem, profile):
+    ''' initial guess of a problem of build_gravity_turn with the horizon
+        and controls of a profile, the states keep their linear guess
+    '''
+    N, npars, nx, ns = problem['N'], problem['npars'], problem['nx'], problem['ns']
+    T = profile['time'][-1]
+    # piecewise constant controls resampled to the intervals of the problem
+    intervals = len(profile['control']) - 1
+    midpoints = (np.arange(N) + 0.5) / N
+    x0 = list(problem['x0'])
+    x0[0] = T
+    x0[npars + nx::ns] = profile['control'][(midpoints * intervals).astype(int)].tolist()
+    return x0
+
+
+def validate(table, rocket_params, environment_params, model_params):
+    ''' interpolation error of the table against a full solve and the
+        iterations of the full solve with and without the table warm start
+    '''
+    from rocket_casadi_solution import build_gravity_turn
+
+    arguments = gravity_turn_arguments(rocket_params, environment_params, model_params)
+    arguments['N'] = table.N
+    start = time.perf_counter()
+    profile = table.query(rocket_params, environment_params, model_params)
+    query_time = time.perf_counter() - start
+
+    problem = build_gravity_turn(**arguments, print_level=0)
+    solver = problem['solver']
+    runs = {}
+    for name, x0 in (('cold', problem['x0']), ('warm', warm_start(problem, profile))):
+        start = time.perf_counter()
+        result = solver(x0=x0, lbx=problem['lbx'], ubx=problem['ubx'],
+                        lbg=problem['lbg'], ubg=problem['ubg'])
+        stats = solver.stats()
+        runs[name] = {
+            'seconds': time.perf_counter() - start,
+            'iterations': stats['iter_count'],
+            'status': stats['return_status'],
+        }
+        x = np.array(result['x']).ravel()
+        runs[name]['T'] = float(x[0])
+        runs[name]['control'] = x[problem['npars'] + problem['nx']::problem['ns']]
+
+    reference = runs['cold']
+    return {
+        'query_seconds': query_time,
+        'control_rms_error': float(np.sqrt(np.mean(
+            (profile['control'][:-1] - reference['control']) ** 2))),
+        'control_max_error': float(np.max(np.abs(
+            profile['control'][:-1] - reference['control']))),
+        'horizon_relative_error': float(profile['time'][-1] / reference['T'] - 1),
+        'solves': {name: {key: value for key, value in run.items() if key != 'control'}
+                   for name, run in runs.items()},
+    }
+
+
+def parse_values(text):
+    ''' sorted grid values, interpolate needs increasing values of each axis '''
+    values = sorted(float(value) for value in text.split(','))
+    if len(set(values)) < len(values):
+        raise argparse.ArgumentTypeError(f'repeated grid values in {text}')
+
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description='surrogate table of gravity turn solutions')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='solve the grid and write the table')
+    build_parser.add_argument('table_file_name', type=Path)
+    build_parser.add_argument('config_file_name', type=Path, help='base config')
+    build_parser.add_argument('--N', type=int, default=30, help='shooting intervals')
+    build_parser.add_argument('--workers', type=int, default=1)
+    for name in AXES:
+        build_parser.add_argument(f'--{name.replace("_", "-")}', type=parse_values,
+                                  help='comma separated values, default the base config')
+
+    query_parser = subparsers.add_parser('query', help='control profile of a config')
+    query_parser.add_argument('table_file_name', type=Path)
+    query_parser.add_argument('config_file_name', type=Path)
+    query_parser.add_argument('--validate', action='store_true',
+                              help='compare with a full solve and a warm started solve')
+    query_parser.add_argument('--output', type=Path,
+                              help='write the profile as control file (.xlsx or .npz)')
+    args = parser.parse_args()
+
+    if not args.config_file_name.is_file():
+        print(f'incorrect config file: {args.config_file_name}')
+        exit()
+
+    params = read_rocket_config(args.config_file_name)
+    if args.command == 'build':
+        base_arguments = gravity_turn_arguments(*params[:3])
+        base_arguments['N'] = args.N
+        base_point = normalize(base_arguments)
+        axes = {name: getattr(args, name) or [base_point[name]] for name in AXES}
+        start = time.perf_counter()
+        table = build_table(base_arguments, axes, args.workers)
+        table.save(args.table_file_name)
+        print(f'{table.converged.sum()} of {table.converged.size} grid points converged '
+              f'in {time.perf_counter() - start:.1f} s')
+        return
+
+    table = SurrogateTable.load(args.table_file_name)
+    start = time.perf_counter()
+    profile = table.query(*params[:3])
+    print(f'profile in {1000 * (time.perf_counter() - start):.2f} ms, '
+          f'horizon {profile["time"][-1]:.1f} s')
+    if args.output:
+        write_solution(args.output, profile, {'T': profile['time'][-1], 'status': 'surrogate'})
+
+    if args.validate:
+        report = validate(table, *params[:3])
+        print(f'control error rms {report["control_rms_error"]:.4f}, '
+              f'max {report["control_max_error"]:.4f}, '
+              f'horizon error {100 * report["horizon_relative_error"]:.2f}%')
+        for name, solve in report['solves'].items():
+            print(f'{name} solve: {solve["iterations"]} iterations, '
+                  f'{solve["seconds"]:.1f} s, {solve["status"]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+''' targeting of open loop launch parameters by shooting
+
+    A shot is a headless launch (rocket_launch.launch) from an initial
+    flight angle beta with the thrust control of the config scaled by a
+    throttle factor, limited to full throttle and to the fuel on board. The
+    launch ends at the first terminal event: the flight turns horizontal
+    (q_obj) or crashes, so a shot rarely integrates up to flight_duration;
+    the state at the event is interpolated between the two steps around
+    it. The miss of a shot is its altitude and velocity at the end minus
+    h_obj and v_obj.
+
+    The unknown, beta or scale, is solved for a zero altitude miss, the
+    other keeps the value of the config (scale 1):
+        brent: Brent's method on log beta or scale, the bracket is the first
+            sign change among candidate points that are flown concurrently
+        secant: secant method from the value of the config, sequential
+
+    The shots restart the integrator of launch at each time interval: with
+    steps across the throttle changes the altitude miss jumps by up to
+    kilometers between nearby values of beta or scale, so a bracket could
+    converge on a jump and not on a zero miss. RocketPhysics takes the fuel
+    mass of its previous call, which depends on the steps of the integrator,
+    so jumps of tens of meters remain. The miss of the result is reported.
+
+    usage:
+        python rocket_targeting.py configs/mintoc_20T.cfg --target beta --workers 4 --verify
+        python rocket_targeting.py configs/mintoc_20T.cfg --target scale --method secant
+'''
+import argparse
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from dataclasses import replace
+from functools import partial
+from pathlib import Path
+import numpy as np
+from rocket_input import read_rocket_config
+
+TARGETS = ('beta', 'scale')
+METHODS = ('brent', 'secant')
+# candidate range around the config value: factors of beta, scale values
+BRACKETS = {'beta': (0.25, 4.0), 'scale': (0.8, 1.2)}
+CANDIDATES = 8
+
+
+def scaled_control(rocket_params, environment_params, time_interval, scale=1.0):
+    ''' thrust control of the config times scale, limited to full throttle and
+        cut when the fuel is spent
+    '''
+    control = np.clip(scale * np.asarray(rocket_params.thrust_control, dtype=float), 0.0, 1.0)
+    fuel_flow = rocket_params.max_thrust / (rocket_params.motor_isp0 * environment_params.gravity)
+    fuel_left = rocket_params.fuel_mass - fuel_flow * time_interval * np.cumsum(control)
+    spent = np.flatnonzero(fuel_left < 0)
+    if len(spent):
+        control[spent[0]] += fuel_left[spent[0]] / (fuel_flow * time_interval)
+        control[spent[0] + 1:] = 0.0
+
+    return control
+
+
+class Crossing:
+    ''' terminal event of launch when a state variable crosses a value, it
+        keeps the time, state values and event value of its last two calls
+    '''
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+        self.calls = deque(maxlen=2)
+
+    def __call__(self, t, state):
+        value = getattr(state, self.name) - self.value
+        self.calls.append((t, tuple(vars(state).values()), value))
+        return value
+
+    @property
+    def crossed(self):
+        return len(self.calls) == 2 and np.sign(self.calls[0][2]) != np.sign(self.calls[1][2])
+
+    def crossing(self):
+        ''' time and state at the crossing, linear between the last two calls '''
+        (t0, y0, value0), (t1, y1, value1) = self.calls
+        y0, y1 = np.array(y0), np.array(y1)
+        fraction = value0 / (value0 - value1)
+        return t0 + fraction * (t1 - t0), y0 + fraction * (y1 - y0)
+
+
+def shoot(rocket_params, environment_params, model_params, display_params, beta, scale=1.0):
+    ''' headless launch of one shot up to its first terminal event
+        returns a dictionary of the outcome (horizontal, crash or end), the
+        final time and state and the miss
+    '''
+    from rocket_launch import launch
+
+    horizontal = Crossing('beta', model_params.q_obj / 180 * np.pi)
+    crash = Crossing('alt', -1.0)
+    control = scaled_control(rocket_params, environment_params,
+                             display_params.time_interval, scale)
+    launch(replace(rocket_params, beta=beta, thrust_control=control),
+           environment_params, model_params, display_params,
+           headless=True, events=[horizontal, crash], log=False, restart=True)
+    for outcome, event in (('horizontal', horizontal), ('crash', crash)):
+        if event.crossed:
+            final_time, y = event.crossing()
+            break
+
+    else:
+        outcome = 'end'
+        final_time, y, _ = horizontal.calls[-1]
+
+    vel, beta_end, alt, theta, fuel_mass = (float(value) for value in y)
+    return {
+        'outcome': outcome, 'time': float(final_time), 'vel': vel, 'beta': beta_end,
+        'alt': alt, 'theta': theta, 'fuel_mass': fuel_mass,
+        'miss_alt': alt - model_params.h_obj, 'miss_vel': vel - model_params.v_obj,
+    }
+
+
+def shoot_point(rocket_params, environment_params, model_params, display_params, point):
+    ''' shot of a (beta, scale) point '''
+    return shoot(rocket_params, environment_params, model_params, display_params, *point)
+
+
+def target(params, unknown='beta', method='brent', bracket=None, candidates=CANDIDATES,
+           workers=1, xtol=1e-9):
+    ''' the unknown (beta or scale) that zeroes the altitude miss, from the
+        values of the config; the candidate points of Brent's method are
+        flown in worker processes if workers > 1
+        returns the beta, the scale, the final shot, the number of
+        simulations and the wall time
+    '''
+    from scipy.optimize import brentq, newton
+
+    start = time.perf_counter()
+    rocket_params, environment_params, model_params, display_params = params
+    fly = partial(shoot_point, rocket_params, environment_params, model_params,
+                  display_params)
+    beta, scale = rocket_params.beta, 1.0
+    if unknown == 'beta':
+        low, high = bracket or (BRACKETS['beta'][0] * beta, BRACKETS['beta'][1] * beta)
+        values = np.geomspace(low, high, candidates)
+        # the root is searched on log beta, the altitude miss is closer to linear
+        to_point = lambda x: (np.exp(x), scale)
+        to_x = np.log
+
+    else:
+        low, high = bracket or BRACKETS['scale']
+        values = np.linspace(low, high, candidates)
+        to_point = lambda x: (beta, x)
+        to_x = lambda x: x
+
+    miss = lambda x: fly(to_point(x))['miss_alt']
+    if method == 'secant':
+        x0 = to_x(beta if unknown == 'beta' else scale)
+        x, r = newton(miss, x0, x1=x0 + 1e-2, tol=xtol, maxiter=50, full_output=True,
+                      disp=False)
+        simulations = r.function_calls
+
+    else:
+        with ProcessPoolExecutor(max_workers=workers) if workers > 1 else nullcontext() as executor:
+            shots = (executor.map if executor else map)(fly, map(to_point, to_x(values)))
+            misses = np.array([shot['miss_alt'] for shot in shots])
+
+        signs = np.flatnonzero(np.sign(misses[:-1]) != np.sign(misses[1:]))
+        if len(signs) == 0:
+            raise ValueError(f'the altitude miss of {unknown} does not change sign '
+                             f'in [{low:.6g}, {high:.6g}]: {misses.round()}')
+
+        i = signs[0]
+        x, r = brentq(miss, to_x(values[i]), to_x(values[i + 1]), xtol=xtol, full_output=True)
+        simulations = candidates + r.function_calls
+
+    point = to_point(x)
+    return {
+        'beta': float(point[0]), 'scale': float(point[1]), 'shot': fly(point),
+        'simulations': simulations + 1, 'converged': r.converged,
+        'wall_time': time.perf_counter() - start,
+    }
+
+
+def verify(params, beta, scale):
+    ''' headless launch with the targeted beta and scale
+        returns the logged altitude and velocity where the flight turns
+        horizontal, interpolated between the log entries
+    '''
+    from rocket_launch import launch
+
+    rocket_params, environment_params, model_params, display_params = params
+    control = scaled_control(rocket_params, environment_params,
+                             display_params.time_interval, scale)
+    trajectory = launch(replace(rocket_params, beta=beta, thrust_control=control),
+                        environment_params, model_params,
+                        replace(display_params, status_update_step=1),
+                        headless=True, restart=True).as_arrays()
+    i = np.flatnonzero(trajectory['beta'] >= model_params.q_obj)[0]
+    fraction = ((model_params.q_obj - trajectory['beta'][i - 1])
+                / (trajectory['beta'][i] - trajectory['beta'][i - 1]))
+    return {name: float(trajectory[name][i - 1]
+                         + fraction * (trajectory[name][i] - trajectory[name][i - 1]))
+            for name in ('t', 'h', 'v')}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='target the initial flight angle and throttle scale of a launch')
+    parser.add_argument('config_file_name', type=Path)
+    parser.add_argument('--target', choices=TARGETS, default='beta')
+    parser.add_argument('--method', choices=METHODS, default='brent')
+    parser.add_argument('--bracket', type=lambda text: tuple(map(float, text.split(','))),
+                        help='low,high of the candidate points of beta or scale')
+    parser.add_argument('--candidates', type=int, default=CANDIDATES)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--verify', action='store_true',
+                        help='launch with the result and compare')
+    args = parser.parse_args()
+
+    if not args.config_file_name.is_file():
+        print(f'incorrect config file: {args.config_file_name}')
+        exit()
+
+    params = read_rocket_config(args.config_file_name)
+    model_params, display_params = params[2], params[3]
+    result = target(params, args.target, args.method, args.bracket, args.candidates,
+                    args.workers)
+    shot = result['shot']
+    print(f'beta {result["beta"]:.9g} rad (config {params[0].beta:.6g}), '
+          f'scale {result["scale"]:.9g}: {"converged" if result["converged"] else "NOT CONVERGED"}')
+    print(f'{shot["outcome"]} at {shot["time"]:.2f} s: alt {shot["alt"]:.2f} m '
+          f'(miss {shot["miss_alt"]:.3g}), vel {shot["vel"]:.2f} m/s '
+          f'(miss {shot["miss_vel"]:.3g}), fuel left {shot["fuel_mass"]:.1f} kg')
+    print(f'{result["simulations"]} simulations in {result["wall_time"]:.2f} s, '
+          f'{args.workers} workers, shots end at {shot["time"]:.0f} s of the '
+          f'{display_params.flight_duration:.0f} s flight duration')
+    if args.verify:
+        launched = verify(params, result['beta'], result['scale'])
+        print(f'launch turns horizontal at {launched["t"]:.2f} s: alt {launched["h"]:.2f} m '
+              f'(miss {launched["h"] - model_params.h_obj:.3g}), vel {launched["v"]:.2f} m/s')
+
+
+if __name__ == '__main__':
+    main()
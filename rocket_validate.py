@@ -0,0 +1,180 @@
+''' consistency of gravity turn solutions with the simulator
+
+    The optimizer integrates the gravity turn with the altitude dependent
+    Isp1 + (Isp0 - Isp1) exp(-h / H) and a control that is piecewise constant
+    on the N intervals of the horizon T. The simulator (rocket_launch)
+    replays the control resampled on the time_interval grid with Isp0 only.
+    Each solution is replayed headless and the replayed states are compared
+    with the states of the solver, interpolated on the log times of the
+    replay up to T:
+        rms and max error of vel (m/s), beta (deg), alt (m) and mass (kg)
+        terminal error, replayed minus solver state at T
+
+    Solution files (.npz or .xlsx, see rocket_input.read_solution) with the
+    gravity turn arguments in their metadata are replayed with that vehicle
+    and environment, others with those of the config. Files are validated
+    in parallel worker processes.
+
+    usage:
+        python rocket_validate.py configs/mintoc_20T.cfg solutions/*.npz --workers 4
+'''
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from functools import partial
+from pathlib import Path
+import numpy as np
+from rocket_input import read_rocket_config, read_solution, resample_control
+
+# metric: (solution column, replay log column, scale of the solution column)
+METRICS = {
+    'vel': ('vel', 'v', 1.0),
+    'beta': ('ver_angle', 'beta', 180 / np.pi),
+    'alt': ('alt', 'h', 1.0),
+    'mass': ('mass', 'm', 1.0),
+}
+# config field: (config parameter group, gravity turn argument)
+ARGUMENTS = {
+    'dry_mass': ('rocket', 'm1'),
+    'motor_isp0': ('rocket', 'Isp0'),
+    'motor_isp1': ('rocket', 'Isp1'),
+    'max_thrust': ('rocket', 'Fmax'),
+    'rocket_area': ('rocket', 'A'),
+    'vel': ('rocket', 'vel_eps'),
+    'gravity': ('environment', 'g0'),
+    'radius': ('environment', 'r0'),
+    'drag_coefficient': ('environment', 'cd'),
+    'scale_height': ('environment', 'H'),
+    'density': ('environment', 'rho'),
+}
+
+
+def replay_params(params, solution):
+    ''' config parameters to replay the solution: the vehicle and environment
+        of its metadata, the initial vertical angle and the control of the
+        solution and a log entry every time interval up to the end of the
+        horizon
+    '''
+    rocket_params, environment_params, model_params, display_params = params
+    arguments = solution['metadata'].get('parameters', {})
+    fields = {'rocket': {}, 'environment': {}}
+    for field, (group, name) in ARGUMENTS.items():
+        if name in arguments:
+            fields[group][field] = arguments[name]
+
+    if 'm0' in arguments and 'm1' in arguments:
+        fields['rocket']['fuel_mass'] = arguments['m0'] - arguments['m1']
+
+    horizon = float(solution['time'][-1])
+    duration = horizon + display_params.time_interval
+    control = resample_control(solution['time'], solution['control'],
+                               display_params.time_interval, duration)
+    return (
+        replace(rocket_params, **fields['rocket'], beta=float(solution['ver_angle'][0]),
+                thrust_control=control),
+        replace(environment_params, **fields['environment']),
+        model_params,
+        replace(display_params, status_update_step=1, flight_duration=duration),
+    )
+
+
+def replay(params, solution):
+    ''' headless launch with the control of the solution
+        returns the logged trajectory as a dictionary of arrays
+    '''
+    from rocket_launch import launch
+
+    return launch(*replay_params(params, solution), headless=True).as_arrays()
+
+
+def errors(solution, trajectory):
+    ''' rms, max and terminal error of each metric, the replayed minus the
+        solver state
+    '''
+    time = np.asarray(solution['time'])
+    horizon = time[-1]
+    inside = trajectory['t'] <= horizon
+    metrics = {}
+    for metric, (column, log_column, scale) in METRICS.items():
+        planned = scale * np.asarray(solution[column])
+        replayed = trajectory[log_column]
+        difference = replayed[inside] - np.interp(trajectory['t'][inside], time, planned)
+        metrics[metric] = {
+            'rms': float(np.sqrt(np.mean(difference ** 2))),
+            'max': float(np.max(np.abs(difference))),
+            'terminal': float(np.interp(horizon, trajectory['t'], replayed) - planned[-1]),
+        }
+
+    return metrics
+
+
+def validate_file(config_file_name, solution_file_name):
+    ''' replays one solution file against its config '''
+    params = read_rocket_config(config_file_name)
+    solution = read_solution(solution_file_name)
+    trajectory = replay(params, solution)
+    return {
+        'file': str(solution_file_name),
+        'horizon': float(solution['time'][-1]),
+        'intervals': len(solution['time']) - 1,
+        'errors': errors(solution, trajectory),
+    }
+
+
+def validate(config_file_name, solution_file_names, workers=1):
+    ''' validates the solution files, in parallel if workers > 1
+        returns list of the validation of each file
+    '''
+    validate_one = partial(validate_file, config_file_name)
+    if workers == 1:
+        return list(map(validate_one, solution_file_names))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(validate_one, solution_file_names))
+
+
+def print_summary(results):
+    header = ''.join(f'{f"{metric} rms":>11}{f"{metric} max":>11}{f"{metric} end":>11}'
+                     for metric in METRICS)
+    width = max([len(Path(result['file']).name) for result in results] + [4])
+    print(f'{"file":<{width}}{"T (s)":>9}{"N":>6}{header}')
+    for result in results:
+        values = ''.join(
+            f'{error["rms"]:11.4g}{error["max"]:11.4g}{error["terminal"]:11.4g}'
+            for error in result['errors'].values())
+        print(f'{Path(result["file"]).name:<{width}}{result["horizon"]:9.1f}'
+              f'{result["intervals"]:6d}{values}')
+
+    if len(results) > 1:
+        worst = ''.join(
+            f'{max(result["errors"][metric]["rms"] for result in results):11.4g}'
+            f'{max(result["errors"][metric]["max"] for result in results):11.4g}'
+            f'{max(abs(result["errors"][metric]["terminal"]) for result in results):11.4g}'
+            for metric in METRICS)
+        print(f'{"worst":<{width}}{"":>15}{worst}')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='replay gravity turn solutions in the simulator and compare the states')
+    parser.add_argument('config_file_name', type=Path)
+    parser.add_argument('solution_file_names', type=Path, nargs='+',
+                        help='solution files (.npz or .xlsx)')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--output', type=Path, help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    for file_name in (args.config_file_name, *args.solution_file_names):
+        if not file_name.is_file():
+            print(f'incorrect file: {file_name}')
+            exit()
+
+    results = validate(args.config_file_name, args.solution_file_names, args.workers)
+    print_summary(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
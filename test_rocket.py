@@ -1,5 +1,7 @@
 import numpy as np
+import pytest
 import rocket_equations
+import rocket_golden
 
 motor_isp = 335
 mass_flow = 160               # kg / s
@@ -30,4 +32,657 @@ def test_atmosphere_Density():
 def test_drag():
     ''' Tests the function rocket.Drag '''
 
-    assert 4593.75 == rocket.drag(0, 100)
\ No newline at end of file
+    assert 4593.75 == rocket.drag(0, 100)
+
+def test_derivatives_gravity_turn():
+    ''' Tests the fast RocketPhysics right hand side against the reference '''
+    from rocket_input import read_rocket_config
+    from rocket_launch import RocketPhysics
+    from rocket_benchmark import ReferencePhysics
+
+    rocket_params, environment_params, _, _ = read_rocket_config(
+        'configs/mintoc_20T.cfg')
+    fast = RocketPhysics(rocket_params, environment_params)
+    reference = ReferencePhysics(rocket_params, environment_params)
+    fast.throttle = reference.throttle = 0.7
+    # both take the fuel mass of the previous call
+    for fuel_mass in (8_000.0, 7_000.0):
+        state = np.array([1_500.0, 0.6, 40_000.0, 0.02, fuel_mass])
+        assert np.allclose(fast.derivatives_gravity_turn(0, state),
+                           reference.derivatives_gravity_turn(0, state), rtol=1e-12)
+        assert np.isclose(fast.acceleration, reference.v_dot, rtol=1e-12)
+        assert fast.mass == reference.mass
+
+
+def test_import_budget():
+    ''' Tests the entry points import within budget and without heavy modules '''
+    from rocket_benchmark import check_import_budget
+
+    assert check_import_budget(repeat=1) == []
+
+
+def test_checkpoint_resume(tmp_path, monkeypatch):
+    ''' Tests a run resumed from a checkpoint logs the same as a run without checkpoints '''
+    import shutil
+    import rocket_launch
+    from rocket_input import read_rocket_config
+
+    params = read_rocket_config('configs/mintoc_20T.cfg')
+    checkpoint = tmp_path / 'checkpoint.npz'
+    interrupted = tmp_path / 'interrupted.npz'
+    write_checkpoint = rocket_launch.write_checkpoint
+
+    def keep_checkpoint(file_name, saved):
+        write_checkpoint(file_name, saved)
+        if saved.index == 400:
+            shutil.copy(file_name, interrupted)
+
+    monkeypatch.setattr(rocket_launch, 'write_checkpoint', keep_checkpoint)
+    uninterrupted = rocket_launch.launch(
+        *params, headless=True, checkpoint=checkpoint, checkpoint_every=200)
+    resumed = rocket_launch.launch(
+        *params, headless=True, checkpoint=interrupted, checkpoint_every=200, resume=True)
+
+    plain = rocket_launch.launch(*params, headless=True)
+    assert interrupted.is_file()
+    assert np.array_equal(np.array(uninterrupted.rows, dtype=float),
+                          np.array(plain.rows, dtype=float))
+    assert np.array_equal(np.array(resumed.rows, dtype=float),
+                          np.array(plain.rows, dtype=float))
+
+
+def test_snapshot_cache():
+    ''' Tests a run resumed from the snapshot cache when the control tail changes '''
+    from dataclasses import replace
+    from rocket_checkpoint import SnapshotCache
+    from rocket_input import read_rocket_config
+    from rocket_launch import launch
+
+    rocket_params, *params = read_rocket_config('configs/mintoc_20T.cfg')
+    control = rocket_params.thrust_control.copy()
+    control[650:660] = 0.2
+    tuned_params = replace(rocket_params, thrust_control=control)
+
+    cache = SnapshotCache()
+    launch(rocket_params, *params, headless=True, snapshot_cache=cache,
+           checkpoint_every=100)
+    cached = launch(tuned_params, *params, headless=True, snapshot_cache=cache,
+                    checkpoint_every=100)
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['steps_skipped'] == 600
+
+    # the snapshots do not depend on the interval they were stored with
+    other_interval = launch(tuned_params, *params, headless=True, snapshot_cache=cache,
+                            checkpoint_every=200)
+    assert cache.stats()['hits'] == 2
+
+    reference = launch(tuned_params, *params, headless=True)
+    assert np.array_equal(np.array(other_interval.rows, dtype=float),
+                          np.array(reference.rows, dtype=float))
+    assert np.array_equal(np.array(cached.rows, dtype=float),
+                          np.array(reference.rows, dtype=float))
+
+
+def test_result_cache(tmp_path):
+    ''' Tests launch results are returned from the cache '''
+    from rocket_cache import ResultCache, cached_launch, gravity_turn_key
+    from rocket_input import read_rocket_config
+
+    params = read_rocket_config('configs/mintoc_20T.cfg')
+    cache = ResultCache(tmp_path)
+    computed = cached_launch(*params, cache=cache)
+    stored = cached_launch(*params, cache=cache)
+    cached_launch(*params, cache=cache, bypass=True)
+    cached_launch(*params, cache=cache, invalidate=True)
+
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert all(np.array_equal(computed[key], stored[key]) for key in computed)
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # solver options are part of the gravity turn key
+    keys = {gravity_turn_key({'N': 100, **options})
+            for options in ({}, {'N': 100.0}, {'integrator': 'rk4', 'substeps': 2},
+                            {'hessian_approximation': 'limited-memory'}, {'expand': True})}
+    assert len(keys) == 4
+
+
+def test_streaming_statistics():
+    ''' Tests merged partial aggregates against the statistics of all values '''
+    import json
+    from rocket_statistics import DispersionAggregator, RunningStats, QuantileSketch
+
+    values = np.random.default_rng(1).normal(size=20_000)
+    stats, other_stats = RunningStats(), RunningStats()
+    sketch, other_sketch = QuantileSketch(), QuantileSketch()
+    for value in values[:5_000]:
+        stats.update(value)
+    for value in values[5_000:]:
+        other_stats.update(value)
+    sketch.update_many(values[:5_000])
+    other_sketch.update_many(values[5_000:])
+    stats.merge(other_stats)
+    sketch.merge(other_sketch)
+
+    assert np.isclose(stats.mean, values.mean())
+    assert np.isclose(stats.variance, values.var(ddof=1))
+    for q in (0.05, 0.5, 0.95):
+        assert abs(sketch.quantile(q) - np.quantile(values, q)) < 0.02
+
+    # the summary of a campaign without runs is valid JSON
+    summary = json.loads(json.dumps(DispersionAggregator(100).summary(), allow_nan=False))
+    assert all(metric['min'] is None and None in metric['quantiles'].values()
+               for metric in summary['metrics'].values())
+
+
+def test_trajectory_store(tmp_path):
+    ''' Tests appending runs over chunks and querying them on the index '''
+    from dataclasses import replace
+    from rocket_input import read_rocket_config
+    from rocket_store import COLUMNS, TrajectoryStore
+
+    rocket_params, *params = read_rocket_config('configs/mintoc_20T.cfg')
+    store = TrajectoryStore(tmp_path, chunk_rows=500)
+    for run, fuel_mass in enumerate((16e3, 19e3, 21e3, 24e3)):
+        trajectory = {column: np.full(300, run, dtype=float)
+                      for column in ('t', 'm', 'v', 'beta', 'h', 'theta', 'u')}
+        store.append_run(trajectory, replace(rocket_params, fuel_mass=fuel_mass), *params)
+
+    run_ids = store.query(fuel_mass=(18e3, 22e3))
+    assert list(run_ids) == [1, 2]
+    assert list(store.index['chunk']) == [0, 1, 2, 3]
+    assert np.all(TrajectoryStore(tmp_path).load(2)['h'] == 2)
+
+    # a crash after the column writes of a run and before its index record
+    # leaves orphan column data, the next run is written over it
+    crashed = TrajectoryStore(tmp_path / 'crashed', chunk_rows=1000)
+    for run in range(2):
+        crashed.append_run({column: np.full(300, run, dtype=float) for column in COLUMNS},
+                           rocket_params, *params)
+        if run == 0:
+            for column in COLUMNS[:4]:
+                with open(tmp_path / 'crashed' / 'chunk_000000' / f'{column}.f64', 'ab') as f:
+                    f.write(np.full(100, -1.0).tobytes())
+
+    assert list(crashed.index['offset']) == [0, 300]
+    for run in range(2):
+        assert all(np.all(values == run) for values in crashed.load(run).values())
+
+
+def test_decimate():
+    ''' Tests decimation caps the points and keeps the extremes '''
+    from rocket_lod import SeriesBuffer, decimate
+
+    buffer = SeriesBuffer(capacity=4)
+    x = np.arange(100_001, dtype=float)
+    for value in np.sin(x / 1_000) + (x == 77_777):
+        buffer.append(value)
+
+    for method in ('minmax', 'lttb', 'stride'):
+        x_plot, y_plot = decimate(x, buffer.data, 1_000, method=method)
+        assert len(x_plot) == len(y_plot) <= 1_010
+        assert np.all(np.diff(x_plot) > 0)
+        if method != 'stride':
+            assert y_plot.max() == buffer.data.max()
+
+
+def test_render_frames(tmp_path):
+    ''' Tests the offline render writes one frame per state at the figure size '''
+    import matplotlib.image
+    from dataclasses import replace
+    from rocket_input import read_rocket_config
+    from rocket_output import MapPlot
+    from rocket_render import FRAME_NAME, read_states, render
+
+    params = read_rocket_config('configs/mintoc_20T.cfg')
+    params = (*params[:3], replace(params[3], flight_duration=10))
+    states = read_states(params)
+    frames, workers, _ = render(params, states, tmp_path, workers=8, dpi=20)
+    assert frames == len(states) == 3 and workers == len(states)
+    files = sorted(tmp_path.glob('*.png'))
+    assert [path.name for path in files] == [FRAME_NAME.format(i) for i in range(frames)]
+    size = tuple(int(inches * 20) for inches in reversed(MapPlot.FIGSIZE))
+    assert all(matplotlib.image.imread(path).shape[:2] == size for path in files)
+
+
+def test_realtime_time_warp():
+    ''' Tests frames follow the time warp and the adaptive solvers agree '''
+    from rocket_input import read_rocket_config
+    from rocket_realtime import FlightStepper, FrameScheduler, run_realtime
+
+    rocket_params, environment_params, _, display_params = read_rocket_config(
+        'configs/mintoc_20T.cfg')
+    steppers = [
+        FlightStepper(rocket_params, environment_params, display_params, method=method)
+        for method in ('RK45', 'DOP853')
+    ]
+    assert np.allclose(steppers[0].state_at(300), steppers[1].state_at(300), rtol=1e-3)
+
+    wall_clock = [0.0]
+
+    def sleep(seconds):
+        wall_clock[0] += seconds
+
+    scheduler = FrameScheduler(fps=10, warp=100, clock=lambda: wall_clock[0], sleep=sleep)
+    frame_times = []
+
+    def show(status):
+        frame_times.append(status['time'])
+        if len(frame_times) == 20:
+            scheduler.set_warp(10)
+
+    run_realtime(steppers[0], scheduler, show)
+    assert np.allclose(np.diff(frame_times[:20]), 10)
+    assert np.allclose(np.diff(frame_times[19:30]), 1)
+    assert frame_times[-1] == display_params.flight_duration
+    assert scheduler.dropped == 0
+
+
+def test_simulation_server():
+    ''' Tests concurrent launch requests match launch '''
+    import json
+    import threading
+    import urllib.error
+    from dataclasses import replace
+    from rocket_input import read_rocket_config
+    from rocket_launch import launch
+    from rocket_server import make_server, post
+
+    server = make_server(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}'
+    fuel_masses = (19_500, 20_000, 20_500)
+    responses = {}
+
+    def request(fuel_mass):
+        responses[fuel_mass] = post(f'{url}/launch', {
+            'config': 'configs/mintoc_20T.cfg', 'rocket': {'fuel_mass': fuel_mass}})
+
+    threads = [threading.Thread(target=request, args=(fuel_mass,)) for fuel_mass in fuel_masses]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    # a missing config and a control shorter than the flight are bad requests
+    for payload in ({'config': 'configs/missing.cfg'},
+                    {'config': 'configs/mintoc_20T.cfg', 'control': [1.0]}):
+        try:
+            post(f'{url}/launch', payload)
+            assert False
+
+        except urllib.error.HTTPError as error:
+            assert error.code == 400
+            assert 'Error' in json.loads(error.read())['error']
+
+    assert post(f'{url}/launch', {'config': 'configs/mintoc_20T.cfg'})['events'] == \
+        responses[20_000]['events']
+    server.shutdown()
+    params = read_rocket_config('configs/mintoc_20T.cfg')
+    for fuel_mass in fuel_masses:
+        single = launch(replace(params[0], fuel_mass=fuel_mass), *params[1:],
+                        headless=True).as_arrays()
+        trajectory = responses[fuel_mass]['trajectory']
+        assert all(np.array_equal(trajectory[name], single[name]) for name in single)
+
+    assert responses[20_000]['events']['end']['reason'] == 'duration'
+
+
+def test_closed_loop_guidance():
+    ''' Tests the guidance flies its plan and falls back when over budget '''
+    from rocket_input import read_rocket_config
+    from rocket_launch import launch
+    from rocket_guidance import RecedingHorizonGuidance
+
+    params = read_rocket_config('configs/mintoc_20T.cfg')
+    guidance = RecedingHorizonGuidance(*params[:3], replan_interval=200, budget=1e-3)
+    trajectory = launch(*params, headless=True, guidance=guidance).as_arrays()
+
+    summary = guidance.summary()
+    assert summary['solves'] == summary['fallbacks'] == 2
+    assert summary['latency_percentiles']['p50'] < 1.0
+    start, horizon, _ = guidance.plan
+    assert start == 0
+    assert np.array_equal(trajectory['u'], guidance.controls(trajectory['t']))
+    assert np.all(trajectory['u'][trajectory['t'] > horizon] == 0)
+
+
+def test_closed_loop_replan():
+    ''' Tests the in flight replans succeed within budget and change the control '''
+    from dataclasses import replace
+    from rocket_input import read_rocket_config
+    from rocket_launch import launch
+    from rocket_guidance import RecedingHorizonGuidance
+
+    rocket_params, environment_params, model_params, display_params = read_rocket_config(
+        'configs/mintoc_20T.cfg')
+    display_params = replace(display_params, flight_duration=25, status_update_step=1)
+    guidance = RecedingHorizonGuidance(rocket_params, environment_params, model_params,
+                                       replan_interval=10, budget=5.0)
+    # plan before the launch, launch flies the control of the config up to
+    # its replans at 10 and 20 s
+    guidance.update(0.0, rocket_params.vel, rocket_params.beta, rocket_params.alt, 0.0,
+                    rocket_params.fuel_mass)
+    initial_plan = guidance.plan
+    trajectory = launch(rocket_params, environment_params, model_params, display_params,
+                        headless=True, guidance=guidance).as_arrays()
+
+    summary = guidance.summary()
+    assert summary['solves'] == 2 and summary['fallbacks'] == 0
+    assert guidance.plan[0] == 20
+    replanned = trajectory['t'] >= 20
+    assert np.array_equal(trajectory['u'][replanned],
+                          guidance.controls(trajectory['t'][replanned]))
+    guidance.plan = initial_plan
+    assert np.abs(trajectory['u'][replanned]
+                  - guidance.controls(trajectory['t'][replanned])).max() > 1e-3
+
+
+def test_sensitivities():
+    ''' Tests the AD Jacobian of the final state against finite differences '''
+    from rocket_input import read_rocket_config
+    from rocket_sensitivity import PARAMETERS, STATES, sensitivities
+
+    result = sensitivities(*read_rocket_config('configs/mintoc_20T.cfg'), steps=100,
+                           sweep=False)
+    jacobian = np.array(result['jacobian'])
+    assert jacobian.shape == (len(STATES), len(PARAMETERS))
+    assert max(result['fd_relative_error'].values()) < 5e-3
+    # the mass does not depend on the drag
+    assert np.allclose(jacobian[0, list(PARAMETERS).index('cd')], 0)
+    assert jacobian[0, list(PARAMETERS).index('m0')] > 0
+
+
+def test_surrogate_table(tmp_path):
+    ''' Tests the surrogate table interpolation and query '''
+    from rocket_input import read_rocket_config
+    from rocket_casadi_solution import gravity_turn_arguments
+    from rocket_surrogate import AXES, SurrogateTable, control_array, normalize
+
+    params = read_rocket_config('configs/mintoc_20T.cfg')
+    point = normalize(gravity_turn_arguments(*params[:3]))
+    axes = {name: [point[name]] for name in AXES}
+    axes['twr'] = [point['twr'] - 1, point['twr'] + 1]
+    axes['mass_ratio'] = [point['mass_ratio'] - 2, point['mass_ratio'] + 2]
+    controls = np.zeros((2, 2, 1, 1, 1, 1, 4), dtype=np.float32)
+    controls[1, :] = 1.0
+    controls[:, 1] += 0.5
+    horizon = np.array([[0.7, 0.8], [0.9, 1.0]]).reshape(2, 2, 1, 1, 1, 1)
+    converged = np.ones(horizon.shape, dtype=bool)
+    SurrogateTable(axes, controls, horizon, converged).save(tmp_path / 'table.npz')
+    table = SurrogateTable.load(tmp_path / 'table.npz')
+
+    control, normalized_horizon = table.interpolate(point)
+    assert np.allclose(control, 0.75) and np.isclose(normalized_horizon, 0.85)
+    corner = dict(point, twr=axes['twr'][1], mass_ratio=axes['mass_ratio'][0])
+    assert np.allclose(table.interpolate(corner)[0], 1.0)
+    # grid points that did not converge are left out
+    table.converged[1, 1] = False
+    assert np.allclose(table.interpolate(point)[0], 0.5)
+    table.converged[1, 1] = True
+
+    profile = table.query(*params[:3])
+    assert len(profile['time']) == len(profile['control']) == 5
+    assert profile['control'][-1] == 0
+    assert np.isclose(profile['time'][-1], 0.85 * np.sqrt(
+        params[1].radius / params[1].gravity), rtol=1e-3)
+    assert len(control_array(profile, params[3])) == len(params[0].thrust_control)
+
+
+def test_simulation_guess():
+    ''' Tests the forward simulation initial guess closes the shooting defects '''
+    from rocket_input import read_rocket_config
+    from rocket_casadi_solution import (
+        build_gravity_turn, gravity_turn_arguments, simulation_guess)
+
+    rocket_params, environment_params, model_params, _ = read_rocket_config(
+        'configs/mintoc_20T.cfg')
+    arguments = gravity_turn_arguments(rocket_params, environment_params, model_params)
+    arguments['N'] = 30
+    guess = simulation_guess(rocket_params, environment_params, model_params, N=30)
+    assert guess['x'].shape == (31, 5) and guess['u'].shape == (30,)
+    # the fuel is spent and the flight turns horizontal at the target altitude
+    assert np.isclose(guess['x'][-1, 0], arguments['m1'])
+    assert np.isclose(guess['x'][-1, 3], arguments['h_obj'], rtol=1e-2)
+    assert np.isclose(guess['x'][-1, 2], arguments['q_obj'], atol=1e-2)
+
+    linear = build_gravity_turn(**arguments, print_level=0)
+    simulated = build_gravity_turn(**arguments, print_level=0, initial_guess=guess)
+    assert simulated['x0'][0] == guess['T']
+    linear_defect = np.max(np.abs(np.array(linear['constraints'](linear['x0']))))
+    defect = np.max(np.abs(np.array(simulated['constraints'](simulated['x0']))))
+    assert defect < 1e-3 * linear_defect
+
+
+def test_derivative_strategy():
+    ''' Tests the gravity turn NLP with a limited memory Hessian '''
+    from rocket_input import read_rocket_config
+    from rocket_casadi_solution import (
+        build_gravity_turn, compute_gravity_turn, gravity_turn_arguments)
+
+    arguments = gravity_turn_arguments(*read_rocket_config('configs/mintoc_20T.cfg')[:3])
+    arguments['N'] = 30
+    problem = build_gravity_turn(
+        **arguments, print_level=0, hessian_approximation='limited-memory',
+        integrator_options={'sensitivity_method': 'staggered'})
+    solver = problem['solver']
+    x = solver(x0=problem['x0'], lbx=problem['lbx'], ubx=problem['ubx'],
+               lbg=problem['lbg'], ubg=problem['ubg'])['x']
+    assert solver.stats()['return_status'] == 'Solve_Succeeded'
+    assert float(x[-problem['nx']]) > arguments['m1']
+    result = compute_gravity_turn(
+        **arguments, print_level=0, hessian_approximation='limited-memory',
+        integrator_options={'sensitivity_method': 'staggered'})
+    assert np.isclose(result['mass'][-1], float(x[-problem['nx']]))
+
+
+def test_rk4_shooting():
+    ''' Tests the RK4 shooting integrator against CVODES '''
+    from rocket_input import read_rocket_config
+    from rocket_casadi_solution import (
+        build_gravity_turn, compute_gravity_turn, gravity_turn_arguments)
+
+    arguments = gravity_turn_arguments(*read_rocket_config('configs/mintoc_20T.cfg')[:3])
+    arguments['N'] = 50
+    cvodes = build_gravity_turn(**arguments, print_level=0)
+    rk4 = build_gravity_turn(**arguments, print_level=0, integrator='rk4', substeps=4)
+    solver = rk4['solver']
+    x = solver(x0=rk4['x0'], lbx=rk4['lbx'], ubx=rk4['ubx'], lbg=rk4['lbg'], ubg=rk4['ubg'])['x']
+    assert solver.stats()['return_status'] == 'Solve_Succeeded'
+    # the RK4 solution closes the shooting defects of CVODES
+    defects = np.abs(np.array(cvodes['constraints'](x))).reshape(-1, cvodes['nx'])
+    assert np.all(defects.max(axis=0) < [1.0, 1.0, 1e-3, 10.0, 1e-4])
+    result = compute_gravity_turn(**arguments, print_level=0, integrator='rk4', substeps=4)
+    assert np.isclose(result['time'][-1], float(x[0]))
+
+
+def test_solution_file(tmp_path):
+    ''' Tests the npz solution format against xlsx and the memory mapped sweep '''
+    from rocket_input import construct_control_array, read_solution, write_solution
+
+    n = 301
+    result = {
+        'time': np.linspace(0, 590, n), 'mass': np.linspace(22e3, 2.5e3, n),
+        'vel': np.linspace(0, 8e3, n), 'alt': np.linspace(0, 2e5, n),
+        'control': np.concatenate((np.linspace(1, 0.1, n - 1), [0.0])),
+        'hor_angle': np.linspace(0, 0.5, n), 'ver_angle': np.linspace(0, 1.57, n),
+    }
+    metadata = {'T': 590.0, 'objective': 0.98, 'status': 'Solve_Succeeded', 'iterations': 90}
+    write_solution(tmp_path / 'solution.npz', result, metadata)
+    write_solution(tmp_path / 'solution.xlsx', result, metadata)
+    npz = read_solution(tmp_path / 'solution.npz')
+    xlsx = read_solution(tmp_path / 'solution.xlsx')
+    assert npz['metadata'] == metadata and xlsx['metadata'] == {}
+    for name, values in result.items():
+        assert np.array_equal(npz[name], values) and np.allclose(xlsx[name], values)
+
+    assert np.allclose(construct_control_array(tmp_path / 'solution.npz', 1.0, 600),
+                       construct_control_array(tmp_path / 'solution.xlsx', 1.0, 600))
+    for i in range(50):
+        write_solution(tmp_path / f'sweep_{i}.npz', {**result, 'mass': result['mass'] + i})
+
+    sweep = [read_solution(tmp_path / f'sweep_{i}.npz', mmap=True) for i in range(50)]
+    assert isinstance(sweep[7]['mass'].base, np.memmap)
+    assert np.array_equal(sweep[7]['mass'], result['mass'] + 7)
+    assert sweep[7]['metadata'] == {}
+
+
+def test_validate_solutions(tmp_path):
+    ''' Tests the replay of solution files in the simulator '''
+    from rocket_input import read_rocket_config, read_solution, write_solution
+    from rocket_casadi_solution import gravity_turn_arguments
+    from rocket_validate import METRICS, replay_params, validate
+
+    params = read_rocket_config('configs/mintoc_20T.cfg')
+    solution = read_solution('configs/mintoc_gravity_turn_20T_1.xlsx')
+    solution.pop('metadata')
+    arguments = gravity_turn_arguments(*params[:3])
+    write_solution(tmp_path / 'solution.npz', solution, {'parameters': arguments})
+    heavier = dict(arguments, m0=arguments['m0'] + 1_000)
+    rocket_params = replay_params(params, {**solution, 'metadata': {'parameters': heavier}})[0]
+    assert rocket_params.fuel_mass == params[0].fuel_mass + 1_000
+    assert rocket_params.beta == solution['ver_angle'][0]
+
+    files = ['configs/mintoc_gravity_turn_20T_1.xlsx', tmp_path / 'solution.npz']
+    xlsx, npz = validate('configs/mintoc_20T.cfg', files, workers=2)
+    for metric in METRICS:
+        assert np.allclose(list(xlsx['errors'][metric].values()),
+                           list(npz['errors'][metric].values()), rtol=1e-6)
+
+    assert xlsx['intervals'] == 300
+    assert abs(xlsx['errors']['mass']['terminal']) < 50
+    assert 0 < xlsx['errors']['alt']['rms'] <= xlsx['errors']['alt']['max']
+
+
+@pytest.mark.parametrize('name, config_file_name, check_scenario', rocket_golden.scenarios())
+def test_golden_trajectory(name, config_file_name, check_scenario):
+    ''' Tests each config against its golden reference and time budget '''
+    ratios, wall_time = check_scenario(name, config_file_name)
+    assert all(ratio <= 1 for ratio in ratios.values()), ratios
+    assert wall_time <= rocket_golden.budget(name)
+
+
+def test_golden_budget_scale(monkeypatch):
+    ''' Tests the budgets scale with the environment variable '''
+    name = 'launch_mintoc_20T'
+    monkeypatch.delenv(rocket_golden.BUDGET_SCALE_VARIABLE, raising=False)
+    assert rocket_golden.budget(name) == rocket_golden.BUDGETS[name]
+    monkeypatch.setenv(rocket_golden.BUDGET_SCALE_VARIABLE, '2.5')
+    assert rocket_golden.budget(name) == 2.5 * rocket_golden.BUDGETS[name]
+
+
+def test_control_profile(tmp_path):
+    ''' Tests the compressed control profile: the error bound, bang-bang
+        segments, vectorized evaluation and the launch with a profile file
+    '''
+    from dataclasses import replace
+    from rocket_control import ControlProfile, fit_control
+    from rocket_input import construct_control_array, read_rocket_config, resample_control
+    from rocket_launch import launch
+
+    time = np.linspace(0, 20_000, 20_001)
+    control = np.interp(time, [0, 150, 150, 400, 600, 600, 20_000],
+                        [1.0, 1.0, 0.8, 0.3, 0.3, 0.0, 0.0])
+    control[150:400] += 2e-4 * np.sin(time[150:400])
+    profile = fit_control(time, control, max_error=1e-3)
+    assert len(profile) <= 6 and profile.nbytes < control.nbytes / 100
+    assert list(profile.kinds()[[0, -1]]) == ['full', 'off']
+    fine_time = np.linspace(-10, 20_010, 100_001)
+    assert np.max(np.abs(profile(fine_time) - np.interp(fine_time, time, control))) <= 1e-3
+    assert np.array_equal(profile(fine_time[::997]), [profile.value(t) for t in fine_time[::997]])
+
+    short = fit_control([0.0, 1.0, 2.0], [0.0, 0.5, 0.5], 1e-3)
+    assert np.array_equal(short([0.0, 1.0, 1.5, 2.0]), [0.0, 0.5, 0.5, 0.5])
+    assert list(short.kinds()) == ['linear', 'constant']
+    pair = fit_control([0.0, 1.0], [0.3, 0.3], 1e-3)
+    assert len(pair) == 1 and list(pair.kinds()) == ['constant'] and pair.value(0.5) == 0.3
+
+    profile.save(tmp_path / 'profile.npz')
+    sampled = construct_control_array(tmp_path / 'profile.npz', 1.0, 20_000)
+    dense = resample_control(time, control, 1.0, 20_000)
+    assert len(sampled) == len(dense) and sampled[-1] == 0.0
+    assert np.max(np.abs(np.asarray(sampled) - dense)) <= 1e-3
+    assert np.array_equal(sampled[140:160], profile(np.arange(140.0, 160.0)))
+    assert [sampled[k] for k in (0, 150, 399, -1)] == \
+        [profile.value(t) for t in (0.0, 150.0, 399.0, len(sampled) - 1.0)]
+    assert np.array_equal(np.asarray(sampled), profile(np.arange(len(sampled), dtype=float)))
+
+    params = read_rocket_config('configs/mintoc_20T_1.cfg')
+    rocket_params, environment_params, model_params, display_params = params
+    display_params = replace(display_params, flight_duration=700)
+    reference = launch(rocket_params, environment_params, model_params, display_params,
+                       headless=True).as_arrays()
+    solution_time = np.arange(len(rocket_params.thrust_control)) * display_params.time_interval
+    ControlProfile.save(fit_control(solution_time, rocket_params.thrust_control, 1e-9),
+                        tmp_path / 'solution_profile.npz')
+    rocket_params = replace(rocket_params, thrust_control=construct_control_array(
+        tmp_path / 'solution_profile.npz', display_params.time_interval, 700))
+    trajectory = launch(rocket_params, environment_params, model_params, display_params,
+                        headless=True).as_arrays()
+    for name, values in reference.items():
+        assert np.allclose(trajectory[name], values, rtol=1e-6, atol=1e-6)
+
+
+def test_reentry_corridor():
+    ''' Tests the analytic jacobian of the re-entry equations, the implicit
+        against an explicit integration and the classes of the corridor search
+    '''
+    from rocket_input import read_rocket_config
+    from rocket_reentry import ReentryPhysics, corridor, orbit_entry_state, simulate_entry
+
+    rocket_params, environment_params, model_params, _ = read_rocket_config(
+        'configs/mintoc_20T.cfg')
+    physics = ReentryPhysics(rocket_params, environment_params, lift_to_drag=0.3)
+    state = np.array([6500.0, 1.65, 45_000.0, 0.1, 1e7])
+    step = np.array([1e-3, 1e-7, 1e-2, 1e-7, 1.0])
+    jacobian_fd = np.column_stack([
+        (physics.derivatives(0, state + step[i] * np.eye(5)[i])
+         - physics.derivatives(0, state - step[i] * np.eye(5)[i])) / (2 * step[i])
+        for i in range(5)])
+    assert np.allclose(physics.jacobian(0, state), jacobian_fd, rtol=1e-5, atol=1e-9)
+    ballistic = ReentryPhysics(rocket_params, environment_params)
+    assert np.isclose(physics.g_load(45_000.0, 6500.0),
+                      np.sqrt(1 + 0.3 ** 2) * ballistic.g_load(45_000.0, 6500.0))
+
+    entry, delta_v = orbit_entry_state(environment_params, model_params.h_obj, -2.0)
+    assert 7000 < entry.vel < 8000 and 0 < delta_v < 500
+    implicit = simulate_entry(physics, entry, method='Radau')
+    explicit = simulate_entry(physics, entry, method='RK45')
+    assert implicit['outcome'] == explicit['outcome'] == 'landed' and implicit['njev'] > 0
+    for name in ('peak_g_load', 'peak_heat_flux', 'total_heat_load', 'range'):
+        assert np.isclose(implicit[name], explicit[name], rtol=1e-4)
+
+    summaries, safe = corridor(rocket_params, environment_params, model_params.h_obj,
+                               [-1.0, -2.0, -6.0], g_limit=10.0, heat_load_limit=250e6)
+    assert [summary['class'] for summary in summaries] == ['heat-load', 'safe', 'g-load']
+    assert safe == (-2.0, -2.0)
+    summaries, _ = corridor(rocket_params, environment_params, model_params.h_obj,
+                            [-0.2], lift_to_drag=1.0)
+    assert summaries[0]['class'] == 'skip'
+
+
+def test_targeting():
+    ''' Tests the targeting of the initial flight angle with terminal events of
+        launch against a full launch
+    '''
+    from rocket_input import read_rocket_config
+    from rocket_targeting import target, verify
+
+    params = read_rocket_config('configs/mintoc_20T.cfg')
+    model_params, display_params = params[2], params[3]
+    result = target(params, 'beta', 'brent', candidates=6)
+    shot = result['shot']
+    assert result['converged'] and shot['outcome'] == 'horizontal'
+    # the miss jumps by tens of meters with the fuel mass lag of RocketPhysics
+    assert abs(shot['miss_alt']) < 100 and result['beta'] != params[0].beta
+    assert shot['time'] < display_params.flight_duration
+    launched = verify(params, result['beta'], result['scale'])
+    assert np.isclose(launched['h'], shot['alt'], atol=1e-3)
+    assert np.isclose(launched['t'], shot['time'], atol=1e-6)
+    assert abs(launched['h'] - model_params.h_obj) < 100
+
+    # both methods converge in the throttle scale
+    for method in ('brent', 'secant'):
+        result = target(params, 'scale', method, candidates=6)
+        assert result['converged'] and result['beta'] == params[0].beta
+        assert abs(result['shot']['miss_alt']) < 100